@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试共用的图片生成工具
+make_jpg 生成单张JPEG图片，make_car 生成车源文件夹中的 start..stop.jpg，
+make_batch 生成第二层文件夹（日期文件夹）及其中的车源文件夹
+"""
+
+import pytest
+from PIL import Image
+
+import image_renamer_core as core
+
+# 默认的第二层文件夹和车源文件夹名称
+BATCH_NAME = "2025_11_06_芜湖_张三01"
+CAR_NAME = "1234567_英菲尼迪G37"
+
+# 文件夹中测试图片的默认尺寸（小图片，处理快）
+SMALL_SIZE = (64, 48)
+
+
+def _make_jpg(path, size=SMALL_SIZE, color=(200, 30, 30), **save_options):
+    Image.new('RGB', size, color).save(path, 'JPEG', **save_options)
+    return path
+
+
+def _make_car(car, stop=core.EXPECTED_IMAGE_COUNT, start=1, size=SMALL_SIZE):
+    # 每张图片颜色不同，内容互不相同
+    car.mkdir(parents=True, exist_ok=True)
+    for i in range(start, stop + 1):
+        _make_jpg(car / f"{i}.jpg", size=size, color=(i * 8 % 256, 30, 30))
+    return car
+
+
+def _make_batch(root, name=BATCH_NAME, folders=(CAR_NAME,), count=core.EXPECTED_IMAGE_COUNT,
+                size=SMALL_SIZE):
+    batch = root / name
+    for folder in folders:
+        _make_car(batch / folder, count, size=size)
+    return batch
+
+
+@pytest.fixture
+def make_jpg():
+    """make_jpg(path, size, color, **save_options)：生成纯色JPEG图片，返回 path"""
+    return _make_jpg
+
+
+@pytest.fixture
+def make_car():
+    """make_car(car, stop, start=1, size)：在车源文件夹中生成 start..stop.jpg，文件夹不存在时创建"""
+    return _make_car
+
+
+@pytest.fixture
+def make_batch():
+    """make_batch(root, name, folders, count, size)：生成第二层文件夹，每个车源文件夹包含 1..count.jpg"""
+    return _make_batch
@@ -6,12 +6,11 @@
 """
 
 import os
-import re
 import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
-from pathlib import Path
+import multiprocessing
 
 # 添加调试信息
 print(f"Python版本: {sys.version}")
@@ -25,45 +24,55 @@ except ImportError as e:
     messagebox.showerror("错误", "缺少必要的图片处理库 Pillow\n请运行: pip install pillow")
     sys.exit(1)
 
+from image_renamer_core import (TARGET_SIZE, EXECUTOR_MODES, ORDER_MODES, BUILTIN_RULE_SCHEMAS,
+                                ENCODER_PROFILES, DEFAULT_ENCODER_PROFILE, default_worker_count, list_subfolders, build_preview,
+                                apply_preview, OperationCancelled)
+from image_renamer_cache import open_default_cache
+from image_renamer_probe import describe_probe, describe_problem
+from image_renamer_dedupe import describe_duplicate
+from image_renamer_profile import CompressionProfile
+from image_renamer_journal import (BatchJournal, discard_journal, find_unfinished_journal,
+                                   new_batch_id)
+from image_renamer_undo import UndoLog, latest_undo_log, undo_batch
+from image_renamer_rules import load_default_rule_schemas
+from image_renamer_queue import discover_roots, process_roots
+from image_renamer_backends import BACKENDS, DEFAULT_BACKEND, available_backends
+
+# 执行方式的显示名称
+EXECUTOR_MODE_NAMES = {
+    'serial': '串行',
+    'thread': '多线程',
+    'process': '多进程',
+}
+
+# 图片顺序的显示名称
+ORDER_MODE_NAMES = {
+    'name': '按文件名',
+    'exif': '按拍摄时间',
+}
+
+# 规则方案按文件夹名自动选择时的显示名称
+SCHEMA_AUTO_NAME = '自动（按文件夹名）'
+
+# 编码方案的显示名称
+ENCODER_PROFILE_NAMES = {
+    'fast': '快速',
+    'balanced': '均衡',
+    'smallest': '最小体积',
+}
+
 class ImageRenamerApp:
     def __init__(self, root):
         self.root = root
+        
+        # 重命名规则方案（内置标准30张 + 规则配置文件中的方案），启动时读取一次
+        self.rule_schemas = self.load_rule_schemas()
+        
         self.setup_ui()
         self.selected_folder = None
         
-        # 定义重命名规则 - 按照最新的顺序（1-29）
-        self.rename_rules = [
-            "_58_右侧面.jpg",
-            "_3_右前45度.jpg",
-            "_2_正前方.jpg",
-            "_36_左前大灯.jpg",
-            "_1_左前45度.jpg",
-            "_35_左前轮胎轮毂.jpg",
-            "_4_左侧面.jpg",
-            "_5_左后45度.jpg",
-            "_6_正后方.jpg",
-            "_7_右后45度.jpg",
-            "_9_右后大灯.jpg",
-            "_29_右侧底大边.jpg",
-            "_30_左侧底大边.jpg",
-            "_57_车顶.jpg",
-            "_20_驾驶位.jpg",
-            "_19_驾驶员座椅.jpg",
-            "_21_后排.jpg",
-            "_23_后备箱.jpg",
-            "_24_发动机舱.jpg",
-            "_41_右侧前座椅.jpg",
-            "_44_右侧后座椅.jpg",
-            "_12_中控台.jpg",
-            "_22_车内顶棚.jpg",
-            "_16_音响及空调面板.jpg",
-            "_13_方向盘.jpg",
-            "_14_组合仪表.jpg",
-            "_15_里程数特写.jpg",
-            "_18_变速杆.jpg",
-            "_11_钥匙.jpg",
-            "_60_车辆铭牌.jpg"
-        ]
+        # 目录扫描缓存（打开失败时为None，不使用缓存）
+        self.scan_cache = open_default_cache()
     
     def setup_ui(self):
         """设置用户界面"""
@@ -124,6 +133,25 @@ class ImageRenamerApp:
                                                    variable=self.rename_enable_var)
         self.rename_enable_check.grid(row=0, column=0, sticky=tk.W, padx=(0, 20), pady=(0, 10))
         
+        # 图片顺序（从SD卡复制后修改时间不可靠，按EXIF拍摄时间排序）
+        ttk.Label(options_frame, text="图片顺序:").grid(row=0, column=1, sticky=tk.W, padx=(0, 10), pady=(0, 10))
+        self.order_var = tk.StringVar()
+        self.order_var.set(ORDER_MODE_NAMES['name'])  # 默认按文件名
+        self.order_combo = ttk.Combobox(options_frame, textvariable=self.order_var,
+                                        values=[ORDER_MODE_NAMES[m] for m in ORDER_MODES],
+                                        state='readonly', width=10)
+        self.order_combo.grid(row=0, column=2, sticky=tk.W, pady=(0, 10))
+        
+        # 规则方案（不同检测模板的图片数量和命名不同）
+        ttk.Label(options_frame, text="规则方案:").grid(row=0, column=3, sticky=tk.W, padx=(20, 10), pady=(0, 10))
+        self.schema_names = {self.describe_schema(schema): schema.name for schema in self.rule_schemas}
+        self.schema_var = tk.StringVar()
+        self.schema_var.set(SCHEMA_AUTO_NAME)  # 默认按文件夹名自动选择
+        self.schema_combo = ttk.Combobox(options_frame, textvariable=self.schema_var,
+                                         values=[SCHEMA_AUTO_NAME] + list(self.schema_names),
+                                         state='readonly', width=16)
+        self.schema_combo.grid(row=0, column=4, sticky=tk.W, pady=(0, 10))
+        
         # 第二行：压缩选项
         self.compress_var = tk.BooleanVar()
         self.compress_var.set(False)  # 默认不启用压缩
@@ -143,9 +171,76 @@ class ImageRenamerApp:
         self.quality_label = ttk.Label(options_frame, text="85%")
         self.quality_label.grid(row=1, column=3, sticky=tk.W)
         
+        # 快速解码选项
+        self.draft_var = tk.BooleanVar()
+        self.draft_var.set(True)  # 默认启用快速解码
+        self.draft_check = ttk.Checkbutton(options_frame, text="快速解码", variable=self.draft_var)
+        self.draft_check.grid(row=1, column=4, sticky=tk.W, padx=(20, 0))
+        
+        # 已符合尺寸的图片不重新编码
+        self.passthrough_var = tk.BooleanVar()
+        self.passthrough_var.set(True)  # 默认跳过
+        self.passthrough_check = ttk.Checkbutton(options_frame, text="已是1800×1800且质量不高于设定的图片不重新压缩",
+                                                 variable=self.passthrough_var)
+        self.passthrough_check.grid(row=3, column=0, columnspan=3, sticky=tk.W, pady=(10, 0))
+        
+        # 记录压缩各步骤耗时
+        self.profile_var = tk.BooleanVar()
+        self.profile_var.set(False)  # 默认不记录
+        self.profile_check = ttk.Checkbutton(options_frame, text="记录耗时统计",
+                                             variable=self.profile_var)
+        self.profile_check.grid(row=3, column=3, columnspan=2, sticky=tk.W, pady=(10, 0))
+        
         # 绑定质量滑块事件
         self.quality_scale.configure(command=self.update_quality_label)
         
+        # 第三行：并行处理选项
+        ttk.Label(options_frame, text="执行方式:").grid(row=2, column=0, sticky=tk.W, pady=(10, 0))
+        self.executor_mode_var = tk.StringVar()
+        self.executor_mode_var.set(EXECUTOR_MODE_NAMES['process'])  # 默认多进程
+        self.executor_mode_combo = ttk.Combobox(options_frame, textvariable=self.executor_mode_var,
+                                                values=[EXECUTOR_MODE_NAMES[m] for m in EXECUTOR_MODES],
+                                                state='readonly', width=8)
+        self.executor_mode_combo.grid(row=2, column=0, sticky=tk.E, padx=(0, 20), pady=(10, 0))
+        
+        ttk.Label(options_frame, text="工作进程数:").grid(row=2, column=1, sticky=tk.W, padx=(0, 10), pady=(10, 0))
+        self.workers_var = tk.IntVar()
+        self.workers_var.set(default_worker_count())  # 默认使用全部CPU核心
+        self.workers_spin = ttk.Spinbox(options_frame, from_=1, to=64, textvariable=self.workers_var, width=5)
+        self.workers_spin.grid(row=2, column=2, sticky=tk.W, pady=(10, 0))
+        
+        # 压缩时的内存预算，0表示不限制
+        ttk.Label(options_frame, text="内存上限(MB):").grid(row=2, column=3, sticky=tk.W, padx=(20, 10), pady=(10, 0))
+        self.memory_budget_var = tk.IntVar()
+        self.memory_budget_var.set(0)  # 默认不限制
+        self.memory_budget_spin = ttk.Spinbox(options_frame, from_=0, to=65536, increment=256,
+                                              textvariable=self.memory_budget_var, width=7)
+        self.memory_budget_spin.grid(row=2, column=4, sticky=tk.W, pady=(10, 0))
+        
+        # 第五行：编码方案
+        ttk.Label(options_frame, text="编码方案:").grid(row=4, column=0, sticky=tk.W, pady=(10, 0))
+        self.encoder_var = tk.StringVar()
+        self.encoder_var.set(ENCODER_PROFILE_NAMES[DEFAULT_ENCODER_PROFILE])
+        self.encoder_combo = ttk.Combobox(options_frame, textvariable=self.encoder_var,
+                                          values=[ENCODER_PROFILE_NAMES[e] for e in ENCODER_PROFILES],
+                                          state='readonly', width=8)
+        self.encoder_combo.grid(row=4, column=0, sticky=tk.E, padx=(0, 20), pady=(10, 0))
+        self.encoder_combo.bind('<<ComboboxSelected>>', self.on_encoder_change)
+        
+        self.encoder_desc_label = ttk.Label(options_frame, text="")
+        self.encoder_desc_label.grid(row=4, column=1, columnspan=4, sticky=tk.W, pady=(10, 0))
+        self.update_encoder_description()
+        
+        # 第六行：缩放和编码引擎（只列出本机已安装的）
+        ttk.Label(options_frame, text="处理引擎:").grid(row=5, column=0, sticky=tk.W, pady=(10, 0))
+        self.backend_names = {BACKENDS[name].description: name for name in available_backends()}
+        self.backend_var = tk.StringVar()
+        self.backend_var.set(BACKENDS[DEFAULT_BACKEND].description)
+        self.backend_combo = ttk.Combobox(options_frame, textvariable=self.backend_var,
+                                          values=list(self.backend_names),
+                                          state='readonly', width=16)
+        self.backend_combo.grid(row=5, column=1, columnspan=2, sticky=tk.W, pady=(10, 0))
+        
         # 初始化质量控件状态
         self.toggle_quality_controls()
         
@@ -156,11 +251,24 @@ class ImageRenamerApp:
         preview_frame.rowconfigure(0, weight=1)
         
         # 创建Treeview用于显示预览
-        self.tree = ttk.Treeview(preview_frame, columns=('original', 'new'), show='headings', height=15)
+        # 按车源文件夹分组，展开文件夹时才插入其中的文件行
+        self.tree = ttk.Treeview(preview_frame, columns=('original', 'new', 'size', 'status'),
+                                 show='tree headings', height=15)
+        self.tree.heading('#0', text='文件夹')
         self.tree.heading('original', text='原文件名')
         self.tree.heading('new', text='新文件名')
-        self.tree.column('original', width=300)
-        self.tree.column('new', width=300)
+        self.tree.heading('size', text='尺寸')
+        self.tree.heading('status', text='状态')
+        self.tree.column('#0', width=180)
+        self.tree.column('original', width=160)
+        self.tree.column('new', width=200)
+        self.tree.column('size', width=90)
+        self.tree.column('status', width=120)
+        self.tree.bind('<<TreeviewOpen>>', self.on_tree_open)
+        self.tree.bind('<<TreeviewClose>>', self.on_tree_close)
+        self.preview_groups = {}
+        self.preview_generation = 0
+        self.cancel_event = None
         
         # 添加滚动条
         scrollbar = ttk.Scrollbar(preview_frame, orient=tk.VERTICAL, command=self.tree.yview)
@@ -177,13 +285,41 @@ class ImageRenamerApp:
                                      command=self.preview_rename, state='disabled')
         self.preview_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.force_rescan_var = tk.BooleanVar()
+        self.force_rescan_var.set(False)  # 默认使用扫描缓存
+        self.force_rescan_check = ttk.Checkbutton(button_frame, text="强制完整重新扫描",
+                                                  variable=self.force_rescan_var)
+        self.force_rescan_check.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.probe_var = tk.BooleanVar()
+        self.probe_var.set(True)  # 默认预览时检查图片文件头
+        self.probe_check = ttk.Checkbutton(button_frame, text="检查图片", variable=self.probe_var)
+        self.probe_check.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.dedupe_var = tk.BooleanVar()
+        self.dedupe_var.set(True)  # 默认预览时检查重复的图片
+        self.dedupe_check = ttk.Checkbutton(button_frame, text="检查重复", variable=self.dedupe_var)
+        self.dedupe_check.pack(side=tk.LEFT, padx=(0, 10))
+        
         self.rename_btn = ttk.Button(button_frame, text="开始重命名", 
                                     command=self.start_rename, state='disabled')
         self.rename_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.queue_btn = ttk.Button(button_frame, text="批量处理多个文件夹",
+                                    command=self.start_queue)
+        self.queue_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.cancel_btn = ttk.Button(button_frame, text="取消", 
+                                    command=self.cancel_operation, state='disabled')
+        self.cancel_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         self.clear_btn = ttk.Button(button_frame, text="清空", command=self.clear_preview)
         self.clear_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.undo_btn = ttk.Button(button_frame, text="撤销上次处理",
+                                   command=self.undo_last_batch, state='disabled')
+        self.undo_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         self.exit_btn = ttk.Button(button_frame, text="退出", command=self.exit_app)
         self.exit_btn.pack(side=tk.LEFT)
         
@@ -217,6 +353,7 @@ class ImageRenamerApp:
                 # 显示完整路径（支持中文）
                 self.folder_var.set(folder)
                 self.preview_btn.config(state='normal')
+                self.update_undo_button()
                 self.status_var.set(f"已选择文件夹: {os.path.basename(folder)}")
                 print(f"选择的文件夹: {folder}")
         except Exception as e:
@@ -232,279 +369,380 @@ class ImageRenamerApp:
         """切换质量控件的启用状态"""
         if self.compress_var.get():
             self.quality_scale.config(state='normal')
+            self.draft_check.config(state='normal')
+            self.passthrough_check.config(state='normal')
+            self.profile_check.config(state='normal')
+            self.encoder_combo.config(state='readonly')
+            self.backend_combo.config(state='readonly')
+            self.executor_mode_combo.config(state='readonly')
+            self.workers_spin.config(state='normal')
+            self.memory_budget_spin.config(state='normal')
         else:
             self.quality_scale.config(state='disabled')
+            self.draft_check.config(state='disabled')
+            self.passthrough_check.config(state='disabled')
+            self.profile_check.config(state='disabled')
+            self.encoder_combo.config(state='disabled')
+            self.backend_combo.config(state='disabled')
+            self.executor_mode_combo.config(state='disabled')
+            self.workers_spin.config(state='disabled')
+            self.memory_budget_spin.config(state='disabled')
     
-    def compress_image(self, input_path, output_path, target_size=(1800, 1800), quality=85):
-        """压缩图片到指定尺寸（不旋转）"""
+    def load_rule_schemas(self):
+        """读取规则配置，配置文件有错误时提示并只使用内置方案"""
         try:
-            with Image.open(input_path) as img:
-                # 不处理EXIF方向，保持原始方向
-                
-                # 转换为RGB模式（如果是RGBA或其他模式）
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 计算缩放比例，保持宽高比
-                img_width, img_height = img.size
-                target_width, target_height = target_size
-                
-                # 计算缩放比例
-                scale = min(target_width / img_width, target_height / img_height)
-                
-                # 如果图片已经小于目标尺寸，不放大
-                if scale > 1:
-                    scale = 1
-                
-                # 计算新尺寸
-                new_width = int(img_width * scale)
-                new_height = int(img_height * scale)
-                
-                # 缩放图片 - 兼容旧版本PIL
-                try:
-                    img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                except AttributeError:
-                    # 旧版本PIL使用ANTIALIAS
-                    img_resized = img.resize((new_width, new_height), Image.ANTIALIAS)
-                
-                # 创建目标尺寸的白色背景
-                background = Image.new('RGB', target_size, (255, 255, 255))
-                
-                # 计算居中位置
-                x = (target_width - new_width) // 2
-                y = (target_height - new_height) // 2
-                
-                # 将缩放后的图片粘贴到背景上
-                background.paste(img_resized, (x, y))
-                
-                # 保存压缩后的图片
-                background.save(output_path, 'JPEG', quality=quality, optimize=True)
-                
-                return True
-        except Exception as e:
-            print(f"压缩图片失败 {input_path}: {e}")
-            return False
+            return load_default_rule_schemas(BUILTIN_RULE_SCHEMAS)
+        except (OSError, ValueError) as e:
+            print(f"读取规则配置失败: {e}")
+            messagebox.showwarning("规则配置错误", f"读取规则配置失败，将只使用内置规则方案:\n{e}")
+            return BUILTIN_RULE_SCHEMAS
     
-    def extract_number_from_folder_name(self, folder_name):
-        """
-        从第三层文件夹名称中提取车源号
-        格式: 车源号_车辆名
-        例如: 1234567_英菲尼迪G37
-        """
-        # 匹配模式: 数字_车辆名
-        pattern = r'^(\d+)_'
-        match = re.match(pattern, folder_name)
-        if match:
-            return match.group(1)
-        return None
-    
-    def natural_sort_key(self, text):
-        """
-        自然排序键函数
-        将 '1.jpg', '2.jpg', '10.jpg' 正确排序为 1, 2, 10
-        而不是字符串排序的 1, 10, 2
-        """
-        def atoi(text):
-            return int(text) if text.isdigit() else text.lower()
-        
-        return [atoi(c) for c in re.split(r'(\d+)', text)]
+    def describe_schema(self, schema):
+        """规则方案的显示名称"""
+        return f"{schema.description}（{schema.expected_count}张）"
     
-    def get_file_sort_key_by_time(self, folder_path, filename):
-        """
-        获取文件的排序键（按修改时间）
-        """
-        filepath = os.path.join(folder_path, filename)
-        try:
-            stat_info = os.stat(filepath)
-            return (stat_info.st_mtime, filename.lower())
-        except Exception as e:
-            print(f"获取文件信息失败 {filename}: {e}")
-            return (0, filename.lower())
+    def get_schema_name(self):
+        """读取选择的规则方案，自动选择时返回None"""
+        return self.schema_names.get(self.schema_var.get())
     
-    def get_jpg_files_in_folder(self, folder_path):
-        """
-        获取文件夹中的所有jpg文件
-        按文件名自然排序（与文件管理器默认顺序一致）
-        """
-        jpg_files = []
+    def get_order(self):
+        """读取选择的图片顺序"""
+        for key, name in ORDER_MODE_NAMES.items():
+            if name == self.order_var.get():
+                return key
+        return 'name'
+    
+    def get_encoder(self):
+        """读取选择的编码方案"""
+        for key, name in ENCODER_PROFILE_NAMES.items():
+            if name == self.encoder_var.get():
+                return key
+        return DEFAULT_ENCODER_PROFILE
+    
+    def get_backend(self):
+        """读取选择的处理引擎"""
+        return self.backend_names.get(self.backend_var.get(), DEFAULT_BACKEND)
+    
+    def update_encoder_description(self):
+        """显示编码方案的具体参数"""
+        options = ENCODER_PROFILES[self.get_encoder()]
+        parts = ["优化哈夫曼表" if options['optimize'] else "不优化哈夫曼表",
+                 "渐进式" if options['progressive'] else "基线",
+                 f"色度抽样 {options['subsampling']}"]
+        self.encoder_desc_label.config(text="，".join(parts))
+    
+    def on_encoder_change(self, event=None):
+        """切换编码方案时同步默认压缩质量"""
+        quality = ENCODER_PROFILES[self.get_encoder()]['quality']
+        self.quality_var.set(quality)
+        self.update_quality_label(quality)
+        self.update_encoder_description()
+    
+    def get_executor_settings(self):
+        """读取执行方式、工作进程数和内存预算（MB，不限制时为None）"""
+        mode = 'serial'
+        for key, name in EXECUTOR_MODE_NAMES.items():
+            if name == self.executor_mode_var.get():
+                mode = key
         try:
-            for file in os.listdir(folder_path):
-                # 支持更多图片格式，忽略隐藏文件
-                if (not file.startswith('.') and 
-                    file.lower().endswith(('.jpg', '.jpeg'))):
-                    jpg_files.append(file)
-        except PermissionError:
-            print(f"权限错误：无法访问文件夹 {folder_path}")
-            return []
-        except Exception as e:
-            print(f"读取文件夹错误 {folder_path}: {e}")
-            return []
-        
-        # 按文件名自然排序（与文件管理器默认顺序一致）
-        jpg_files.sort(key=self.natural_sort_key)
-        
-        # 调试输出 - 显示排序后的文件顺序
-        if jpg_files:
-            print(f"\n文件夹 '{os.path.basename(folder_path)}' 中的图片顺序（按文件名）:")
-            for i, f in enumerate(jpg_files, 1):
-                print(f"  {i}. {f}")
-        
-        return jpg_files  
-  
-    def extract_folder_info(self, folder_name):
-        """
-        从第二层文件夹名称中提取信息
-        格式: 2025_11_06_芜湖_张三01
-        返回: 张三01 (作为车源号)
-        """
-        # 匹配模式: 年_月_日_城市_名称
-        pattern = r'^\d{4}_\d{1,2}_\d{1,2}_[^_]+_(.+)$'
-        match = re.match(pattern, folder_name)
-        if match:
-            return match.group(1)
-        return None
+            workers = max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            workers = default_worker_count()
+        try:
+            memory_budget = max(0, int(self.memory_budget_var.get())) or None
+        except (tk.TclError, ValueError):
+            memory_budget = None
+        return mode, workers, memory_budget
     
     def preview_rename(self):
-        """预览重命名结果"""
+        """预览重命名结果（在后台线程中扫描，结果逐个文件夹显示）"""
         if not self.selected_folder:
             messagebox.showerror("错误", "请先选择文件夹")
             return
         
+        # 上次的处理没有完成时，询问是否继续
+        journal_path = find_unfinished_journal(self.selected_folder)
+        if journal_path is not None and self.offer_resume(journal_path):
+            return
+        
         # 清空之前的预览
         self.clear_preview()
         
+        self.cancel_event = threading.Event()
+        self.set_busy()
+        self.status_var.set("正在扫描文件夹...")
+        
+        thread = threading.Thread(target=self.perform_preview,
+                                  args=(self.selected_folder, self.force_rescan_var.get(),
+                                        self.probe_var.get(), self.dedupe_var.get(),
+                                        self.get_order(), self.get_schema_name(), self.cancel_event,
+                                        self.preview_generation))
+        thread.daemon = True
+        thread.start()
+    
+    def offer_resume(self, journal_path):
+        """询问是否继续上次未完成的批次，继续时返回True"""
+        try:
+            journal = BatchJournal.load(journal_path)
+        except (OSError, ValueError) as e:
+            print(f"读取处理日志失败: {e}")
+            discard_journal(journal_path)
+            return False
+        
+        counts = journal.counts()
+        result = messagebox.askyesno(
+            "继续处理",
+            f"该文件夹上次的处理没有完成（已完成 {counts['done']}/{len(journal.items)} 个文件）。\n\n"
+            f"是否继续上次的处理？\n选择“否”将放弃上次的处理记录并重新预览。")
+        if not result:
+            journal.close()
+            discard_journal(journal_path)
+            return False
+        
+        self.resume_batch(journal)
+        return True
+    
+    def resume_batch(self, journal):
+        """按处理日志继续上次的批次，已完成的文件不再处理"""
+        self.clear_preview()
+        self.preview_data = journal.items
+        self.cancel_event = threading.Event()
+        self.set_busy()
+        self.status_var.set("正在继续上次的处理...")
+        
+        executor_mode, workers, memory_budget = self.get_executor_settings()
+        thread = threading.Thread(target=self.perform_rename,
+                                  args=(journal.options, self.profile_var.get(), executor_mode,
+                                        workers, self.cancel_event, journal, memory_budget))
+        thread.daemon = True
+        thread.start()
+    
+    def open_journal(self, options):
+        """为本次处理创建日志，失败时返回None（中断后无法继续处理）"""
+        try:
+            return BatchJournal.create(self.selected_folder, self.preview_data, options)
+        except OSError as e:
+            print(f"创建处理日志失败，中断后将无法继续处理: {e}")
+            return None
+    
+    def open_undo_log(self, batch_id):
+        """为本次处理打开撤销记录，失败时返回None（无法撤销）"""
+        try:
+            return UndoLog.open(self.selected_folder, batch_id)
+        except OSError as e:
+            print(f"创建撤销记录失败，本次处理将无法撤销: {e}")
+            return None
+    
+    def update_undo_button(self):
+        """所选文件夹有可以撤销的批次时启用撤销按钮"""
+        has_undo = bool(self.selected_folder) and latest_undo_log(self.selected_folder) is not None
+        self.undo_btn.config(state='normal' if has_undo else 'disabled')
+    
+    def undo_last_batch(self):
+        """把所选文件夹最近一个批次恢复为原文件名"""
+        path = latest_undo_log(self.selected_folder) if self.selected_folder else None
+        if path is None:
+            messagebox.showinfo("提示", "该文件夹没有可以撤销的处理")
+            self.update_undo_button()
+            return
+        try:
+            count = len(UndoLog.load(path).entries)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"读取撤销记录失败: {e}")
+            return
+        
+        result = messagebox.askyesno(
+            "撤销",
+            f"确定要把上次处理的 {count} 个文件恢复为原文件名吗？\n\n"
+            f"压缩过的图片只能恢复文件名，不能恢复原始画质。")
+        if not result:
+            return
+        
+        self.clear_preview()
+        self.cancel_event = threading.Event()
+        self.set_busy()
+        self.status_var.set("正在撤销...")
+        thread = threading.Thread(target=self.perform_undo, args=(path, self.cancel_event))
+        thread.daemon = True
+        thread.start()
+    
+    def perform_undo(self, path, cancel_event):
+        """执行撤销（在后台线程中执行）"""
+        def on_progress(done, total):
+            if done % 10 == 0 or done == total:
+                self.root.after(0, self.update_progress, done / total * 100,
+                                f"正在撤销... {done}/{total}")
+        
+        try:
+            success_count, error_count, errors = undo_batch(path, cancel_event, on_progress)
+            self.root.after(0, self.undo_completed, success_count, error_count, errors)
+        except Exception as e:
+            self.root.after(0, lambda msg=str(e): messagebox.showerror("错误", f"撤销时发生错误: {msg}"))
+            self.root.after(0, self.reset_buttons)
+    
+    def undo_completed(self, success_count, error_count, errors):
+        """撤销完成后的处理"""
+        self.progress_var.set(100)
+        if error_count == 0:
+            messagebox.showinfo("完成", f"撤销完成！已恢复 {success_count} 个文件。")
+        else:
+            error_msg = f"撤销完成！已恢复: {success_count}, 失败: {error_count}\n\n错误详情:\n"
+            error_msg += "\n".join(errors[:10])
+            if len(errors) > 10:
+                error_msg += f"\n... 还有 {len(errors)-10} 个错误"
+            messagebox.showwarning("完成", error_msg)
+        self.status_var.set(f"撤销完成，已恢复: {success_count}, 失败: {error_count}")
+        self.reset_buttons()
+    
+    def perform_preview(self, folder, force_rescan, probe, dedupe, order, schema_name,
+                        cancel_event, generation):
+        """扫描文件夹并生成预览（在后台线程中执行）"""
         try:
             # 检查是否有子文件夹
-            print(f"\n正在扫描文件夹: {self.selected_folder}")
-            all_items = os.listdir(self.selected_folder)
-            print(f"文件夹中的所有项目: {all_items}")
-            
-            subfolders = []
-            for item in all_items:
-                item_path = os.path.join(self.selected_folder, item)
-                is_dir = os.path.isdir(item_path)
-                is_hidden = item.startswith('.')
-                print(f"  - {item}: 是文件夹={is_dir}, 是隐藏={is_hidden}")
-                if is_dir and not is_hidden:
-                    subfolders.append(item)
-            
-            print(f"检测到的子文件夹: {subfolders}")
+            subfolders = list_subfolders(folder, self.scan_cache, force_rescan)
             
-            total_files = 0
-            preview_data = []
-            warnings = []
-            
-            # 模式1: 如果有子文件夹，处理子文件夹（第三层：车源号_车辆名）
-            if subfolders:
-                print("检测到子文件夹，使用模式1：处理子文件夹")
-                for subfolder in subfolders:
-                    subfolder_path = os.path.join(self.selected_folder, subfolder)
-                    
-                    # 提取车源号
-                    number = self.extract_number_from_folder_name(subfolder)
-                    if not number:
-                        warnings.append(f"无法从文件夹名 '{subfolder}' 中提取车源号（格式应为：车源号_车辆名）")
-                        continue
-                    
-                    # 获取jpg文件
-                    jpg_files = self.get_jpg_files_in_folder(subfolder_path)
-                    
-                    if len(jpg_files) != 30:
-                        warnings.append(f"文件夹 '{subfolder}' 中有 {len(jpg_files)} 张图片，不30张")
-                        continue
-                    
-                    # 生成重命名预览
-                    for i, original_file in enumerate(jpg_files):
-                        if i < len(self.rename_rules):
-                            new_name = f"{number}{self.rename_rules[i]}"
-                            preview_data.append({
-                                'folder': subfolder,
-                                'original': original_file,
-                                'new': new_name,
-                                'original_path': os.path.join(subfolder_path, original_file),
-                                'new_path': os.path.join(subfolder_path, new_name)
-                            })
-                            total_files += 1
-            
-            # 模式2: 如果没有子文件夹，提示用户
-            else:
+            # 如果没有子文件夹，提示用户
+            if not subfolders:
                 print("未检测到子文件夹")
-                folder_name = os.path.basename(self.selected_folder)
-                
-                messagebox.showerror("错误", 
-                    f"选择的文件夹中没有子文件夹！\n\n"
-                    f"当前选择: {folder_name}\n\n"
-                    f"正确的文件夹结构应该是：\n"
-                    f"第二层文件夹（你选择的）/\n"
-                    f"  └── 第三层文件夹（车源号_车辆名）/\n"
-                    f"      ├── 1.jpg\n"
-                    f"      ├── 2.jpg\n"
-                    f"      └── ...\n\n"
-                    f"例如：\n"
-                    f"2025_11_06_芜湖_张三01/\n"
-                    f"  ├── 1234567_英菲尼迪G37/\n"
-                    f"  ├── 7654321_宝马X5/\n"
-                    f"  └── 9999999_奔驰C200/\n\n"
-                    f"请检查文件夹结构是否正确！")
+                self.root.after(0, self.show_no_subfolders_error, folder)
                 return
-                
-                # 获取jpg文件
-                jpg_files = self.get_jpg_files_in_folder(self.selected_folder)
-                
-                if len(jpg_files) == 0:
-                    messagebox.showwarning("警告", "当前文件夹中没有找到图片文件")
-                    return
-                
-                if len(jpg_files) != 30:
-                    result = messagebox.askyesno("警告", 
-                        f"当前文件夹中有 {len(jpg_files)} 张图片，不是30张\n是否继续？")
-                    if not result:
-                        return
-                
-                # 生成重命名预览
-                for i, original_file in enumerate(jpg_files):
-                    if i < len(self.rename_rules):
-                        new_name = f"{number}{self.rename_rules[i]}"
-                        preview_data.append({
-                            'folder': '',  # 当前文件夹，不显示子文件夹名
-                            'original': original_file,
-                            'new': new_name,
-                            'original_path': os.path.join(self.selected_folder, original_file),
-                            'new_path': os.path.join(self.selected_folder, new_name)
-                        })
-                        total_files += 1
-            
-            # 显示预览数据
-            for data in preview_data:
-                if data['folder']:
-                    original_display = f"{data['folder']}/{data['original']}"
-                    new_display = f"{data['folder']}/{data['new']}"
-                else:
-                    original_display = data['original']
-                    new_display = data['new']
-                
-                self.tree.insert('', 'end', values=(original_display, new_display))
             
-            self.preview_data = preview_data
-            self.rename_btn.config(state='normal' if preview_data else 'disabled')
+            # 处理子文件夹（第三层：车源号_车辆名）
+            print("检测到子文件夹，使用模式1：处理子文件夹")
             
-            # 显示状态和警告
-            if warnings:
-                warning_msg = "\n".join(warnings[:5])  # 只显示前5个警告
-                if len(warnings) > 5:
-                    warning_msg += f"\n... 还有 {len(warnings)-5} 个警告"
-                messagebox.showwarning("警告", warning_msg)
+            def on_folder(done, total, subfolder, items):
+                self.root.after(0, self.append_preview_folder, generation, done, total,
+                                subfolder, items)
             
-            self.status_var.set(f"预览完成，共 {total_files} 个文件待处理")
+            preview_data, warnings = build_preview(folder, subfolders, cache=self.scan_cache,
+                                                   force_rescan=force_rescan, folder_callback=on_folder,
+                                                   cancel_event=cancel_event, probe=probe,
+                                                   dedupe=dedupe, order=order,
+                                                   schemas=self.rule_schemas,
+                                                   schema_name=schema_name)
+            self.root.after(0, self.preview_completed, generation, preview_data, warnings)
             
+        except OperationCancelled:
+            self.root.after(0, self.preview_cancelled, generation)
         except Exception as e:
-            messagebox.showerror("错误", f"预览时发生错误: {str(e)}")
-            self.status_var.set("预览失败")
+            self.root.after(0, self.preview_failed, str(e))
+    
+    def show_no_subfolders_error(self, folder):
+        """选择的文件夹中没有子文件夹时提示正确的文件夹结构"""
+        self.reset_buttons()
+        self.status_var.set("预览失败")
+        folder_name = os.path.basename(folder)
+        
+        messagebox.showerror("错误", 
+            f"选择的文件夹中没有子文件夹！\n\n"
+            f"当前选择: {folder_name}\n\n"
+            f"正确的文件夹结构应该是：\n"
+            f"第二层文件夹（你选择的）/\n"
+            f"  └── 第三层文件夹（车源号_车辆名）/\n"
+            f"      ├── 1.jpg\n"
+            f"      ├── 2.jpg\n"
+            f"      └── ...\n\n"
+            f"例如：\n"
+            f"2025_11_06_芜湖_张三01/\n"
+            f"  ├── 1234567_英菲尼迪G37/\n"
+            f"  ├── 7654321_宝马X5/\n"
+            f"  └── 9999999_奔驰C200/\n\n"
+            f"请检查文件夹结构是否正确！")
+    
+    def append_preview_folder(self, generation, done, total, folder, items):
+        """显示一个刚扫描完的文件夹"""
+        # 预览已被清空或重新生成
+        if generation != self.preview_generation:
+            return
+        
+        if items:
+            self.add_preview_group(folder, items)
+        self.status_var.set(f"已扫描 {done}/{total} 个文件夹")
+        self.progress_var.set(done / total * 100)
+    
+    def preview_completed(self, generation, preview_data, warnings):
+        """预览完成"""
+        if generation != self.preview_generation:
+            return
+        
+        self.preview_data = preview_data
+        self.reset_buttons()
+        self.rename_btn.config(state='normal' if preview_data else 'disabled')
+        self.progress_var.set(0)
+        
+        # 显示状态和警告
+        if warnings:
+            warning_msg = "\n".join(warnings[:5])  # 只显示前5个警告
+            if len(warnings) > 5:
+                warning_msg += f"\n... 还有 {len(warnings)-5} 个警告"
+            messagebox.showwarning("警告", warning_msg)
+        
+        self.status_var.set(f"预览完成，共 {len(preview_data)} 个文件待处理")
+    
+    def preview_cancelled(self, generation):
+        """预览已取消，已扫描的文件夹保留显示，但不能开始处理"""
+        if generation != self.preview_generation:
+            return
+        
+        self.reset_buttons()
+        self.progress_var.set(0)
+        self.status_var.set("预览已取消")
+    
+    def preview_failed(self, error):
+        """预览失败"""
+        self.reset_buttons()
+        self.progress_var.set(0)
+        messagebox.showerror("错误", f"预览时发生错误: {error}")
+        self.status_var.set("预览失败")
+    
+    def add_preview_group(self, folder, items):
+        """添加一个文件夹行，文件行在展开时才插入"""
+        problems = sum(1 for data in items
+                       if 'duplicate' in data or ('probe' in data and describe_problem(data['probe'])))
+        status_text = f"{problems} 张有问题" if problems else ''
+        count_text = f"{len(items)} 张图片"
+        if items and 'schema' in items[0]:
+            count_text += f"（{items[0]['schema']}）"
+        item_id = self.tree.insert('', 'end', text=folder,
+                                   values=(count_text, '', '', status_text), open=False)
+        # 占位子行，使文件夹可以展开
+        self.tree.insert(item_id, 'end', values=('', '', '', ''))
+        self.preview_groups[item_id] = items
+    
+    def on_tree_open(self, event):
+        """展开文件夹时插入其中的文件行"""
+        item_id = self.tree.focus()
+        items = self.preview_groups.get(item_id)
+        if items is None:
+            return
+        
+        self.tree.delete(*self.tree.get_children(item_id))
+        for data in items:
+            size_text, status_text = describe_probe(data['probe']) if 'probe' in data else ('', '')
+            if 'duplicate' in data:
+                # 重复比EXIF方向等信息更重要，图片本身也有问题时两者都显示
+                duplicate_text = describe_duplicate(data['duplicate'])
+                if 'probe' in data and describe_problem(data['probe']):
+                    status_text = f"{status_text}；{duplicate_text}"
+                else:
+                    status_text = duplicate_text
+            self.tree.insert(item_id, 'end',
+                             values=(data['original'], data['new'], size_text, status_text))
+    
+    def on_tree_close(self, event):
+        """折叠文件夹时移除文件行，只保留占位行"""
+        item_id = self.tree.focus()
+        if item_id not in self.preview_groups:
+            return
+        
+        self.tree.delete(*self.tree.get_children(item_id))
+        self.tree.insert(item_id, 'end', values=('', '', '', ''))
     
     def clear_preview(self):
         """清空预览"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.preview_generation += 1
+        self.preview_groups = {}
+        self.tree.delete(*self.tree.get_children())
         self.rename_btn.config(state='disabled')
         self.preview_data = []
         self.progress_var.set(0)
@@ -521,121 +759,241 @@ class ImageRenamerApp:
             return
         
         # 确认对话框
+        operation_text, undo_text = self.describe_operations()
+        
+        result = messagebox.askyesno("确认", 
+                                   f"确定要对 {len(self.preview_data)} 个文件执行以下操作吗？\n\n{operation_text}\n\n{undo_text}")
+        if not result:
+            return
+        
+        # 在新线程中执行处理
+        self.cancel_event = threading.Event()
+        self.set_busy()
+        
+        # 界面选项在主线程中读取，后台线程不访问Tk变量
+        executor_mode, workers, memory_budget = self.get_executor_settings()
+        thread = threading.Thread(target=self.perform_rename,
+                                  args=(self.get_process_options(), self.profile_var.get(),
+                                        executor_mode, workers, self.cancel_event, None,
+                                        memory_budget))
+        thread.daemon = True
+        thread.start()
+    
+    def describe_operations(self):
+        """确认对话框中的操作说明，返回 (操作, 撤销说明)"""
         operations = []
         if self.rename_enable_var.get():
             operations.append("重命名")
         if self.compress_var.get():
             quality = int(self.quality_var.get())
-            operations.append(f"压缩到1800×1800像素（质量{quality}%）")
+            encoder_name = ENCODER_PROFILE_NAMES[self.get_encoder()]
+            operations.append(f"压缩到1800×1800像素（质量{quality}%，{encoder_name}编码）")
         
-        operation_text = "、".join(operations)
+        if self.compress_var.get():
+            undo_text = "压缩不可撤销！"
+            if self.rename_enable_var.get():
+                undo_text += "（之后可以通过“撤销上次处理”恢复文件名）"
+        else:
+            undo_text = "之后可以通过“撤销上次处理”恢复原文件名。"
+        return "、".join(operations), undo_text
+    
+    def get_process_options(self):
+        """当前界面上的处理选项（apply_preview 的参数）"""
+        return {
+            'rename_enabled': self.rename_enable_var.get(),
+            'compress_enabled': self.compress_var.get(),
+            'quality': int(self.quality_var.get()),
+            'target_size': TARGET_SIZE,
+            'draft': self.draft_var.get(),
+            'passthrough': self.passthrough_var.get(),
+            'encoder': self.get_encoder(),
+            'backend': self.get_backend(),
+        }
+    
+    def start_queue(self):
+        """批量处理：选择存放多个日期文件夹的上一层文件夹，依次扫描并处理其中每个第二层文件夹"""
+        if not self.rename_enable_var.get() and not self.compress_var.get():
+            messagebox.showerror("错误", "请至少勾选一个操作（重命名或压缩）")
+            return
         
-        result = messagebox.askyesno("确认", 
-                                   f"确定要对 {len(self.preview_data)} 个文件执行以下操作吗？\n\n{operation_text}\n\n此操作不可撤销！")
-        if not result:
+        folder = filedialog.askdirectory(
+            title="选择存放多个日期文件夹的上一层文件夹（或一个第二层文件夹）",
+            mustexist=True
+        )
+        if not folder:
+            return
+        try:
+            roots = discover_roots(folder, self.scan_cache)
+        except OSError as e:
+            messagebox.showerror("错误", f"读取文件夹失败: {e}")
             return
         
-        # 在新线程中执行处理
-        self.rename_btn.config(state='disabled')
-        self.preview_btn.config(state='disabled')
+        names = [os.path.basename(root) for root in roots]
+        folder_text = "\n".join(names[:10])
+        if len(names) > 10:
+            folder_text += f"\n... 还有 {len(names) - 10} 个文件夹"
+        operation_text, undo_text = self.describe_operations()
+        if not messagebox.askyesno("确认",
+                                   f"将依次处理以下 {len(roots)} 个文件夹：\n{folder_text}\n\n"
+                                   f"{operation_text}\n\n"
+                                   f"图片数量不对的车源文件夹会跳过；有未完成批次的文件夹会继续处理。\n"
+                                   f"{undo_text}"):
+            return
+        
+        self.clear_preview()
+        self.cancel_event = threading.Event()
+        self.set_busy()
+        self.status_var.set(f"正在批量处理 {len(roots)} 个文件夹...")
         
-        thread = threading.Thread(target=self.perform_rename)
+        executor_mode, workers, memory_budget = self.get_executor_settings()
+        preview_options = {'order': self.get_order(), 'schemas': self.rule_schemas,
+                           'schema_name': self.get_schema_name()}
+        thread = threading.Thread(target=self.perform_queue,
+                                  args=(roots, self.get_process_options(), preview_options,
+                                        executor_mode, workers, self.cancel_event,
+                                        memory_budget))
         thread.daemon = True
         thread.start()
     
-    def perform_rename(self):
-        """执行处理操作（重命名和/或压缩）"""
+    def perform_queue(self, roots, options, preview_options, executor_mode, workers, cancel_event,
+                      memory_budget=None):
+        """批量处理多个文件夹（在后台线程中执行）：扫描下一个文件夹和处理当前文件夹同时进行"""
         try:
-            total = len(self.preview_data)
-            success_count = 0
-            error_count = 0
-            errors = []
+            def on_progress(progress):
+                self.root.after(0, self.update_progress, progress.percent,
+                                f"正在批量处理... {progress.format()}")
             
-            rename_enabled = self.rename_enable_var.get()
-            compress_enabled = self.compress_var.get()
+            def on_root(index, result):
+                print(f"完成 {index + 1}/{len(roots)}: {result}")
             
-            for i, data in enumerate(self.preview_data):
-                try:
-                    # 检查原文件是否存在
-                    if not os.path.exists(data['original_path']):
-                        errors.append(f"文件不存在: {data['original_path']}")
-                        error_count += 1
-                        continue
-                    
-                    # 根据用户选择执行不同的操作
-                    if compress_enabled and rename_enabled:
-                        # 压缩并重命名
-                        if os.path.exists(data['new_path']):
-                            errors.append(f"目标文件已存在: {data['new_path']}")
-                            error_count += 1
-                            continue
-                        
-                        quality = int(self.quality_var.get())
-                        if self.compress_image(data['original_path'], data['new_path'], 
-                                             target_size=(1800, 1800), quality=quality):
-                            os.remove(data['original_path'])
-                            success_count += 1
-                        else:
-                            errors.append(f"压缩失败: {data['original']}")
-                            error_count += 1
-                    
-                    elif compress_enabled and not rename_enabled:
-                        # 只压缩，不重命名（覆盖原文件）
-                        import tempfile
-                        temp_path = data['original_path'] + '.tmp'
-                        quality = int(self.quality_var.get())
-                        if self.compress_image(data['original_path'], temp_path, 
-                                             target_size=(1800, 1800), quality=quality):
-                            os.remove(data['original_path'])
-                            os.rename(temp_path, data['original_path'])
-                            success_count += 1
-                        else:
-                            if os.path.exists(temp_path):
-                                os.remove(temp_path)
-                            errors.append(f"压缩失败: {data['original']}")
-                            error_count += 1
-                    
-                    elif rename_enabled and not compress_enabled:
-                        # 只重命名，不压缩
-                        if os.path.exists(data['new_path']):
-                            errors.append(f"目标文件已存在: {data['new_path']}")
-                            error_count += 1
-                            continue
-                        
-                        os.rename(data['original_path'], data['new_path'])
-                        success_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"处理失败 {data['original']}: {str(e)}")
-                    error_count += 1
-                
-                # 更新进度条
-                progress = (i + 1) / total * 100
-                self.root.after(0, lambda p=progress: self.progress_var.set(p))
-                
-                # 更新状态显示
-                operations = []
-                if compress_enabled:
-                    operations.append("压缩")
-                if rename_enabled:
-                    operations.append("重命名")
-                operation_text = "和".join(operations)
-                status_text = f"正在{operation_text}... {i+1}/{total}"
-                self.root.after(0, lambda text=status_text: self.status_var.set(text))
+            results = process_roots(roots, options, cache=self.scan_cache,
+                                    preview_options=preview_options, executor_mode=executor_mode,
+                                    workers=workers, progress_callback=on_progress,
+                                    root_callback=on_root, cancel_event=cancel_event,
+                                    memory_budget=memory_budget)
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            self.root.after(0, self.queue_completed, roots, results, cancelled)
+        except Exception as e:
+            self.root.after(0, lambda msg=str(e): messagebox.showerror("错误", f"批量处理时发生错误: {msg}"))
+            self.root.after(0, self.reset_buttons)
+    
+    def queue_completed(self, roots, results, cancelled):
+        """批量处理完成，按文件夹汇总结果"""
+        self.progress_var.set(100)
+        success_count = sum(r.get('success', 0) for r in results)
+        error_count = sum(r.get('failed', 0) for r in results)
+        
+        lines = []
+        for result in results:
+            name = os.path.basename(result['folder'])
+            if 'error' in result:
+                lines.append(f"{name}: {result['error']}")
+                continue
+            line = f"{name}: 成功 {result['success']}，失败 {result['failed']}"
+            if result['warnings']:
+                line += f"，{len(result['warnings'])} 个警告（跳过的车源文件夹见控制台）"
+                for warning in result['warnings']:
+                    print(f"警告 {name}: {warning}")
+            if result['resumed']:
+                line += "（继续上次的批次）"
+            lines.append(line)
+        if len(results) < len(roots):
+            lines.append(f"未处理 {len(roots) - len(results)} 个文件夹")
+        detail = "\n".join(lines[:20])
+        if len(lines) > 20:
+            detail += f"\n... 还有 {len(lines) - 20} 行"
+        
+        summary = f"共 {len(roots)} 个文件夹，成功: {success_count}, 失败: {error_count}"
+        if cancelled:
+            messagebox.showwarning("已取消", f"批量处理已取消！{summary}\n\n{detail}")
+            self.status_var.set(f"批量处理已取消，{summary}")
+        elif error_count or any('error' in r for r in results):
+            messagebox.showwarning("完成", f"批量处理完成！{summary}\n\n{detail}")
+            self.status_var.set(f"批量处理完成，{summary}")
+        else:
+            messagebox.showinfo("完成", f"批量处理完成！{summary}\n\n{detail}")
+            self.status_var.set(f"批量处理完成，{summary}")
+        self.reset_buttons()
+    
+    def perform_rename(self, options, profile_enabled=False, executor_mode='serial', workers=1,
+                       cancel_event=None, journal=None, memory_budget=None):
+        """
+        执行处理操作（重命名和/或压缩）；options 为 apply_preview 的处理选项，
+        journal 不为None时按日志继续上次的批次（options 为日志中的选项）
+        """
+        try:
+            if journal is None:
+                journal = self.open_journal(options)
+            rename_enabled = options['rename_enabled']
+            compress_enabled = options['compress_enabled']
+            undo_log = None
+            if rename_enabled:
+                undo_log = self.open_undo_log(journal.batch_id if journal is not None
+                                              else new_batch_id())
+            profile = CompressionProfile() if compress_enabled and profile_enabled else None
+            
+            operations = []
+            if compress_enabled:
+                operations.append("压缩")
+            if rename_enabled:
+                operations.append("重命名")
+            operation_text = "和".join(operations)
+            
+            def on_progress(snapshot):
+                # 进度更新已合并（最多每秒20次），每次只调度一个界面回调
+                status_text = f"正在{operation_text}... {snapshot.format()}"
+                self.root.after(0, self.update_progress, snapshot.percent, status_text)
+            
+            try:
+                success_count, error_count, errors = apply_preview(
+                    self.preview_data, executor_mode=executor_mode, workers=workers,
+                    progress_callback=on_progress, cancel_event=cancel_event,
+                    profile=profile, memory_budget=memory_budget, journal=journal,
+                    undo_log=undo_log, **options)
+            finally:
+                if undo_log is not None:
+                    undo_log.close()
+            
+            # 保存耗时统计报告
+            profile_text = None
+            if profile is not None:
+                report_path = profile.write_report()
+                profile_text = f"{profile.format_summary()}\n报告已保存: {report_path}"
+                print(f"\n耗时统计:\n{profile_text}")
             
             # 完成后的处理
-            self.root.after(0, self.rename_completed, success_count, error_count, errors)
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            self.root.after(0, self.rename_completed, success_count, error_count, errors,
+                            cancelled, profile_text, journal is not None)
             
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("错误", f"处理过程中发生错误: {str(e)}"))
+            self.root.after(0, lambda msg=str(e): messagebox.showerror("错误", f"处理过程中发生错误: {msg}"))
             self.root.after(0, self.reset_buttons)
     
-    def rename_completed(self, success_count, error_count, errors):
+    def update_progress(self, percent, status_text):
+        """更新进度条和状态显示"""
+        self.progress_var.set(percent)
+        self.status_var.set(status_text)
+    
+    def rename_completed(self, success_count, error_count, errors, cancelled=False,
+                         profile_text=None, resumable=False):
         """处理完成后的处理"""
         self.progress_var.set(100)
+        profile_msg = f"\n\n耗时统计:\n{profile_text}" if profile_text else ""
         
-        if error_count == 0:
-            messagebox.showinfo("完成", f"处理完成！成功处理 {success_count} 个文件。")
+        if cancelled:
+            skipped = len(self.preview_data) - success_count - error_count
+            error_msg = f"处理已取消！成功: {success_count}, 失败: {error_count}, 未处理: {skipped}"
+            if errors:
+                error_msg += "\n\n错误详情:\n" + "\n".join(errors[:10])
+                if len(errors) > 10:
+                    error_msg += f"\n... 还有 {len(errors)-10} 个错误"
+            if resumable:
+                error_msg += "\n\n再次预览该文件夹时可以继续处理剩余的文件"
+            messagebox.showwarning("已取消", error_msg + profile_msg)
+            self.status_var.set(f"处理已取消，成功: {success_count}, 失败: {error_count}, 未处理: {skipped}")
+        elif error_count == 0:
+            messagebox.showinfo("完成", f"处理完成！成功处理 {success_count} 个文件。{profile_msg}")
             self.status_var.set(f"处理完成，成功处理 {success_count} 个文件")
         else:
             error_msg = f"处理完成！成功: {success_count}, 失败: {error_count}\n\n"
@@ -644,22 +1002,45 @@ class ImageRenamerApp:
             else:
                 error_msg += "错误详情:\n" + "\n".join(errors[:10]) + f"\n... 还有 {len(errors)-10} 个错误"
             
-            messagebox.showwarning("完成", error_msg)
+            messagebox.showwarning("完成", error_msg + profile_msg)
             self.status_var.set(f"处理完成，成功: {success_count}, 失败: {error_count}")
         
         self.reset_buttons()
         # 清空预览，让用户重新预览
         self.clear_preview()
     
+    def set_busy(self):
+        """扫描或处理进行中：禁用其他操作，只允许取消"""
+        self.rename_btn.config(state='disabled')
+        self.preview_btn.config(state='disabled')
+        self.browse_btn.config(state='disabled')
+        self.clear_btn.config(state='disabled')
+        self.undo_btn.config(state='disabled')
+        self.queue_btn.config(state='disabled')
+        self.cancel_btn.config(state='normal')
+    
+    def cancel_operation(self):
+        """取消正在进行的扫描或处理"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.cancel_btn.config(state='disabled')
+        self.status_var.set("正在取消...")
+    
     def reset_buttons(self):
         """重置按钮状态"""
         self.rename_btn.config(state='disabled')
         self.preview_btn.config(state='normal' if self.selected_folder else 'disabled')
+        self.browse_btn.config(state='normal')
+        self.clear_btn.config(state='normal')
+        self.queue_btn.config(state='normal')
+        self.cancel_btn.config(state='disabled')
+        self.update_undo_button()
+        self.cancel_event = None
     
     def exit_app(self):
         """退出应用程序"""
         # 检查是否有正在进行的重命名操作
-        if hasattr(self, 'preview_data') and self.preview_data and self.rename_btn['state'] == 'disabled':
+        if self.cancel_event is not None:
             result = messagebox.askyesno("确认退出", 
                                        "检测到可能有重命名操作正在进行中。\n确定要退出程序吗？")
             if not result:
@@ -668,6 +1049,8 @@ class ImageRenamerApp:
         # 确认退出
         result = messagebox.askyesno("确认退出", "确定要退出图片重命名工具吗？")
         if result:
+            if self.scan_cache is not None:
+                self.scan_cache.close()
             self.root.quit()
             self.root.destroy()
 
@@ -703,4 +1086,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序使用多进程时需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 缩放和编码引擎
+压缩时的解码、缩放、补白边和JPEG编码由引擎完成，是否直接沿用原文件等判断仍由核心模块负责。
+pillow 为默认引擎（安装的是 Pillow-SIMD 时自动使用其加速的缩放）；
+安装了 pyvips（及系统的 libvips）时可以使用 vips 引擎，多线程缩放且按流式处理，内存占用更小。
+可用的引擎在导入时检测，性能测试可以在同一批图片上对比各引擎（见 image_renamer_bench）
+"""
+
+import io
+
+import PIL
+from PIL import Image, ImageOps
+
+try:
+    import pyvips
+except (ImportError, OSError):
+    # 没有安装 pyvips，或者找不到系统的 libvips 库
+    pyvips = None
+
+# 默认引擎
+DEFAULT_BACKEND = 'pillow'
+
+# Pillow-SIMD 的版本号带有 .postN 后缀，接口与 Pillow 完全相同
+PILLOW_SIMD = '.post' in PIL.__version__
+
+# 可以先缩小再转为RGB的模式（结果与先转换再缩小相同或几乎相同，且只需转换缩小后的像素）；
+# 其他模式（调色板、二值图等不能用LANCZOS缩放的）先转为RGB
+RESIZE_BEFORE_CONVERT_MODES = ('RGB', 'L', 'CMYK')
+
+# 白色背景
+WHITE = (255, 255, 255)
+
+
+def _replace_image(old, new):
+    """用处理后的新图片代替旧图片，立即释放旧图片的像素数据，同一时间最多只有两份图片在内存中"""
+    old.close()
+    return new
+
+
+def _padding(size, target_size):
+    """居中补白边时左、上、右、下的宽度"""
+    x = (target_size[0] - size[0]) // 2
+    y = (target_size[1] - size[1]) // 2
+    return x, y, target_size[0] - size[0] - x, target_size[1] - size[1] - y
+
+
+class PillowBackend:
+    """Pillow（或 Pillow-SIMD）引擎：JPEG按draft快速解码，LANCZOS缩放"""
+
+    name = 'pillow'
+    available = True
+
+    @property
+    def description(self):
+        return f"{'Pillow-SIMD' if PILLOW_SIMD else 'Pillow'} {PIL.__version__}"
+
+    def encode(self, source, img, new_size, target_size, output, save_options, draft, timer):
+        """
+        img 为已打开（只读了文件头）的图片，缩放到 new_size 后居中补白边到 target_size，
+        按 save_options 编码保存到 output；source 为 img 的来源（本引擎不需要）
+        """
+        new_width, new_height = new_size
+
+        # 快速解码：只对需要缩小的图片生效，非JPEG格式会忽略
+        if draft and new_size != img.size:
+            img.draft('RGB', new_size)
+
+        # 解码像素数据
+        img.load()
+        timer.mark('decode')
+
+        # 调色板、二值图等不能直接缩放的模式先转换为RGB
+        if img.mode not in RESIZE_BEFORE_CONVERT_MODES:
+            img = _replace_image(img, img.convert('RGB'))
+            timer.mark('convert')
+
+        # 缩放图片 - 兼容旧版本PIL；尺寸不变时不缩放（Pillow也只是复制一份）
+        if (new_width, new_height) != img.size:
+            try:
+                resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            except AttributeError:
+                # 旧版本PIL使用ANTIALIAS
+                resized = img.resize((new_width, new_height), Image.ANTIALIAS)
+            img = _replace_image(img, resized)
+        timer.mark('resize')
+
+        # 缩小后再转换为RGB模式（灰度、CMYK），只需转换目标尺寸的像素
+        if img.mode != 'RGB':
+            img = _replace_image(img, img.convert('RGB'))
+        timer.mark('convert')
+
+        # 不是正方形时居中并在四周补白边到目标尺寸，正好等于目标尺寸时不需要新画布
+        if img.size != tuple(target_size):
+            img = _replace_image(img, ImageOps.expand(img, _padding(img.size, target_size),
+                                                      fill=WHITE))
+        timer.mark('paste')
+
+        # 保存压缩后的图片
+        img.save(output, 'JPEG', **save_options)
+        timer.mark('encode')
+
+
+class VipsBackend:
+    """
+    libvips 引擎：thumbnail 在解码时利用JPEG的DCT缩放（与draft相同），lanczos3 缩放，
+    多线程且按需流式计算，直到编码时才真正解码和缩放，因此各步骤的耗时都计入 encode
+    """
+
+    name = 'vips'
+
+    @property
+    def available(self):
+        return pyvips is not None
+
+    @property
+    def description(self):
+        if pyvips is None:
+            return "libvips（未安装 pyvips）"
+        return f"libvips {pyvips.version(0)}.{pyvips.version(1)}.{pyvips.version(2)}"
+
+    def encode(self, source, img, new_size, target_size, output, save_options, draft, timer):
+        """参数与 PillowBackend.encode 相同，img 只用于读取原图尺寸"""
+        data = _source_bytes(source)
+        if draft and new_size != img.size:
+            image = pyvips.Image.thumbnail_buffer(data, new_size[0], height=new_size[1],
+                                                  size='down', no_rotate=True)
+        else:
+            image = pyvips.Image.new_from_buffer(data, '', access='sequential')
+            if new_size != img.size:
+                image = image.resize(new_size[0] / image.width,
+                                     vscale=new_size[1] / image.height, kernel='lanczos3')
+        timer.mark('decode')
+
+        # 转换为sRGB三通道（灰度、CMYK），去掉透明通道
+        if image.interpretation != 'srgb':
+            image = image.colourspace('srgb')
+        if image.bands > 3:
+            image = image.extract_band(0, n=3)
+
+        if (image.width, image.height) != tuple(target_size):
+            image = image.gravity('centre', target_size[0], target_size[1],
+                                  extend='background', background=list(WHITE))
+
+        content = image.jpegsave_buffer(
+            Q=save_options['quality'], optimize_coding=save_options['optimize'],
+            interlace=save_options['progressive'],
+            subsample_mode='on' if save_options['subsampling'] == '4:2:0' else 'off',
+            strip=True)
+        _write_to(output, content)
+        timer.mark('encode')
+
+
+def _source_bytes(source):
+    """读取图片来源（路径或文件对象）的全部数据"""
+    if isinstance(source, io.BytesIO):
+        return source.getvalue()
+    if hasattr(source, 'read'):
+        source.seek(0)
+        return source.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def _write_to(output, content):
+    """写入编码结果，output 为路径或文件对象"""
+    if hasattr(output, 'write'):
+        output.write(content)
+    else:
+        with open(output, 'wb') as f:
+            f.write(content)
+
+
+# 所有引擎（包括未安装的），按名称查找
+BACKENDS = {backend.name: backend for backend in (PillowBackend(), VipsBackend())}
+
+
+def available_backends():
+    """本机已安装的引擎名称"""
+    return tuple(name for name, backend in BACKENDS.items() if backend.available)
+
+
+def get_backend(name=DEFAULT_BACKEND):
+    """按名称返回引擎，未知或未安装时抛出 ValueError"""
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"未知的处理引擎: {name}（可选: {', '.join(BACKENDS)}）")
+    if not backend.available:
+        raise ValueError(f"处理引擎 {name} 不可用: {backend.description}")
+    return backend
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 性能测试
+生成模拟的拍摄批次（2025_11_06_芜湖_张三01/1234567_车名/1..30.jpg），
+分阶段计时：扫描、预览、只重命名、只压缩、压缩并重命名，
+结果保存为JSON，可与之前的结果对比；指定多个编码方案或处理引擎时，
+压缩阶段在同一批图片上对每个组合各运行一次，同时记录输出体积，用于选择本机最快的引擎。
+生成图片和每个阶段都在新的子进程中运行，内存峰值只包含该阶段（及其工作进程）
+
+用法:
+    python image_renamer_bench.py --folders 4 --width 6000 --height 4000 --output bench.json
+    python image_renamer_bench.py --compare bench.json
+    python image_renamer_bench.py --stages compress --encoders fast balanced smallest
+    python image_renamer_bench.py --stages compress --backends pillow vips
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PIL
+from PIL import Image
+
+import image_renamer_core as core
+from image_renamer_backends import BACKENDS, DEFAULT_BACKEND, PILLOW_SIMD, available_backends
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，不统计内存峰值
+    resource = None
+
+# 所有测试阶段（按执行顺序）
+STAGES = ('scan', 'preview', 'rename', 'compress', 'compress_rename')
+
+# 与编码方案和处理引擎有关的阶段
+COMPRESS_STAGES = ('compress', 'compress_rename')
+
+BATCH_NAME = "2025_11_06_芜湖_张三01"
+
+# 翻转/旋转方式 - 兼容旧版本PIL（Image.Transpose 从 Pillow 9.1 开始才有）
+TRANSPOSE = getattr(Image, 'Transpose', Image)
+
+
+def make_synthetic_image(path, size, seed, quality=92):
+    """生成一张带渐变和噪点的模拟照片（比纯色或纯噪点更接近真实照片的压缩特性）"""
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 20 + seed % 30)
+    red = Image.blend(gradient, noise, 0.3)
+    green = Image.blend(gradient.transpose(TRANSPOSE.ROTATE_180), noise, 0.2)
+    blue = Image.blend(gradient.transpose(TRANSPOSE.FLIP_LEFT_RIGHT), noise, 0.4)
+    Image.merge('RGB', (red, green, blue)).save(path, 'JPEG', quality=quality)
+
+
+def generate_batch(root, folders=4, images=core.EXPECTED_IMAGE_COUNT, size=(6000, 4000),
+                   unique_images=3):
+    """
+    生成模拟批次，返回第二层文件夹路径
+    只生成 unique_images 张不同的图片，其余复制文件，加快生成速度
+    """
+    batch = os.path.join(root, BATCH_NAME)
+    sources = []
+    source_dir = os.path.join(root, '_sources')
+    os.makedirs(source_dir, exist_ok=True)
+    for seed in range(max(1, unique_images)):
+        path = os.path.join(source_dir, f"source_{seed}.jpg")
+        make_synthetic_image(path, size, seed)
+        sources.append(path)
+
+    for folder_index in range(folders):
+        car = os.path.join(batch, f"{1000000 + folder_index}_车名{folder_index + 1}")
+        os.makedirs(car)
+        for i in range(1, images + 1):
+            shutil.copyfile(sources[(folder_index + i) % len(sources)],
+                            os.path.join(car, f"{i}.jpg"))
+    return batch
+
+
+def peak_rss_mb():
+    """
+    本进程和已结束子进程的内存峰值（MB），无法统计时返回None
+    ru_maxrss 是整个进程生存期内的最大值，因此每个阶段要在新的进程中运行（见 run_isolated）
+    """
+    if resource is None:
+        return None
+    # macOS 以字节为单位，Linux 以KB为单位
+    unit = 1 if sys.platform == 'darwin' else 1024
+    self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return round(max(self_peak, children_peak) / 1024 / 1024, 1)
+
+
+def total_bytes(preview_data):
+    return sum(os.path.getsize(data['original_path']) for data in preview_data)
+
+
+def output_bytes(preview_data, rename_enabled):
+    """处理后输出文件的总大小"""
+    key = 'new_path' if rename_enabled else 'original_path'
+    return sum(os.path.getsize(data[key]) for data in preview_data if os.path.exists(data[key]))
+
+
+def run_isolated(func, *args):
+    """在新启动（spawn，不继承本进程内存）的子进程中运行 func 并返回结果"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(func, *args).result()
+
+
+def run_stage(stage, template, workdir, args, encoder=core.DEFAULT_ENCODER_PROFILE,
+              backend=DEFAULT_BACKEND, measure_rss=True):
+    """
+    在模板批次的副本上运行一个阶段，返回计时结果
+    measure_rss=True 时记录内存峰值，只在单独运行该阶段的子进程中才有意义
+    """
+    batch = os.path.join(workdir, stage, BATCH_NAME)
+    shutil.copytree(template, batch)
+
+    # 核心模块的调试输出不计入结果
+    with contextlib.redirect_stdout(io.StringIO()):
+        preview_data, _ = core.build_preview(batch)
+        nbytes = total_bytes(preview_data)
+        options = {
+            'rename': dict(rename_enabled=True, compress_enabled=False),
+            'compress': dict(rename_enabled=False, compress_enabled=True),
+            'compress_rename': dict(rename_enabled=True, compress_enabled=True),
+        }
+
+        start = time.perf_counter()
+        if stage == 'scan':
+            files = sum(len(car_folder.images) for car_folder in core.walk_car_folders(batch))
+        elif stage == 'preview':
+            files = len(core.build_preview(batch, probe=True)[0])
+        else:
+            success, failed, _ = core.apply_preview(
+                preview_data, quality=args.quality, encoder=encoder, backend=backend,
+                draft=not args.no_draft, executor_mode=args.executor, workers=args.workers,
+                **options[stage])
+            files = success + failed
+        seconds = time.perf_counter() - start
+
+    output_mb = None
+    if stage in COMPRESS_STAGES:
+        output_mb = round(output_bytes(preview_data, options[stage]['rename_enabled'])
+                          / 1024 / 1024, 2)
+
+    shutil.rmtree(os.path.join(workdir, stage))
+    return {
+        'seconds': round(seconds, 4),
+        'files': files,
+        'files_per_sec': round(files / seconds, 1) if seconds > 0 else None,
+        'mb_per_sec': round(nbytes / 1024 / 1024 / seconds, 1)
+        if seconds > 0 and stage not in ('scan', 'preview') else None,
+        'peak_rss_mb': peak_rss_mb() if measure_rss else None,
+        'output_mb': output_mb,
+    }
+
+
+def run_benchmark(args):
+    """
+    生成模拟批次并依次运行各阶段
+    args.no_isolate 为False时生成图片和每个阶段都在单独的子进程中运行，分别记录内存峰值；
+    为True时都在本进程中运行（可以使用本进程中注册的引擎），不记录内存峰值
+    """
+    workdir = args.workdir or tempfile.mkdtemp(prefix='image_renamer_bench_')
+    os.makedirs(workdir, exist_ok=True)
+
+    def run(func, *func_args):
+        if args.no_isolate:
+            return func(*func_args)
+        return run_isolated(func, *func_args)
+
+    try:
+        print(f"生成模拟批次: {args.folders} 个文件夹 × {args.images} 张 "
+              f"{args.width}×{args.height} 图片 ...", file=sys.stderr)
+        template = run(generate_batch, os.path.join(workdir, 'template'), args.folders,
+                       args.images, (args.width, args.height), args.unique_images)
+
+        stages = {}
+        for stage in args.stages:
+            if stage not in COMPRESS_STAGES:
+                print(f"运行阶段: {stage} ...", file=sys.stderr)
+                stages[stage] = run(run_stage, stage, template, workdir, args,
+                                    core.DEFAULT_ENCODER_PROFILE, DEFAULT_BACKEND,
+                                    not args.no_isolate)
+                continue
+            # 多个编码方案或引擎时以 阶段:方案:引擎 区分结果（只有一个的部分省略）
+            for encoder in args.encoders:
+                for backend in args.backends:
+                    key = ':'.join([stage] + ([encoder] if len(args.encoders) > 1 else [])
+                                   + ([backend] if len(args.backends) > 1 else []))
+                    print(f"运行阶段: {key} ...", file=sys.stderr)
+                    stages[key] = run(run_stage, stage, template, workdir, args, encoder,
+                                      backend, not args.no_isolate)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'config': {
+            'folders': args.folders, 'images': args.images,
+            'width': args.width, 'height': args.height, 'quality': args.quality,
+            'draft': not args.no_draft, 'encoders': args.encoders, 'backends': args.backends,
+            'executor': args.executor,
+            'workers': args.workers or core.default_worker_count(),
+            'isolated': not args.no_isolate,
+        },
+        'environment': {
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'pillow': PIL.__version__, 'pillow_simd': PILLOW_SIMD, 'cpu_count': os.cpu_count(),
+            'backends': {name: BACKENDS[name].description for name in available_backends()},
+        },
+        'stages': stages,
+    }
+
+
+def format_report(result, baseline=None):
+    """格式化为文字表格；给定 baseline 时附加与基准的耗时对比"""
+    lines = [f"{'阶段':<34}{'耗时(秒)':>10}{'张/秒':>10}{'MB/秒':>10}{'输出MB':>10}{'内存峰值MB':>12}"
+             + (f"{'对比基准':>10}" if baseline else '')]
+    for stage, stats in result['stages'].items():
+        output_mb = stats.get('output_mb')
+        peak_mb = stats.get('peak_rss_mb')
+        line = (f"{stage:<34}{stats['seconds']:>10.3f}{stats['files_per_sec'] or 0:>10.1f}"
+                f"{stats['mb_per_sec'] or 0:>10.1f}"
+                f"{output_mb if output_mb is not None else '-':>10}"
+                f"{peak_mb if peak_mb is not None else '-':>12}")
+        if baseline:
+            base = baseline.get('stages', {}).get(stage)
+            if base and base['seconds']:
+                line += f"{stats['seconds'] / base['seconds']:>9.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='图片批量重命名工具性能测试')
+    parser.add_argument('--folders', type=int, default=4, help='车源文件夹数量（默认4）')
+    parser.add_argument('--images', type=int, default=core.EXPECTED_IMAGE_COUNT,
+                        help=f'每个文件夹的图片数量（默认{core.EXPECTED_IMAGE_COUNT}）')
+    parser.add_argument('--width', type=int, default=6000, help='图片宽度（默认6000）')
+    parser.add_argument('--height', type=int, default=4000, help='图片高度（默认4000）')
+    parser.add_argument('--unique-images', type=int, default=3,
+                        help='生成的不同图片数量，其余为复制（默认3）')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES),
+                        help='要运行的阶段（默认全部）')
+    parser.add_argument('--quality', type=int, default=None,
+                        help='压缩质量（默认使用编码方案的质量）')
+    parser.add_argument('--encoders', nargs='+', choices=list(core.ENCODER_PROFILES),
+                        default=[core.DEFAULT_ENCODER_PROFILE],
+                        help=f'压缩阶段使用的编码方案，可指定多个进行对比'
+                             f'（默认{core.DEFAULT_ENCODER_PROFILE}）')
+    parser.add_argument('--backends', nargs='+', choices=list(available_backends()),
+                        default=[DEFAULT_BACKEND],
+                        help=f'压缩阶段使用的处理引擎，可指定多个进行对比（默认{DEFAULT_BACKEND}，'
+                             f'本机可用: {", ".join(available_backends())}）')
+    parser.add_argument('--no-draft', action='store_true', help='压缩时完整解码原图')
+    parser.add_argument('--executor', choices=core.EXECUTOR_MODES, default='process',
+                        help='执行方式（默认process）')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数（默认CPU核心数）')
+    parser.add_argument('--no-isolate', action='store_true',
+                        help='所有阶段在同一进程中运行（不记录各阶段的内存峰值）')
+    parser.add_argument('--workdir', help='生成模拟批次的目录（默认临时目录）')
+    parser.add_argument('--keep', action='store_true', help='保留生成的文件')
+    parser.add_argument('--output', help='结果保存为JSON文件')
+    parser.add_argument('--compare', help='与之前保存的JSON结果对比')
+    return parser
+
+
+def main(argv=None):
+    """主函数"""
+    args = build_parser().parse_args(argv)
+    if args.images != core.EXPECTED_IMAGE_COUNT:
+        print(f"注意: 预览只接受 {core.EXPECTED_IMAGE_COUNT} 张图片的文件夹，"
+              f"--images 不等于该值时重命名和压缩阶段不会处理任何文件", file=sys.stderr)
+
+    result = run_benchmark(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print(format_report(result, baseline))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 扫描缓存
+按 文件夹路径 + 修改时间 缓存目录扫描结果（SQLite），
+文件夹内容未变化时重新预览无需再次列目录；
+同时按 文件路径 + 大小 + 修改时间 缓存每张图片的检查结果
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 默认缓存文件位置
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.image_renamer', 'scan_cache.sqlite')
+
+# 修改时间距今不足该值（纳秒）的文件夹不写入缓存，
+# 避免同一时间精度内再次修改而修改时间不变导致读到旧结果
+RACY_MTIME_NS = 2 * 1_000_000_000
+
+
+class ScanCache:
+    """
+    目录扫描缓存
+    以 (路径, 类型) 为键，记录扫描时文件夹的修改时间和扫描结果，
+    修改时间变化后自动失效；文件记录还会比较文件大小
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH):
+        self.db_path = db_path
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            " path TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " value TEXT NOT NULL,"
+            " PRIMARY KEY (path, kind))")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_records ("
+            " path TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " value TEXT NOT NULL,"
+            " PRIMARY KEY (path, kind))")
+        self._conn.commit()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, path, kind, compute, force=False, mtime_ns=None):
+        """
+        读取缓存的扫描结果，文件夹修改时间变化或 force=True 时调用 compute() 重新扫描
+        compute 的返回值需可JSON序列化；已知修改时间（如来自 DirEntry）时可直接传入
+        """
+        path = os.path.abspath(path)
+        if mtime_ns is None:
+            mtime_ns = os.stat(path).st_mtime_ns
+
+        if not force:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value FROM listings WHERE path = ? AND kind = ? AND mtime_ns = ?",
+                    (path, kind, mtime_ns)).fetchone()
+            if row is not None:
+                self.hits += 1
+                return json.loads(row[0])
+
+        self.misses += 1
+        value = compute()
+
+        if time.time_ns() - mtime_ns >= RACY_MTIME_NS:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO listings (path, kind, mtime_ns, value) VALUES (?, ?, ?, ?)",
+                    (path, kind, mtime_ns, json.dumps(value, ensure_ascii=False)))
+                self._dirty = True
+        return value
+
+    def get_file_record(self, path, kind, stat_result):
+        """读取文件的缓存记录，文件大小或修改时间变化时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM file_records"
+                " WHERE path = ? AND kind = ? AND size = ? AND mtime_ns = ?",
+                (os.path.abspath(path), kind, stat_result.st_size,
+                 stat_result.st_mtime_ns)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put_file_record(self, path, kind, stat_result, value):
+        """写入文件的缓存记录，刚修改过的文件不写入"""
+        if time.time_ns() - stat_result.st_mtime_ns < RACY_MTIME_NS:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_records (path, kind, size, mtime_ns, value)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (os.path.abspath(path), kind, stat_result.st_size, stat_result.st_mtime_ns,
+                 json.dumps(value, ensure_ascii=False)))
+            self._dirty = True
+
+    def flush(self):
+        """提交未写入磁盘的缓存"""
+        with self._lock:
+            if self._dirty:
+                self._conn.commit()
+                self._dirty = False
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM listings")
+            self._conn.execute("DELETE FROM file_records")
+            self._conn.commit()
+            self._dirty = False
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def cached_file_map(images, kind, compute, cache=None, executor=None, on_error=None):
+    """
+    对一组图片（ImageEntry 列表）调用 compute(路径)，executor 给定时并行计算，返回与 images 顺序一致的结果
+    cache 为 ScanCache 时按 路径 + 大小 + 修改时间 缓存结果（kind 为缓存类型名，出错的结果不缓存），
+    再次预览时无需重新读取文件；每张图片只取一次文件信息（ImageEntry 会保存 stat 结果），
+    无法读取文件信息时结果为 on_error(错误信息)
+    """
+    results = [None] * len(images)
+    pending = []
+
+    for i, image in enumerate(images):
+        try:
+            stat_result = image.stat()
+        except OSError as e:
+            results[i] = on_error(str(e))
+            continue
+        if cache is not None:
+            results[i] = cache.get_file_record(image.path, kind, stat_result)
+        if results[i] is None:
+            pending.append((i, image, stat_result))
+
+    paths = [image.path for _, image, _ in pending]
+    if executor is None:
+        infos = [compute(path) for path in paths]
+    else:
+        infos = list(executor.map(compute, paths))
+
+    for (i, image, stat_result), info in zip(pending, infos):
+        results[i] = info
+        if cache is not None and info['error'] is None:
+            cache.put_file_record(image.path, kind, stat_result, info)
+
+    return results
+
+
+def open_default_cache(db_path=DEFAULT_CACHE_PATH):
+    """打开默认缓存，失败时返回None（不使用缓存）"""
+    try:
+        return ScanCache(db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"打开扫描缓存失败，将不使用缓存: {e}")
+        return None
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 命令行版本
+不依赖Tkinter，适合在服务器或定时任务中运行，结果以JSON格式输出
+
+用法:
+    python image_renamer_cli.py scan    <第二层文件夹>
+    python image_renamer_cli.py preview <第二层文件夹>
+    python image_renamer_cli.py apply   <第二层文件夹> [--compress] [--no-rename] [--encoder fast]
+    python image_renamer_cli.py queue   <第二层文件夹或上一层文件夹> [...] [--compress]
+    python image_renamer_cli.py watch   <第二层文件夹> [--compress]
+    python image_renamer_cli.py resume  <第二层文件夹>
+    python image_renamer_cli.py undo    <第二层文件夹> [--list]
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import image_renamer_core as core
+from image_renamer_cache import DEFAULT_CACHE_PATH, open_default_cache
+from image_renamer_journal import (JOURNAL_DIR, BatchJournal, discard_journal,
+                                   find_unfinished_journal, journal_path_for, new_batch_id)
+from image_renamer_undo import UNDO_DIR, UndoLog, latest_undo_log, list_undo_logs, undo_batch
+from image_renamer_profile import CompressionProfile
+from image_renamer_queue import discover_roots, process_roots
+from image_renamer_watch import (POLL_INTERVAL, SETTLE_SECONDS, WATCH_DIR, DropFolderWatcher,
+                                 create_waker)
+from image_renamer_rules import RULES_PATHS, load_default_rule_schemas, load_rule_schemas
+from image_renamer_backends import BACKENDS, DEFAULT_BACKEND, available_backends
+
+
+def load_schemas(args):
+    """读取 --rules 指定的规则配置，未指定时读取默认位置的配置（不存在时只使用内置方案）"""
+    if args.rules:
+        return load_rule_schemas(args.rules, core.BUILTIN_RULE_SCHEMAS)
+    return load_default_rule_schemas(core.BUILTIN_RULE_SCHEMAS)
+
+
+def cmd_scan(args):
+    """扫描子文件夹，输出车源号和图片数量"""
+    schemas = load_schemas(args)
+    forced_schema = schemas.get(args.schema) if args.schema else None
+    folders = []
+    for car_folder in core.walk_car_folders(args.folder, cache=args.cache,
+                                            force_rescan=args.rescan):
+        schema = forced_schema or schemas.select(car_folder.name)
+        folders.append({
+            'folder': car_folder.name,
+            'number': core.extract_number_from_folder_name(car_folder.name),
+            'image_count': len(car_folder.images),
+            'schema': schema.name,
+            'ok': len(car_folder.images) == schema.expected_count,
+        })
+    if args.cache is not None:
+        args.cache.flush()
+    return {'folder': args.folder, 'subfolders': folders}, 0
+
+
+def cmd_preview(args):
+    """生成重命名预览"""
+    preview_data, warnings = core.build_preview(args.folder, cache=args.cache,
+                                                force_rescan=args.rescan,
+                                                probe=not args.no_probe,
+                                                dedupe=not args.no_dedupe, order=args.order,
+                                                schemas=load_schemas(args),
+                                                schema_name=args.schema)
+    return {'folder': args.folder, 'total': len(preview_data),
+            'items': preview_data, 'warnings': warnings}, 0
+
+
+def processing_options(args):
+    """apply / queue 的处理选项（apply_preview 的参数）"""
+    rename_enabled = not args.no_rename
+    if not rename_enabled and not args.compress:
+        raise ValueError("请至少选择一个操作（重命名或压缩）")
+    return {'rename_enabled': rename_enabled, 'compress_enabled': args.compress,
+            'quality': args.quality, 'encoder': args.encoder, 'draft': not args.no_draft,
+            'passthrough': not args.no_passthrough, 'backend': args.backend}
+
+
+def add_profile(result, profile, args):
+    """把耗时统计加入结果并保存报告"""
+    if profile is not None:
+        result['profile'] = profile.summary()
+        result['profile_report'] = profile.write_report(args.profile or None)
+        print(profile.format_summary(), file=sys.stderr)
+
+
+def print_progress(snapshot):
+    print(f"进度: {snapshot.format()}", file=sys.stderr)
+
+
+def cmd_apply(args):
+    """执行重命名和/或压缩"""
+    options = processing_options(args)
+    rename_enabled = options['rename_enabled']
+
+    unfinished = find_unfinished_journal(args.folder, args.journal_dir)
+    if unfinished is not None:
+        if not args.discard_journal:
+            raise ValueError("该文件夹有未完成的批次，请运行 resume 继续处理，"
+                             "或加 --discard-journal 放弃后重新开始")
+        discard_journal(unfinished)
+
+    preview_data, warnings = core.build_preview(args.folder, cache=args.cache,
+                                                force_rescan=args.rescan, order=args.order,
+                                                schemas=load_schemas(args),
+                                                schema_name=args.schema)
+
+    journal = None
+    if not args.no_journal:
+        journal = BatchJournal.create(args.folder, preview_data, options,
+                                      path=journal_path_for(args.folder, args.journal_dir))
+    undo_log = None
+    if rename_enabled:
+        batch_id = journal.batch_id if journal is not None else new_batch_id()
+        undo_log = UndoLog.open(args.folder, batch_id, args.undo_dir)
+
+    profile = CompressionProfile() if args.compress and args.profile is not None else None
+
+    try:
+        success_count, error_count, errors = core.apply_preview(
+            preview_data, executor_mode=args.executor, workers=args.workers,
+            progress_callback=print_progress, progress_interval=args.progress_interval,
+            profile=profile, queue_size=args.queue_size, memory_budget=args.memory_budget,
+            journal=journal, undo_log=undo_log, **options)
+    finally:
+        if undo_log is not None:
+            undo_log.close()
+
+    result = {'folder': args.folder, 'total': len(preview_data),
+              'success': success_count, 'failed': error_count,
+              'errors': errors, 'warnings': warnings}
+    add_profile(result, profile, args)
+    return result, 1 if error_count else 0
+
+
+def cmd_queue(args):
+    """批量处理多个第二层文件夹；给出的文件夹中有日期文件夹时处理其中的每一个"""
+    options = processing_options(args)
+    roots = []
+    for folder in args.folders:
+        roots.extend(discover_roots(folder, args.cache, args.rescan))
+    print(f"共 {len(roots)} 个文件夹: {roots}")
+
+    profile = CompressionProfile() if args.compress and args.profile is not None else None
+
+    def on_root(index, result):
+        if 'error' in result:
+            text = result['error']
+        else:
+            text = f"成功 {result['success']}，失败 {result['failed']}"
+        print(f"完成 {index + 1}/{len(roots)} {result['folder']}: {text}", file=sys.stderr)
+
+    results = process_roots(
+        roots, options, cache=args.cache, force_rescan=args.rescan,
+        preview_options={'order': args.order, 'schemas': load_schemas(args),
+                         'schema_name': args.schema},
+        executor_mode=args.executor, workers=args.workers, progress_callback=print_progress,
+        root_callback=on_root, progress_interval=args.progress_interval,
+        queue_size=args.queue_size, profile=profile, journal_dir=args.journal_dir,
+        undo_dir=args.undo_dir, use_journal=not args.no_journal,
+        memory_budget=args.memory_budget)
+
+    result = {'folders': results,
+              'success': sum(r.get('success', 0) for r in results),
+              'failed': sum(r.get('failed', 0) for r in results),
+              'not_processed': roots[len(results):]}
+    add_profile(result, profile, args)
+    failed = result['failed'] or any('error' in r for r in results) or result['not_processed']
+    return result, 1 if failed else 0
+
+
+def cmd_watch(args):
+    """监视第二层文件夹，新上传的车源文件夹稳定后立即处理（Ctrl+C 停止）"""
+    options = processing_options(args)
+    watcher = DropFolderWatcher(args.folder, options, schemas=load_schemas(args),
+                                schema_name=args.schema, order=args.order,
+                                settle_seconds=args.settle, executor_mode=args.executor,
+                                workers=args.workers, journal_dir=args.journal_dir,
+                                undo_dir=args.undo_dir, watch_dir=args.watch_dir,
+                                use_journal=not args.no_journal, queue_size=args.queue_size,
+                                memory_budget=args.memory_budget)
+    results = []
+
+    def on_result(result):
+        results.append(result)
+        text = "处理失败（内容变化后重新处理）" if result['status'] == 'failed' else "处理完成"
+        print(f"{text} {result['folder']}: 共 {result['total']} 张，成功 {result['success']}，"
+              f"失败 {result['failed']}，警告 {len(result['warnings'])}", file=sys.stderr)
+
+    stop_event = threading.Event()
+    try:
+        if args.once:
+            # 只处理当前已经稳定的文件夹后退出（适合定时任务）
+            try:
+                result = watcher.resume_unfinished(stop_event)
+                if result is not None:
+                    on_result(result)
+                watcher.poll()
+                time.sleep(args.settle)
+                watcher.process_ready(stop_event, on_result)
+            finally:
+                watcher.close()
+        else:
+            print(f"开始监视: {args.folder}（Ctrl+C 停止）")
+            watcher.run(stop_event, on_result,
+                        create_waker(args.poll_interval, not args.no_inotify))
+    except KeyboardInterrupt:
+        stop_event.set()
+        print("已停止监视", file=sys.stderr)
+
+    result = {'folder': args.folder, 'processed': results,
+              'success': sum(r['success'] for r in results),
+              'failed': sum(r['failed'] for r in results),
+              'failed_folders': [r['folder'] for r in results if r['status'] == 'failed']}
+    return result, 1 if result['failed'] or result['failed_folders'] else 0
+
+
+def cmd_resume(args):
+    """继续处理上次中断的批次，已完成的文件不再处理"""
+    path = find_unfinished_journal(args.folder, args.journal_dir)
+    if path is None:
+        raise ValueError("该文件夹没有未完成的批次")
+
+    journal = BatchJournal.load(path)
+    already_done = journal.counts()['done']
+    undo_log = None
+    if journal.options['rename_enabled']:
+        undo_log = UndoLog.open(args.folder, journal.batch_id, args.undo_dir)
+    try:
+        success_count, error_count, errors = core.apply_preview(
+            journal.items, executor_mode=args.executor, workers=args.workers,
+            progress_callback=print_progress, progress_interval=args.progress_interval,
+            queue_size=args.queue_size, memory_budget=args.memory_budget, journal=journal,
+            undo_log=undo_log, **journal.options)
+    finally:
+        if undo_log is not None:
+            undo_log.close()
+
+    result = {'folder': args.folder, 'total': len(journal.items),
+              'already_done': already_done, 'success': success_count,
+              'failed': error_count, 'errors': errors}
+    return result, 1 if error_count else 0
+
+
+def cmd_undo(args):
+    """把最近一个批次（或 --log 指定的批次）恢复为原文件名"""
+    if args.list:
+        batches = []
+        for path in list_undo_logs(args.folder, args.undo_dir):
+            log = UndoLog.load(path)
+            batches.append({'log': path, 'batch_id': log.header['batch_id'],
+                            'files': len(log.entries)})
+        return {'folder': args.folder, 'batches': batches}, 0
+
+    path = args.log or latest_undo_log(args.folder, args.undo_dir)
+    if path is None:
+        raise ValueError("该文件夹没有可以撤销的批次")
+
+    success_count, error_count, errors = undo_batch(path)
+    result = {'folder': args.folder, 'log': path, 'success': success_count,
+              'failed': error_count, 'errors': errors}
+    return result, 1 if error_count else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='image-renamer',
+                                     description='图片批量重命名工具（命令行版）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    # 扫描缓存参数
+    caching = argparse.ArgumentParser(add_help=False)
+    caching.add_argument('--rescan', action='store_true', help='忽略扫描缓存，强制完整重新扫描')
+    caching.add_argument('--no-cache', action='store_true', help='不使用扫描缓存')
+    caching.add_argument('--cache-path', default=DEFAULT_CACHE_PATH,
+                         help=f'扫描缓存文件（默认 {DEFAULT_CACHE_PATH}）')
+
+    # 各子命令共用的参数
+    common = argparse.ArgumentParser(add_help=False, parents=[caching])
+    common.add_argument('folder', help='第二层文件夹路径')
+
+    # 规则方案（scan / preview / apply）
+    rules = argparse.ArgumentParser(add_help=False)
+    rules.add_argument('--rules', default=None, metavar='PATH',
+                       help=f'规则配置文件（JSON或YAML，默认 {RULES_PATHS[0]}，不存在时使用内置方案）')
+    rules.add_argument('--schema', default=None,
+                       help='所有文件夹使用该规则方案（默认按文件夹名自动选择）')
+
+    scan_parser = subparsers.add_parser('scan', parents=[common, rules], help='扫描子文件夹')
+    scan_parser.set_defaults(func=cmd_scan)
+
+    # 生成预览（preview / apply）共用的参数
+    ordering = argparse.ArgumentParser(add_help=False)
+    ordering.add_argument('--order', choices=core.ORDER_MODES, default='name',
+                          help='图片顺序：name 按文件名，exif 按拍摄时间（默认name）')
+
+    preview_parser = subparsers.add_parser('preview', parents=[common, rules, ordering],
+                                           help='预览重命名结果')
+    preview_parser.add_argument('--no-probe', action='store_true',
+                                help='不检查图片文件头（尺寸、方向、是否完整）')
+    preview_parser.add_argument('--no-dedupe', action='store_true',
+                                help='不检查重复的图片（完全相同或连拍）')
+    preview_parser.set_defaults(func=cmd_preview)
+
+    # 执行处理（apply / resume）共用的参数
+    run = argparse.ArgumentParser(add_help=False)
+    run.add_argument('--executor', choices=core.EXECUTOR_MODES, default='process',
+                     help='执行方式（默认process）')
+    run.add_argument('--workers', type=int, default=None, help='工作进程数（默认CPU核心数）')
+    run.add_argument('--progress-interval', type=float, default=1.0,
+                     help='进度输出的最小间隔秒数（默认1）')
+    run.add_argument('--queue-size', type=int, default=None,
+                     help='压缩流水线中同时在内存中的图片数量上限'
+                          f'（默认工作进程数×{core.PIPELINE_DEPTH_PER_WORKER}）')
+    run.add_argument('--memory-budget', type=int, default=None, metavar='MB',
+                     help='压缩时的内存预算（MB）：按文件头估计每张图片解码和缩放所需的内存，'
+                          '同时处理的图片估计值之和不超过该值（默认不限制）')
+    run.add_argument('--journal-dir', default=JOURNAL_DIR,
+                     help=f'处理日志目录（默认 {JOURNAL_DIR}）')
+    run.add_argument('--undo-dir', default=UNDO_DIR,
+                     help=f'撤销记录目录（默认 {UNDO_DIR}）')
+
+    # 处理选项（apply / queue）
+    processing = argparse.ArgumentParser(add_help=False)
+    processing.add_argument('--no-rename', action='store_true', help='不重命名')
+    processing.add_argument('--compress', action='store_true',
+                            help='压缩到 1800×1800 像素')
+    processing.add_argument('--quality', type=int, default=None,
+                            help='压缩质量（默认使用编码方案的质量）')
+    processing.add_argument('--encoder', choices=list(core.ENCODER_PROFILES),
+                            default=core.DEFAULT_ENCODER_PROFILE,
+                            help=f'编码方案（默认{core.DEFAULT_ENCODER_PROFILE}）：'
+                                 'fast 不优化哈夫曼表，smallest 渐进式并降低质量')
+    processing.add_argument('--backend', choices=list(BACKENDS), default=DEFAULT_BACKEND,
+                            help=f'缩放和编码引擎（默认{DEFAULT_BACKEND}，'
+                                 f'本机可用: {", ".join(available_backends())}）')
+    processing.add_argument('--no-draft', action='store_true',
+                            help='完整解码原图后再缩放（较慢，用于对比输出质量）')
+    processing.add_argument('--no-passthrough', action='store_true',
+                            help='已是 1800×1800 的图片也重新编码')
+    processing.add_argument('--no-journal', action='store_true',
+                            help='不记录处理日志（中断后无法继续处理）')
+    processing.add_argument('--profile', nargs='?', const='', default=None, metavar='REPORT',
+                            help='记录压缩各步骤耗时，报告写入 REPORT'
+                                 '（默认 ~/.image_renamer/reports/）')
+
+    apply_parser = subparsers.add_parser('apply',
+                                         parents=[common, run, rules, ordering, processing],
+                                         help='执行重命名和/或压缩')
+    apply_parser.add_argument('--discard-journal', action='store_true',
+                              help='放弃该文件夹未完成的批次，重新开始')
+    apply_parser.set_defaults(func=cmd_apply)
+
+    queue_parser = subparsers.add_parser('queue',
+                                         parents=[caching, run, rules, ordering, processing],
+                                         help='批量处理多个第二层文件夹（有未完成批次的继续处理）')
+    queue_parser.add_argument('folders', nargs='+',
+                              help='第二层文件夹，或存放多个日期文件夹的上一层文件夹')
+    queue_parser.set_defaults(func=cmd_queue)
+
+    watch_parser = subparsers.add_parser('watch',
+                                         parents=[common, run, rules, ordering, processing],
+                                         help='监视上传文件夹，新的车源文件夹稳定后立即处理')
+    watch_parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                              help=f'文件夹内容不再变化多少秒后处理（默认{SETTLE_SECONDS}）')
+    watch_parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                              help=f'没有 inotify 时的轮询间隔秒数（默认{POLL_INTERVAL}）')
+    watch_parser.add_argument('--no-inotify', action='store_true', help='不使用 inotify，定时轮询')
+    watch_parser.add_argument('--once', action='store_true',
+                              help='只处理当前已经稳定的文件夹后退出（适合定时任务）')
+    watch_parser.add_argument('--watch-dir', default=WATCH_DIR,
+                              help=f'已处理文件夹的记录目录（默认 {WATCH_DIR}）')
+    watch_parser.set_defaults(func=cmd_watch)
+
+    resume_parser = subparsers.add_parser('resume', parents=[common, run],
+                                          help='继续处理上次中断的批次')
+    resume_parser.set_defaults(func=cmd_resume)
+
+    undo_parser = subparsers.add_parser('undo', parents=[common],
+                                        help='把最近一个批次恢复为原文件名')
+    undo_parser.add_argument('--list', action='store_true', help='列出可以撤销的批次')
+    undo_parser.add_argument('--log', help='要撤销的批次记录（默认最近一个）')
+    undo_parser.add_argument('--undo-dir', default=UNDO_DIR,
+                             help=f'撤销记录目录（默认 {UNDO_DIR}）')
+    undo_parser.set_defaults(func=cmd_undo)
+
+    return parser
+
+
+def main(argv=None):
+    """主函数"""
+    args = build_parser().parse_args(argv)
+
+    for folder in getattr(args, 'folders', None) or [args.folder]:
+        if not os.path.isdir(folder):
+            print(json.dumps({'error': f"文件夹不存在: {folder}"}, ensure_ascii=False))
+            return 2
+
+    # 核心模块的调试输出转到stderr，stdout只输出JSON结果
+    with contextlib.redirect_stdout(sys.stderr):
+        args.cache = None if args.no_cache else open_default_cache(args.cache_path)
+        try:
+            result, exit_code = args.func(args)
+        except Exception as e:
+            result, exit_code = {'error': str(e)}, 2
+        finally:
+            if args.cache is not None:
+                args.cache.close()
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
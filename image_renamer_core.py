@@ -0,0 +1,1279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 核心处理模块
+不依赖Tkinter，可被GUI和多进程工作进程直接导入
+"""
+
+import io
+import os
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+from PIL import Image
+
+from image_renamer_probe import probe_images, describe_problem
+from image_renamer_dedupe import fingerprint_images, find_duplicates, describe_duplicate
+from image_renamer_exif import read_capture_times, capture_sort_key
+from image_renamer_rules import compile_schemas
+from image_renamer_backends import DEFAULT_BACKEND, RESIZE_BEFORE_CONVERT_MODES, get_backend
+from image_renamer_journal import STATE_STAGED, STATE_DONE, STATE_FAILED
+from image_renamer_undo import content_hash, file_hash
+from image_renamer_planner import plan_renames, execute_renames, temp_path_for
+
+# 默认压缩目标尺寸
+TARGET_SIZE = (1800, 1800)
+
+# 每个车源文件夹中应有的图片数量
+EXPECTED_IMAGE_COUNT = 30
+
+# 定义重命名规则 - 按照最新的顺序（1-30）
+RENAME_RULES = (
+    "_58_右侧面.jpg",
+    "_3_右前45度.jpg",
+    "_2_正前方.jpg",
+    "_36_左前大灯.jpg",
+    "_1_左前45度.jpg",
+    "_35_左前轮胎轮毂.jpg",
+    "_4_左侧面.jpg",
+    "_5_左后45度.jpg",
+    "_6_正后方.jpg",
+    "_7_右后45度.jpg",
+    "_9_右后大灯.jpg",
+    "_29_右侧底大边.jpg",
+    "_30_左侧底大边.jpg",
+    "_57_车顶.jpg",
+    "_20_驾驶位.jpg",
+    "_19_驾驶员座椅.jpg",
+    "_21_后排.jpg",
+    "_23_后备箱.jpg",
+    "_24_发动机舱.jpg",
+    "_41_右侧前座椅.jpg",
+    "_44_右侧后座椅.jpg",
+    "_12_中控台.jpg",
+    "_22_车内顶棚.jpg",
+    "_16_音响及空调面板.jpg",
+    "_13_方向盘.jpg",
+    "_14_组合仪表.jpg",
+    "_15_里程数特写.jpg",
+    "_18_变速杆.jpg",
+    "_11_钥匙.jpg",
+    "_60_车辆铭牌.jpg",
+)
+
+# 内置规则方案（标准30张），规则配置文件中的方案在此基础上添加或覆盖，见 image_renamer_rules
+DEFAULT_RULE_SCHEMA = 'standard30'
+BUILTIN_RULE_SCHEMAS = compile_schemas({'schemas': [
+    {'name': DEFAULT_RULE_SCHEMA, 'description': '标准30张', 'rules': RENAME_RULES},
+]})
+
+# 已符合尺寸的图片直接沿用原文件时允许的最大体积（每像素字节数），
+# 超过时仍然重新编码以减小体积
+PASSTHROUGH_MAX_BYTES_PER_PIXEL = 0.5
+
+# 标准JPEG亮度量化表（IJG，质量50）各项之和；按原图亮度量化表与它的比例估计原图的压缩质量
+JPEG_STD_LUMINANCE_SUM = 3688
+
+# 预览时并行检查图片文件头的线程数（以读文件为主，线程数可多于CPU核心数）
+PROBE_WORKERS = 8
+
+# 图片顺序：按文件名（与文件管理器默认顺序一致） / 按EXIF拍摄时间
+ORDER_MODES = ('name', 'exif')
+
+# 可选的执行方式：串行 / 多线程 / 多进程
+EXECUTOR_MODES = ('serial', 'thread', 'process')
+
+# 压缩流水线中每个工作进程对应的队列长度（同时在内存中的图片数量上限 = 工作进程数 × 该值）
+PIPELINE_DEPTH_PER_WORKER = 2
+
+# 估计内存占用时压缩后JPEG数据的大小（每像素字节数，偏保守）
+OUTPUT_BYTES_PER_PIXEL = 1.0
+
+# JPEG编码方案：quality 为默认压缩质量，optimize 多做一遍哈夫曼表优化（体积略小但更耗CPU），
+# progressive 渐进式编码，subsampling 色度抽样方式
+# 各方案的速度和体积差别来自 optimize / progressive / quality；
+# 色度抽样都用 4:2:0：1800×1350 的输出改用 4:4:4 时每个方案编码都慢 30%~75%、体积大 15%~20%
+ENCODER_PROFILES = {
+    'fast': {'quality': 85, 'optimize': False, 'progressive': False, 'subsampling': '4:2:0'},
+    'balanced': {'quality': 85, 'optimize': True, 'progressive': False, 'subsampling': '4:2:0'},
+    'smallest': {'quality': 80, 'optimize': True, 'progressive': True, 'subsampling': '4:2:0'},
+}
+
+# 默认编码方案（与之前固定的 quality=85, optimize=True 输出一致）
+DEFAULT_ENCODER_PROFILE = 'balanced'
+
+
+def encoder_options(encoder=DEFAULT_ENCODER_PROFILE, quality=None):
+    """
+    返回保存JPEG时传给 Image.save 的参数
+    quality 不为None时覆盖编码方案的默认质量；未知的编码方案抛出 ValueError
+    """
+    if encoder not in ENCODER_PROFILES:
+        raise ValueError(f"未知的编码方案: {encoder}")
+    options = dict(ENCODER_PROFILES[encoder])
+    if quality is not None:
+        options['quality'] = quality
+    return options
+
+
+def estimate_jpeg_quality(img):
+    """
+    按文件头中的亮度量化表估计JPEG图片的压缩质量（IJG的 1~100，与 Pillow 的 quality 相同）
+    不是JPEG或没有量化表时返回None
+    """
+    tables = getattr(img, 'quantization', None)
+    if not tables or 0 not in tables:
+        return None
+    scale = sum(tables[0]) * 100 / JPEG_STD_LUMINANCE_SUM
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return max(1, min(100, round(quality)))
+
+
+def can_passthrough(img, file_size, target_size=TARGET_SIZE,
+                    max_bytes_per_pixel=PASSTHROUGH_MAX_BYTES_PER_PIXEL, quality=None):
+    """
+    只根据文件头判断图片是否已经符合输出要求，可以不重新编码直接使用：
+    JPEG格式、RGB模式、尺寸正好等于目标尺寸、非渐进式、
+    没有需要旋转的EXIF方向，且文件体积不超过限制；
+    quality 为本次编码使用的质量，原图的质量（见 estimate_jpeg_quality）更高时重新编码
+    """
+    if img.format != 'JPEG' or img.mode != 'RGB' or img.size != tuple(target_size):
+        return False
+    if img.info.get('progressive') or img.info.get('progression'):
+        return False
+    if img.getexif().get(0x0112, 1) != 1:
+        return False
+    if quality is not None:
+        source_quality = estimate_jpeg_quality(img)
+        if source_quality is None or source_quality > quality:
+            return False
+    return file_size <= target_size[0] * target_size[1] * max_bytes_per_pixel
+
+
+def fit_size(size, target_size=TARGET_SIZE):
+    """保持宽高比缩小到目标尺寸以内后的尺寸；已经小于目标尺寸的图片不放大"""
+    img_width, img_height = size
+    target_width, target_height = target_size
+    scale = min(target_width / img_width, target_height / img_height, 1)
+    return int(img_width * scale), int(img_height * scale)
+
+
+def draft_size(size, requested):
+    """JPEG快速解码（Image.draft）到不小于 requested 时的实际解码尺寸，与Pillow的计算方法一致"""
+    scale = min(size[0] // max(1, requested[0]), size[1] // max(1, requested[1]))
+    for s in (8, 4, 2, 1):
+        if scale >= s:
+            break
+    return (size[0] + s - 1) // s, (size[1] + s - 1) // s
+
+
+def _pixel_bytes(size, mode='RGB'):
+    """Pillow中图片像素数据占用的字节数：单通道每像素1字节，多通道（包括RGB）每像素4字节"""
+    return size[0] * size[1] * (1 if mode in ('1', 'L', 'P') else 4)
+
+
+def estimate_compress_memory(img, file_size, target_size=TARGET_SIZE, draft=True,
+                             passthrough=True, quality=None):
+    """
+    只根据文件头（img 为未解码的 Image）估计压缩一张图片时的内存峰值（字节）
+    压缩时按 _encode_image 的步骤依次生成：解码后的图片（JPEG按draft缩小后的尺寸）、
+    缩放结果、转换为RGB的图片、补白边后的图片和输出数据，每一步完成后立即释放上一步的图片，
+    因此取相邻两步之和中最大的一组，再加上原文件数据；quality 为编码质量（见 can_passthrough）
+    """
+    if passthrough and can_passthrough(img, file_size, target_size, quality=quality):
+        return file_size
+
+    new_size = fit_size(img.size, target_size)
+    decoded_size = img.size
+    if draft and img.format == 'JPEG' and new_size != img.size:
+        decoded_size = draft_size(img.size, new_size)
+
+    mode = img.mode
+    steps = []
+    if mode not in RESIZE_BEFORE_CONVERT_MODES:
+        steps.append(_pixel_bytes(decoded_size))
+        mode = 'RGB'
+    if new_size != decoded_size:
+        steps.append(_pixel_bytes(new_size, mode))
+    if mode != 'RGB':
+        steps.append(_pixel_bytes(new_size))
+    if new_size != tuple(target_size):
+        steps.append(_pixel_bytes(target_size))
+    steps.append(int(target_size[0] * target_size[1] * OUTPUT_BYTES_PER_PIXEL))
+
+    current = peak = _pixel_bytes(decoded_size, img.mode)
+    for nbytes in steps:
+        peak = max(peak, current + nbytes)
+        current = nbytes
+    return file_size + peak
+
+
+def estimate_data_memory(data, target_size=TARGET_SIZE, draft=True, passthrough=True,
+                         quality=None):
+    """估计压缩已读入内存的图片数据时的内存峰值；无法识别的文件很快会压缩失败，只计算数据本身"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return estimate_compress_memory(img, len(data), target_size, draft, passthrough,
+                                            quality)
+    except Exception:
+        return len(data)
+
+
+class MemoryBudget:
+    """
+    压缩流水线的内存预算（字节）：读取线程提交压缩任务前按估计的内存峰值申请额度，
+    额度不足时等待之前的图片写入完成后释放额度；
+    单张图片超过整个预算时不会一直等待，而是等其他图片都完成后单独处理
+    """
+
+    def __init__(self, limit):
+        self.limit = int(limit)
+        self.used = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes, stop_event=None):
+        """申请额度，不足时等待；stop_event 被设置后放弃并返回False"""
+        with self._condition:
+            while self.used and self.used + nbytes > self.limit:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                self._condition.wait(0.1)
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, nbytes):
+        with self._condition:
+            self.used -= nbytes
+            self._condition.notify_all()
+
+
+class _StageTimer:
+    """记录压缩各步骤的耗时（秒），stages 为None时不计时"""
+
+    __slots__ = ('stages', '_last')
+
+    def __init__(self, stages):
+        self.stages = stages
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        """记录从上一步结束到现在的耗时"""
+        if self.stages is None:
+            return
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+def _new_stats():
+    """compress_image_data(profiled=True) 返回的统计数据"""
+    return {'stages': {}, 'bytes_in': 0, 'bytes_out': 0, 'passthrough': False}
+
+
+def _encode_image(source, file_size, output, target_size, quality, draft, passthrough,
+                  encoder=DEFAULT_ENCODER_PROFILE, stats=None, backend=DEFAULT_BACKEND):
+    """
+    解码、缩放并编码一张图片，source / output 可以是路径或文件对象，出错时抛出异常
+    返回False表示图片已符合输出要求（见 can_passthrough），可直接沿用原文件，未写入 output
+    backend 为处理引擎名（见 image_renamer_backends），解码之后的步骤由引擎完成
+    """
+    save_options = encoder_options(encoder, quality)
+    engine = get_backend(backend)
+    timer = _StageTimer(stats['stages'] if stats is not None else None)
+    with Image.open(source) as img:
+        timer.mark('open')
+
+        if passthrough and can_passthrough(img, file_size, target_size,
+                                           quality=save_options['quality']):
+            return False
+
+        # 不处理EXIF方向，保持原始方向
+
+        # 计算新尺寸，保持宽高比，已经小于目标尺寸的图片不放大
+        new_size = fit_size(img.size, target_size)
+        engine.encode(source, img, new_size, target_size, output, save_options, draft, timer)
+    return True
+
+
+def compress_image(input_path, output_path, target_size=TARGET_SIZE, quality=None, draft=True,
+                   passthrough=True, encoder=DEFAULT_ENCODER_PROFILE, backend=DEFAULT_BACKEND):
+    """
+    压缩图片文件到指定尺寸（不旋转），读入后按 compress_image_data 处理（与批量处理相同），返回是否成功
+    draft=True 时JPEG使用libjpeg的DCT缩放（1/2、1/4、1/8）直接解码到不小于目标的尺寸，
+    再用LANCZOS精确缩放；draft=False 时完整解码原图，用于对比输出质量
+    passthrough=True 时已符合输出要求的图片（见 can_passthrough）不重新编码，原样写入输出路径
+    encoder 为 ENCODER_PROFILES 中的编码方案名，quality 为None时使用该方案的默认质量
+    backend 为缩放和编码的引擎名（见 image_renamer_backends）
+    """
+    try:
+        with open(input_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f"压缩图片失败 {input_path}: {e}")
+        return False
+
+    ok, content, _ = compress_image_data(data, target_size, quality, draft, passthrough, encoder,
+                                         name=input_path, backend=backend)
+    if not ok:
+        return False
+    try:
+        _write_output(output_path, data if content is None else content)
+        return True
+    except OSError as e:
+        print(f"写入压缩图片失败 {output_path}: {e}")
+        return False
+
+
+def compress_image_data(data, target_size=TARGET_SIZE, quality=None, draft=True,
+                        passthrough=True, encoder=DEFAULT_ENCODER_PROFILE, profiled=False,
+                        name='', backend=DEFAULT_BACKEND):
+    """
+    压缩已读入内存的图片数据，不访问磁盘（处理流水线的压缩阶段）
+    返回 (是否成功, 输出数据, stats)：输出数据为None表示图片已符合输出要求，可直接沿用原文件；
+    profiled=False 时 stats 为None
+    """
+    stats = _new_stats() if profiled else None
+    if stats is not None:
+        stats['bytes_in'] = len(data)
+    try:
+        output = io.BytesIO()
+        if not _encode_image(io.BytesIO(data), len(data), output, target_size, quality, draft,
+                             passthrough, encoder, stats, backend):
+            if stats is not None:
+                stats.update(bytes_out=len(data), passthrough=True)
+            return True, None, stats
+        if stats is not None:
+            stats['bytes_out'] = output.tell()
+        return True, output.getvalue(), stats
+    except Exception as e:
+        print(f"压缩图片失败 {name}: {e}")
+        return False, None, stats
+
+
+class OperationCancelled(Exception):
+    """操作被用户取消"""
+
+
+class _DeferredFuture(Future):
+    """延迟执行的 Future：第一次调用 result() 时才在调用线程中执行"""
+
+    def __init__(self, fn, args, kwargs):
+        super().__init__()
+        self._call = (fn, args, kwargs)
+
+    def result(self, timeout=None):
+        if self._call is not None:
+            fn, args, kwargs = self._call
+            self._call = None
+            # 已被取消时不再执行
+            if self.set_running_or_notify_cancel():
+                try:
+                    self.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    self.set_exception(e)
+        return super().result(timeout)
+
+
+class SerialExecutor:
+    """
+    串行执行器
+    接口与 concurrent.futures 的执行器一致，任务在调用 result() 时按顺序在当前线程执行，
+    因此进度更新和取消与并行执行器的行为一致
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        return _DeferredFuture(fn, args, kwargs)
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        return False
+
+
+def default_worker_count():
+    """默认工作进程数：CPU核心数"""
+    return os.cpu_count() or 1
+
+
+def create_executor(mode='process', workers=None):
+    """
+    创建执行器
+    mode: 'serial' 串行, 'thread' 多线程, 'process' 多进程
+    workers: 工作线程/进程数，None 表示使用CPU核心数
+    """
+    if mode not in EXECUTOR_MODES:
+        raise ValueError(f"未知的执行方式: {mode}（可选: {', '.join(EXECUTOR_MODES)}）")
+
+    workers = max(1, int(workers or default_worker_count()))
+
+    # 只有一个工作者时没有必要启动线程池/进程池
+    if mode == 'serial' or workers == 1:
+        return SerialExecutor()
+    if mode == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def extract_number_from_folder_name(folder_name):
+    """
+    从第三层文件夹名称中提取车源号
+    格式: 车源号_车辆名
+    例如: 1234567_英菲尼迪G37
+    """
+    # 匹配模式: 数字_车辆名
+    pattern = r'^(\d+)_'
+    match = re.match(pattern, folder_name)
+    if match:
+        return match.group(1)
+    return None
+
+
+def extract_folder_info(folder_name):
+    """
+    从第二层文件夹名称中提取信息
+    格式: 2025_11_06_芜湖_张三01
+    返回: 张三01 (作为车源号)
+    """
+    # 匹配模式: 年_月_日_城市_名称
+    pattern = r'^\d{4}_\d{1,2}_\d{1,2}_[^_]+_(.+)$'
+    match = re.match(pattern, folder_name)
+    if match:
+        return match.group(1)
+    return None
+
+
+def natural_sort_key(text):
+    """
+    自然排序键函数
+    将 '1.jpg', '2.jpg', '10.jpg' 正确排序为 1, 2, 10
+    而不是字符串排序的 1, 10, 2
+    """
+    def atoi(text):
+        return int(text) if text.isdigit() else text.lower()
+
+    return [atoi(c) for c in re.split(r'(\d+)', text)]
+
+
+def get_file_sort_key_by_time(folder_path, filename):
+    """
+    获取文件的排序键（按修改时间）
+    从SD卡复制后修改时间是复制的时间，按拍摄时间排序请使用 build_preview(order='exif')
+    """
+    filepath = os.path.join(folder_path, filename)
+    try:
+        stat_info = os.stat(filepath)
+        return (stat_info.st_mtime, filename.lower())
+    except Exception as e:
+        print(f"获取文件信息失败 {filename}: {e}")
+        return (0, filename.lower())
+
+
+def _is_jpg_name(name):
+    """支持更多图片格式，忽略隐藏文件"""
+    return not name.startswith('.') and name.lower().endswith(('.jpg', '.jpeg'))
+
+
+def _scan_dir(path):
+    """
+    单次 os.scandir 遍历文件夹
+    返回 (子文件夹 DirEntry 列表, jpg文件 DirEntry 列表)，忽略隐藏项
+    DirEntry 自带文件类型信息，不需要再对每一项调用 os.path.isdir
+    """
+    subdirs = []
+    jpg_entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                subdirs.append(entry)
+            elif _is_jpg_name(entry.name):
+                jpg_entries.append(entry)
+    return subdirs, jpg_entries
+
+
+def _cached(cache, path, kind, compute, force=False, mtime_ns=None):
+    """有缓存时通过缓存读取扫描结果，否则直接扫描"""
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(path, kind, compute, force=force, mtime_ns=mtime_ns)
+
+
+def _entry_mtime_ns(entry):
+    """从 DirEntry 读取修改时间（Windows上不需要额外系统调用），失败时返回None"""
+    if entry is None:
+        return None
+    try:
+        return entry.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class ImageEntry:
+    """
+    文件夹中的一张图片
+    来自 os.scandir 时复用 DirEntry 缓存的文件信息，来自扫描缓存时按需 os.stat
+    """
+
+    __slots__ = ('name', 'path', '_entry', '_stat')
+
+    def __init__(self, name, path, entry=None):
+        self.name = name
+        self.path = path
+        self._entry = entry
+        self._stat = None
+
+    def stat(self):
+        """文件信息，只在第一次调用时读取，预览时检查图片、指纹和拍摄时间共用"""
+        if self._stat is None:
+            self._stat = self._entry.stat() if self._entry is not None else os.stat(self.path)
+        return self._stat
+
+    def __repr__(self):
+        return f"ImageEntry({self.name!r})"
+
+
+# 第三层文件夹（车源号_车辆名）及其中排好序的图片
+CarFolder = namedtuple('CarFolder', ['name', 'path', 'images'])
+
+
+def get_image_entries(folder_path, cache=None, force_rescan=False, folder_entry=None):
+    """
+    获取文件夹中的所有jpg图片（ImageEntry 列表）
+    按文件名自然排序（与文件管理器默认顺序一致）
+    cache 为 ScanCache 时，文件夹修改时间未变化则直接使用缓存结果
+    """
+    scanned = {}
+
+    def compute():
+        _, jpg_entries = _scan_dir(folder_path)
+        scanned.update((entry.name, entry) for entry in jpg_entries)
+        return [entry.name for entry in jpg_entries]
+
+    try:
+        names = _cached(cache, folder_path, 'jpg_files', compute, force_rescan,
+                        _entry_mtime_ns(folder_entry))
+    except PermissionError:
+        print(f"权限错误：无法访问文件夹 {folder_path}")
+        return []
+    except Exception as e:
+        print(f"读取文件夹错误 {folder_path}: {e}")
+        return []
+
+    # 按文件名自然排序（与文件管理器默认顺序一致）
+    names.sort(key=natural_sort_key)
+
+    return [ImageEntry(name, os.path.join(folder_path, name), scanned.get(name))
+            for name in names]
+
+
+def get_jpg_files_in_folder(folder_path, cache=None, force_rescan=False):
+    """
+    获取文件夹中的所有jpg文件名
+    按文件名自然排序（与文件管理器默认顺序一致）
+    """
+    return [image.name for image in get_image_entries(folder_path, cache, force_rescan)]
+
+
+def _subfolder_entries(folder, cache=None, force_rescan=False):
+    """返回第二层文件夹中的子文件夹 [(名称, DirEntry或None)]"""
+    scanned = {}
+
+    def compute():
+        subdirs, _ = _scan_dir(folder)
+        scanned.update((entry.name, entry) for entry in subdirs)
+        return [entry.name for entry in subdirs]
+
+    names = _cached(cache, folder, 'subfolders', compute, force_rescan)
+    return [(name, scanned.get(name)) for name in names]
+
+
+def list_subfolders(folder, cache=None, force_rescan=False):
+    """
+    列出第二层文件夹中的所有子文件夹（第三层：车源号_车辆名），忽略隐藏文件夹
+    """
+    print(f"\n正在扫描文件夹: {folder}")
+    subfolders = [name for name, _ in _subfolder_entries(folder, cache, force_rescan)]
+    print(f"检测到的子文件夹: {subfolders}")
+    return subfolders
+
+
+def _resolve_subfolders(folder, subfolders, cache, force_rescan):
+    """subfolders 未给定时扫描第二层文件夹，返回 [(名称, DirEntry或None)]"""
+    if subfolders is not None:
+        return [(name, None) for name in subfolders]
+
+    print(f"\n正在扫描文件夹: {folder}")
+    entries = _subfolder_entries(folder, cache, force_rescan)
+    print(f"检测到的子文件夹: {[name for name, _ in entries]}")
+    return entries
+
+
+def _iter_car_folders(folder, entries, cache, force_rescan, cancel_event=None):
+    for name, entry in entries:
+        if cancel_event is not None and cancel_event.is_set():
+            raise OperationCancelled()
+        path = os.path.join(folder, name)
+        yield CarFolder(name, path, get_image_entries(path, cache, force_rescan, entry))
+
+
+def walk_car_folders(folder, subfolders=None, cache=None, force_rescan=False, cancel_event=None):
+    """
+    生成器：遍历第二层文件夹，依次产出每个子文件夹的 CarFolder
+    每个文件夹只用 os.scandir 列一次；subfolders 给定时跳过第二层文件夹的扫描
+    cancel_event 被设置时抛出 OperationCancelled
+    """
+    entries = _resolve_subfolders(folder, subfolders, cache, force_rescan)
+    return _iter_car_folders(folder, entries, cache, force_rescan, cancel_event)
+
+
+def build_preview(folder, subfolders=None, rename_rules=RENAME_RULES,
+                  expected_count=EXPECTED_IMAGE_COUNT, cache=None, force_rescan=False,
+                  folder_callback=None, cancel_event=None, probe=False, dedupe=False,
+                  order='name', schemas=None, schema_name=None):
+    """
+    生成重命名预览
+    返回 (preview_data, warnings)，preview_data 中每项包含
+    folder / original / new / original_path / new_path
+    cache 为 ScanCache 时只重新扫描修改时间变化的文件夹，force_rescan=True 时全部重新扫描
+    folder_callback(done, total, folder, items) 在每个子文件夹扫描完成后调用，用于流式显示
+    cancel_event 被设置时抛出 OperationCancelled
+    probe=True 时并行读取每张图片的文件头（见 image_renamer_probe），结果放在预览项的
+    'probe' 中，损坏或不完整的图片记入警告
+    dedupe=True 时检查每个车源文件夹中完全相同或疑似重复（连拍）的图片（见 image_renamer_dedupe），
+    图片数量不对的文件夹也检查，用来找出多出来的那张；结果放在预览项的 'duplicate' 中并记入警告
+    order='exif' 时按EXIF拍摄时间排序（见 image_renamer_exif），没有拍摄时间的图片按文件名排在最后
+    schemas 为规则方案（RuleSchemas，见 image_renamer_rules）时代替 rename_rules / expected_count：
+    schema_name 给定时所有文件夹使用该方案，否则按车源文件夹名自动选择；
+    使用的方案名称放在预览项的 'schema' 中
+    """
+    if order not in ORDER_MODES:
+        raise ValueError(f"未知的图片顺序: {order}")
+    use_schemas = schemas is not None or schema_name is not None
+    if use_schemas:
+        schemas = schemas or BUILTIN_RULE_SCHEMAS
+        forced_schema = schemas.get(schema_name) if schema_name is not None else None
+
+    preview_data = []
+    warnings = []
+
+    entries = _resolve_subfolders(folder, subfolders, cache, force_rescan)
+    total = len(entries)
+
+    by_time = order == 'exif'
+    probe_executor = (create_executor('thread', PROBE_WORKERS)
+                      if probe or dedupe or by_time else None)
+    try:
+        car_folders = _iter_car_folders(folder, entries, cache, force_rescan, cancel_event)
+        for done, car_folder in enumerate(car_folders, 1):
+            if by_time and car_folder.images:
+                car_folder = _order_by_capture_time(car_folder, cache, probe_executor, warnings)
+            if not use_schemas:
+                items = _preview_car_folder(car_folder, rename_rules, expected_count, warnings)
+            else:
+                schema = forced_schema or schemas.select(car_folder.name)
+                items = _preview_car_folder(car_folder, schema.rules, schema.expected_count,
+                                            warnings)
+                for data in items:
+                    data['schema'] = schema.name
+            if probe and items:
+                _probe_preview_items(car_folder, items, cache, probe_executor, warnings)
+            if dedupe and len(car_folder.images) > 1:
+                _dedupe_preview_items(car_folder, items, cache, probe_executor, warnings)
+            preview_data.extend(items)
+            if folder_callback:
+                folder_callback(done, total, car_folder.name, items)
+    finally:
+        if probe_executor is not None:
+            probe_executor.shutdown()
+
+    if cache is not None:
+        cache.flush()
+
+    return preview_data, warnings
+
+
+def _order_by_capture_time(car_folder, cache, executor, warnings):
+    """按拍摄时间重新排列车源文件夹中的图片，拍摄时间相同时保持文件名顺序"""
+    images = car_folder.images
+    infos = read_capture_times(images, cache, executor)
+    order = sorted(range(len(images)), key=lambda i: capture_sort_key(infos[i]))
+
+    missing = sum(1 for info in infos if info['time'] is None)
+    if missing:
+        warnings.append(f"文件夹 '{car_folder.name}' 中有 {missing} 张图片没有拍摄时间，"
+                        f"按文件名排在最后")
+
+    return car_folder._replace(images=[images[i] for i in order])
+
+
+def _probe_preview_items(car_folder, items, cache, executor, warnings):
+    """检查车源文件夹中的图片，把结果附加到预览项上"""
+    infos = probe_images(car_folder.images[:len(items)], cache, executor)
+    for data, info in zip(items, infos):
+        data['probe'] = info
+        problem = describe_problem(info)
+        if problem:
+            warnings.append(f"文件夹 '{data['folder']}' 中的 '{data['original']}' {problem}")
+
+
+def _dedupe_preview_items(car_folder, items, cache, executor, warnings):
+    """检查车源文件夹中重复的图片，把结果附加到预览项上"""
+    images = car_folder.images
+    fingerprints = fingerprint_images(images, cache, executor)
+    for j, (i, exact, distance) in sorted(find_duplicates(fingerprints).items()):
+        duplicate = {'of': images[i].name, 'exact': exact, 'distance': distance}
+        if j < len(items):
+            items[j]['duplicate'] = duplicate
+        warnings.append(f"文件夹 '{car_folder.name}' 中的 '{images[j].name}' "
+                        f"{describe_duplicate(duplicate)}")
+
+
+def _preview_car_folder(car_folder, rename_rules, expected_count, warnings):
+    """生成单个车源文件夹的重命名预览，不符合要求时记录警告并返回空列表"""
+    subfolder = car_folder.name
+    items = []
+
+    # 提取车源号
+    number = extract_number_from_folder_name(subfolder)
+    if not number:
+        warnings.append(f"无法从文件夹名 '{subfolder}' 中提取车源号（格式应为：车源号_车辆名）")
+        return items
+
+    images = car_folder.images
+    if len(images) != expected_count:
+        warnings.append(f"文件夹 '{subfolder}' 中有 {len(images)} 张图片，不是{expected_count}张")
+        return items
+
+    # 已经是新文件名的图片（再次处理已全部或部分重命名的文件夹）保持原来的位置，
+    # 其余图片按顺序依次使用剩下的规则；不能按排序结果重新分配，否则会打乱已经命名好的图片
+    new_names = [f"{number}{rule}" for rule in rename_rules[:len(images)]]
+    slots = dict.fromkeys(new_names)
+    others = []
+    for image in images:
+        if image.name in slots and slots[image.name] is None:
+            slots[image.name] = image
+        else:
+            others.append(image)
+    renamed = sum(1 for image in slots.values() if image is not None)
+    if renamed:
+        print(f"文件夹 '{subfolder}' 中已有 {renamed} 张图片是新文件名，保持不变")
+    others = iter(others)
+
+    # 生成重命名预览
+    for new_name in new_names:
+        image = slots[new_name] or next(others)
+        items.append({
+            'folder': subfolder,
+            'original': image.name,
+            'new': new_name,
+            'original_path': image.path,
+            'new_path': os.path.join(car_folder.path, new_name)
+        })
+    return items
+
+
+class ProgressSnapshot(namedtuple('ProgressSnapshot', ['done', 'total', 'bytes_done', 'elapsed'])):
+    """某一时刻的处理进度"""
+
+    __slots__ = ()
+
+    @property
+    def percent(self):
+        return self.done / self.total * 100 if self.total else 100.0
+
+    @property
+    def files_per_sec(self):
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mb_per_sec(self):
+        return self.bytes_done / 1024 / 1024 / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """预计剩余秒数，尚无法估计时为None"""
+        if self.done == 0 or self.elapsed <= 0:
+            return None
+        return (self.total - self.done) / self.files_per_sec
+
+    def format(self):
+        """
+        格式化为状态栏文字，例如 120/1200 | 35.2 张/秒 | 180.5 MB/秒 | 剩余 00:30
+        没有统计字节数时（只重命名不读文件）不显示 MB/秒
+        """
+        text = f"{self.done}/{self.total} | {self.files_per_sec:.1f} 张/秒"
+        if self.bytes_done:
+            text += f" | {self.mb_per_sec:.1f} MB/秒"
+        if self.eta is not None:
+            minutes, seconds = divmod(int(self.eta), 60)
+            text += f" | 剩余 {minutes:02d}:{seconds:02d}"
+        return text
+
+
+class ProgressReporter:
+    """
+    进度汇报器
+    合并高频的进度更新，最多每 min_interval 秒调用一次 callback(ProgressSnapshot)，
+    第一个和最后一个文件总会汇报；GUI、命令行和日志都可以作为 callback
+    """
+
+    def __init__(self, total, callback, min_interval=0.05, clock=time.monotonic):
+        self.total = total
+        self.callback = callback
+        self.min_interval = min_interval
+        self.clock = clock
+        self.done = 0
+        self.bytes_done = 0
+        self.start_time = clock()
+        self._last_emit = None
+        self._last_done = 0
+
+    def update(self, advance=1, nbytes=0):
+        """记录完成的文件数和字节数，必要时汇报"""
+        self.done += advance
+        self.bytes_done += nbytes
+        now = self.clock()
+        if (self._last_emit is None or self.done >= self.total or
+                now - self._last_emit >= self.min_interval):
+            self._emit(now)
+
+    def finish(self):
+        """结束时（包括取消后）汇报最终状态"""
+        now = self.clock()
+        if self._last_emit is None or self.done != self._last_done:
+            self._emit(now)
+
+    def snapshot(self, now=None):
+        now = self.clock() if now is None else now
+        return ProgressSnapshot(self.done, self.total, self.bytes_done, now - self.start_time)
+
+    def _emit(self, now):
+        self._last_emit = now
+        self._last_done = self.done
+        if self.callback:
+            self.callback(self.snapshot(now))
+
+
+def _put_until(out_queue, item, stop_event):
+    """向有界队列放入数据，队列满时等待；stop_event 被设置后放弃并返回False"""
+    while not stop_event.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _new_job(index, data):
+    return {'index': index, 'data': data, 'error': None, 'future': None, 'size': 0,
+            'read_seconds': 0.0, 'memory': 0}
+
+
+def _read_compress_jobs(items, rename_enabled, submit, out_queue, cancel_event,
+                        stop_event, failure, budget=None, estimate=None):
+    """
+    流水线读取阶段（在单独的线程中运行）
+    items 为 (序号, 预览项) 列表，按顺序检查并读入原文件，提交压缩任务后放入有界队列；
+    队列满时等待，因此同时在内存中的图片数量不超过队列长度。结束时放入None
+    budget 为 MemoryBudget 时，提交前按 estimate(读入的数据) 估计的内存峰值申请额度
+    """
+    try:
+        for index, data in items:
+            if stop_event.is_set() or (cancel_event is not None and cancel_event.is_set()):
+                break
+            job = _new_job(index, data)
+
+            try:
+                start = time.perf_counter()
+                with open(data['original_path'], 'rb') as f:
+                    content = f.read()
+                job['read_seconds'] = time.perf_counter() - start
+                job['size'] = len(content)
+            except FileNotFoundError:
+                job['error'] = f"文件不存在: {data['original_path']}"
+            else:
+                if rename_enabled and os.path.exists(data['new_path']):
+                    job['error'] = f"目标文件已存在: {data['new_path']}"
+                else:
+                    if budget is not None:
+                        job['memory'] = estimate(content)
+                        if not budget.acquire(job['memory'], stop_event):
+                            break
+                    job['future'] = submit(content, data['original'])
+            # 不再引用读入的数据，压缩完成后即可释放
+            content = None
+
+            if not _put_until(out_queue, job, stop_event):
+                break
+    except BaseException as e:
+        failure.append(e)
+    finally:
+        _put_until(out_queue, None, stop_event)
+
+
+def _write_output(path, content, sync=False):
+    """写入压缩结果，写入失败时删除不完整的文件；sync=True 时等待写入磁盘后才返回"""
+    try:
+        with open(path, 'wb') as f:
+            f.write(content)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def _commit_compressed(index, data, content, rename_enabled, journal=None):
+    """
+    保存压缩结果：先完整写入临时文件，再用 os.replace 原子替换到目标位置，最后删除原文件
+    任何时候中断，原图或压缩后的图片至少有一份是完整的；
+    有处理日志时，替换前先把 staged 状态写入磁盘，继续处理时据此补完剩余步骤
+    """
+    target = data['new_path'] if rename_enabled else data['original_path']
+    tmp_path = target + '.tmp'
+    _write_output(tmp_path, content, sync=journal is not None)
+    if journal is not None:
+        journal.record(index, STATE_STAGED, sync=True)
+    os.replace(tmp_path, target)
+    if rename_enabled:
+        os.remove(data['original_path'])
+
+
+def _journal_temp_path(journal, index, data):
+    """继续中断的批次时文件可能停留的临时名称（见 image_renamer_planner），没有时返回None"""
+    if journal is None:
+        return None
+    path = journal.temp_path(index)
+    if path is None and journal.state(index) == STATE_STAGED:
+        # 旧版日志没有记录临时名称，只可能是默认的临时名称
+        path = temp_path_for(data['original_path'])
+    return path
+
+
+def _recover_entry(data, state, rename_enabled, compress_enabled, temp_path=None):
+    """
+    继续上次中断的批次时，根据日志状态和实际文件恢复一个文件
+    temp_path 为日志中记录的临时名称（只重命名时，见 _journal_temp_path）
+    返回 STATE_DONE 表示该文件已处理完，返回None表示需要重新处理
+    """
+    if not compress_enabled:
+        # 只重命名时文件可能停留在临时名称
+        if temp_path is not None and os.path.exists(temp_path):
+            return None
+        if state == STATE_STAGED and os.path.exists(data['new_path']):
+            # 已经从临时名称改为新文件名
+            return STATE_DONE
+
+    target = data['new_path'] if rename_enabled else data['original_path']
+    tmp_path = target + '.tmp'
+    if compress_enabled:
+        if state == STATE_STAGED:
+            # 临时文件已完整写入：补做替换，目标文件存在后再删除原文件
+            if os.path.exists(tmp_path):
+                os.replace(tmp_path, target)
+            if os.path.exists(target):
+                if rename_enabled and os.path.exists(data['original_path']):
+                    os.remove(data['original_path'])
+                return STATE_DONE
+        elif os.path.exists(tmp_path):
+            # 未写完的临时文件
+            os.remove(tmp_path)
+
+    # 已经重命名过（只重命名，或直接沿用原文件的图片）
+    if (rename_enabled and not os.path.exists(data['original_path'])
+            and os.path.exists(data['new_path'])):
+        return STATE_DONE
+    return None
+
+
+def _iter_compress_jobs(items, rename_enabled, submit, queue_size, cancel_event,
+                        budget=None, estimate=None):
+    """
+    压缩流水线：读取线程预读原文件 → 执行器压缩 → 调用线程按顺序依次取出写入
+    三个阶段之间通过长度为 queue_size 的有界队列衔接，读取与压缩、写入同时进行；
+    有内存预算时，调用线程处理完一张图片（取下一张）后释放它的额度
+    """
+    out_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    failure = []
+    reader = threading.Thread(target=_read_compress_jobs, name='image-renamer-reader',
+                              args=(items, rename_enabled, submit, out_queue,
+                                    cancel_event, stop_event, failure, budget, estimate),
+                              daemon=True)
+    reader.start()
+    try:
+        while True:
+            job = out_queue.get()
+            if job is None:
+                break
+            yield job
+            if budget is not None:
+                budget.release(job['memory'])
+        if failure:
+            raise failure[0]
+    finally:
+        stop_event.set()
+        reader.join()
+
+
+def _rename_items(items, journal=None, undo_log=None, reporter=None, cancel_event=None):
+    """
+    只重命名：每个文件夹只列一次目录，计算整个文件夹的重命名计划后一次执行，
+    新文件名与原文件名重叠（再次处理已部分重命名的文件夹）时也能完成（见 image_renamer_planner）
+    items 为 (序号, 预览项) 列表，返回 (success_count, errors)
+    """
+    success_count = 0
+    errors = []
+    folders = {}
+    for index, data in items:
+        folders.setdefault(os.path.dirname(data['original_path']), []).append((index, data))
+
+    def finish(index, state, error=None):
+        if error is not None:
+            errors.append(error)
+        if journal is not None:
+            journal.record(index, state)
+        if reporter is not None:
+            reporter.update()
+
+    for folder, folder_items in folders.items():
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        try:
+            existing = {os.path.join(folder, name) for name in os.listdir(folder)}
+        except OSError as e:
+            for index, data in folder_items:
+                finish(index, STATE_FAILED, f"处理失败 {data['original']}: {e}")
+            continue
+
+        moves = []
+        for index, data in folder_items:
+            # 继续中断的批次时文件可能停留在临时名称
+            temp_path = _journal_temp_path(journal, index, data)
+            src = temp_path if temp_path in existing else data['original_path']
+            moves.append((index, src, data['new_path']))
+        steps, conflicts = plan_renames(moves, existing)
+        if journal is not None:
+            # 移动之前记录实际使用的临时名称（可能带序号），中断后据此找回文件
+            temp_paths = {index: dst for index, src, dst, is_temp in steps if is_temp}
+            if temp_paths:
+                journal.record_temp_paths(temp_paths)
+
+        by_index = dict(folder_items)
+        in_temp = {}
+
+        def on_step(index, src, dst, is_temp):
+            data = by_index[index]
+            if is_temp:
+                in_temp[index] = dst
+                if journal is not None:
+                    journal.record(index, STATE_STAGED)
+                return
+            in_temp.pop(index, None)
+            if undo_log is not None:
+                undo_log.add(data['original_path'], data['new_path'])
+            finish(index, STATE_DONE)
+
+        completed, failure = execute_renames(steps, on_step, cancel_event)
+        success_count += len(completed)
+        planned = {step[0] for step in steps}
+        cancelled = cancel_event is not None and cancel_event.is_set()
+
+        for index, data in folder_items:
+            if index in completed:
+                continue
+            if index in conflicts:
+                finish(index, STATE_FAILED, conflicts[index])
+            elif index not in planned:
+                # 已经是新文件名
+                success_count += 1
+                finish(index, STATE_DONE)
+            elif failure is not None and failure[0] == index:
+                finish(index, STATE_FAILED, f"处理失败 {data['original']}: {failure[1]}")
+            elif index in in_temp:
+                finish(index, STATE_STAGED,
+                       f"处理失败 {data['original']}: 文件暂时保存为 {in_temp[index]}")
+            elif failure is not None:
+                finish(index, STATE_FAILED,
+                       f"未处理 {data['original']}: 同一文件夹中有文件重命名失败")
+            elif not cancelled:
+                finish(index, STATE_FAILED, f"未处理 {data['original']}")
+
+    return success_count, errors
+
+
+def apply_preview(preview_data, rename_enabled=True, compress_enabled=False, quality=None,
+                  target_size=TARGET_SIZE, draft=True, passthrough=True,
+                  executor_mode='serial', workers=1,
+                  progress_callback=None, cancel_event=None, progress_interval=0.05,
+                  profile=None, encoder=DEFAULT_ENCODER_PROFILE, queue_size=None,
+                  journal=None, undo_log=None, executor=None, memory_budget=None,
+                  backend=DEFAULT_BACKEND):
+    """
+    执行处理操作（重命名和/或压缩）
+    压缩时按流水线处理：读取线程预读原文件，执行器并行压缩内存中的数据，
+    写入和删除/重命名等收尾操作按预览顺序在调用线程依次完成；
+    各阶段之间的队列最多容纳 queue_size 张图片（默认为工作进程数的 PIPELINE_DEPTH_PER_WORKER 倍），
+    读盘和压缩可以重叠，内存占用也有上限；
+    memory_budget 为内存预算（MB）时，还按文件头估计每张图片压缩时的内存峰值（见 estimate_compress_memory），
+    已提交的图片估计值之和不超过预算，避免多个大图同时解码时内存不足；为None时不限制
+    progress_callback(ProgressSnapshot) 由 ProgressReporter 合并后调用，最多每 progress_interval 秒一次
+    cancel_event 被设置后不再开始新的文件，已在压缩中的文件会完成收尾，避免留下半成品
+    profile 为 CompressionProfile 时记录每张图片各步骤的耗时（包括读取和写入）
+    encoder 为编码方案名（见 ENCODER_PROFILES），quality 为None时使用该方案的默认质量，
+    backend 为缩放和编码的引擎名（见 image_renamer_backends）
+    journal 为 BatchJournal 时记录每个文件的状态，批次处理完后删除日志，取消或出错时保留日志；
+    日志来自上次中断的批次时先恢复中断的文件，已完成的文件直接计入成功，不再重新处理
+    undo_log 为 UndoLog 时记录每个重命名的文件（压缩后的文件附带内容哈希），用于撤销整个批次
+    executor 为已有的执行器时使用它压缩且不关闭（多个批次共用工作进程），此时忽略 executor_mode
+    返回 (success_count, error_count, errors)，取消时未处理的文件不计入成功或失败
+    """
+    if compress_enabled:
+        # 编码方案无效或引擎未安装时在开始处理前报错
+        encoder_options(encoder, quality)
+        get_backend(backend)
+
+    total = len(preview_data)
+    reporter = ProgressReporter(total, progress_callback, progress_interval)
+    success_count = 0
+    error_count = 0
+    errors = []
+
+    workers = max(1, int(workers or default_worker_count()))
+    if queue_size is None:
+        queue_size = workers * PIPELINE_DEPTH_PER_WORKER
+    queue_size = max(1, queue_size)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = create_executor(executor_mode if compress_enabled else 'serial', workers)
+
+    def submit(content, name):
+        return executor.submit(compress_image_data, content, target_size=target_size,
+                               quality=quality, draft=draft, passthrough=passthrough,
+                               encoder=encoder, profiled=profile is not None, name=name,
+                               backend=backend)
+
+    budget = None
+    if memory_budget:
+        budget = MemoryBudget(memory_budget * 1024 * 1024)
+
+    encode_quality = encoder_options(encoder, quality)['quality'] if compress_enabled else None
+
+    def estimate(content):
+        return estimate_data_memory(content, target_size=target_size, draft=draft,
+                                    passthrough=passthrough, quality=encode_quality)
+
+    # 跳过日志中已完成的文件
+    items = []
+    for index, data in enumerate(preview_data):
+        state = journal.state(index) if journal is not None else None
+        if journal is not None and journal.resumed and state != STATE_DONE:
+            try:
+                temp_path = _journal_temp_path(journal, index, data)
+                if _recover_entry(data, state, rename_enabled, compress_enabled,
+                                  temp_path) == STATE_DONE:
+                    state = STATE_DONE
+                    journal.record(index, STATE_DONE)
+                    # 中断前可能还没来得及写入撤销记录
+                    if (undo_log is not None and rename_enabled
+                            and not undo_log.has(data['new_path'])):
+                        sha1 = file_hash(data['new_path']) if compress_enabled else None
+                        undo_log.add(data['original_path'], data['new_path'], sha1)
+            except OSError as e:
+                print(f"恢复中断的文件失败 {data['original']}: {e}")
+        if state == STATE_DONE:
+            success_count += 1
+            reporter.update()
+        else:
+            items.append((index, data))
+
+    completed = False
+    jobs = None
+    try:
+        if not compress_enabled:
+            renamed, rename_errors = _rename_items(items, journal, undo_log, reporter,
+                                                   cancel_event)
+            success_count += renamed
+            error_count += len(rename_errors)
+            errors.extend(rename_errors)
+        else:
+            jobs = _iter_compress_jobs(items, rename_enabled, submit, queue_size, cancel_event,
+                                       budget, estimate)
+            # 按顺序取出结果并完成写入和收尾操作
+            for job in jobs:
+                data = job['data']
+                if cancel_event is not None and cancel_event.is_set():
+                    future = job['future']
+                    if future is None or future.cancel():
+                        continue
+                index = job['index']
+                state = STATE_FAILED
+                try:
+                    if job['error']:
+                        errors.append(job['error'])
+                        error_count += 1
+
+                    else:
+                        ok, content, stats = job['future'].result()
+                        start = time.perf_counter()
+                        if ok:
+                            if content is None:
+                                # 已符合输出要求，沿用原文件
+                                if rename_enabled:
+                                    os.rename(data['original_path'], data['new_path'])
+                            else:
+                                _commit_compressed(index, data, content, rename_enabled, journal)
+                            if undo_log is not None and rename_enabled:
+                                sha1 = content_hash(content) if content is not None else None
+                                undo_log.add(data['original_path'], data['new_path'], sha1)
+                            state = STATE_DONE
+                            success_count += 1
+                        else:
+                            errors.append(f"压缩失败: {data['original']}")
+                            error_count += 1
+                        if profile is not None:
+                            stats['stages']['read'] = job['read_seconds']
+                            stats['stages']['write'] = time.perf_counter() - start
+                            profile.add(data['original_path'], ok, stats)
+
+                except Exception as e:
+                    errors.append(f"处理失败 {data['original']}: {str(e)}")
+                    error_count += 1
+
+                if journal is not None:
+                    journal.record(index, state)
+                reporter.update(nbytes=job['size'])
+        completed = True
+    finally:
+        if jobs is not None:
+            jobs.close()
+        if own_executor:
+            executor.shutdown(wait=True)
+        reporter.finish()
+        if journal is not None:
+            # 取消或出错时保留日志，之后可以继续处理
+            if completed and not (cancel_event is not None and cancel_event.is_set()):
+                journal.complete()
+            else:
+                journal.close()
+
+    return success_count, error_count, errors
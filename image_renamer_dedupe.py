@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 重复图片检查
+同一车源文件夹中出现两张相同的照片（连拍两次）时，之后的每张图片都会对应错误的重命名规则。
+预览时为每张图片计算感知哈希（疑似重复），只有大小相同的图片才计算文件内容哈希（完全相同），
+结果按文件缓存；完全相同的文件大小一定相同，大多数图片不必读取整个文件来计算内容哈希
+"""
+
+import hashlib
+
+from PIL import Image
+
+from image_renamer_cache import cached_file_map
+
+# 缓存中感知哈希和文件内容哈希的类型名
+DHASH_CACHE_KIND = 'dhash'
+SHA1_CACHE_KIND = 'sha1'
+
+# 计算文件内容哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 感知哈希（dHash）的边长，得到 DHASH_SIZE × DHASH_SIZE 位
+DHASH_SIZE = 8
+
+# 感知哈希相差不超过该位数时视为疑似重复
+NEAR_DUPLICATE_DISTANCE = 6
+
+
+def _resize_bilinear(img, size):
+    """缩放图片 - 兼容旧版本PIL"""
+    try:
+        return img.resize(size, Image.Resampling.BILINEAR)
+    except AttributeError:
+        return img.resize(size, Image.BILINEAR)
+
+
+def dhash(img, size=DHASH_SIZE):
+    """
+    计算差值哈希：缩小为 (size+1)×size 的灰度图，比较每行相邻像素的亮度
+    对重新压缩、轻微亮度变化不敏感，返回十六进制字符串
+    """
+    small = _resize_bilinear(img.convert('L'), (size + 1, size))
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return f"{value:0{size * size // 4}x}"
+
+
+def hash_distance(a, b):
+    """两个感知哈希相差的位数"""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def fingerprint_image(path):
+    """
+    计算一张图片的感知哈希：用JPEG的DCT缩放快速解码到很小的尺寸后计算，不解码完整图片
+    返回字典 dhash / error
+    """
+    info = {'dhash': None, 'error': None}
+    try:
+        with Image.open(path) as img:
+            img.draft('L', (DHASH_SIZE * 8, DHASH_SIZE * 8))
+            info['dhash'] = dhash(img)
+    except Exception as e:
+        info['error'] = str(e)
+    return info
+
+
+def content_sha1(path):
+    """计算文件内容的 sha1，返回字典 sha1 / error"""
+    info = {'sha1': None, 'error': None}
+    try:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        info['sha1'] = digest.hexdigest()
+    except OSError as e:
+        info['error'] = str(e)
+    return info
+
+
+def _fingerprint_error(error):
+    return {'dhash': None, 'sha1': None, 'error': error}
+
+
+def fingerprint_images(images, cache=None, executor=None):
+    """
+    并行计算一组图片（ImageEntry 列表）的指纹，返回与 images 顺序一致的结果，
+    每项为字典 size / dhash / sha1 / error，只有与其他图片大小相同的图片才计算 sha1，其余为None
+    cache 为 ScanCache 时按 路径 + 大小 + 修改时间 缓存结果，再次预览时无需重新读取文件
+    """
+    fingerprints = [dict(info, size=None, sha1=None) for info in
+                    cached_file_map(images, DHASH_CACHE_KIND, fingerprint_image, cache, executor,
+                                    _fingerprint_error)]
+    by_size = {}
+    for i, (image, info) in enumerate(zip(images, fingerprints)):
+        if info['error'] is None:
+            info['size'] = image.stat().st_size
+            by_size.setdefault(info['size'], []).append(i)
+
+    # 完全相同的文件大小一定相同
+    same_size = [i for indexes in by_size.values() if len(indexes) > 1 for i in indexes]
+    hashes = cached_file_map([images[i] for i in same_size], SHA1_CACHE_KIND, content_sha1,
+                             cache, executor, _fingerprint_error)
+    for i, info in zip(same_size, hashes):
+        fingerprints[i]['sha1'] = info['sha1']
+    return fingerprints
+
+
+def find_duplicates(fingerprints, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """
+    查找重复的图片
+    返回 {序号: (与之重复的较早图片序号, 是否完全相同, 感知哈希相差位数)}，
+    每张图片只对应最早的一张重复图片
+    """
+    duplicates = {}
+    for j, later in enumerate(fingerprints):
+        if later['error']:
+            continue
+        for i in range(j):
+            earlier = fingerprints[i]
+            if earlier['error']:
+                continue
+            if earlier['sha1'] is not None and earlier['sha1'] == later['sha1']:
+                duplicates[j] = (i, True, 0)
+                break
+            distance = hash_distance(earlier['dhash'], later['dhash'])
+            if distance <= max_distance:
+                duplicates[j] = (i, False, distance)
+                break
+    return duplicates
+
+
+def describe_duplicate(duplicate):
+    """格式化预览项中的重复信息"""
+    if duplicate['exact']:
+        return f"与 {duplicate['of']} 完全相同"
+    return f"与 {duplicate['of']} 疑似重复"
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 拍摄时间
+从SD卡复制后文件的修改时间都变成复制的时间，不能用来排序；
+按EXIF中的拍摄时间（DateTimeOriginal + SubSecTimeOriginal）排序。
+只解析JPEG文件开头的APP1段，不调用PIL、不解码图片
+"""
+
+import re
+import struct
+
+from image_renamer_cache import cached_file_map
+
+# JPEG 标记
+JPEG_SOI = b'\xff\xd8'
+MARKER_APP1 = 0xE1
+MARKER_SOS = 0xDA
+MARKER_EOI = 0xD9
+
+# EXIF 标签
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_SUBSEC_TIME_ORIGINAL = 0x9291
+
+# TIFF 数据类型
+TYPE_ASCII = 2
+TYPE_LONG = 4
+
+# 读取APP1段前最多跳过的字节数（缩略图等其他APPn段），超过后放弃
+MAX_HEADER_BYTES = 256 * 1024
+
+# 缓存中拍摄时间的类型名
+CAPTURE_TIME_CACHE_KIND = 'capture_time'
+
+_DATETIME_PATTERN = re.compile(r'^\d{4}:\d{2}:\d{2} \d{2}:\d{2}:\d{2}$')
+
+
+def _read_exif_segment(f):
+    """找到JPEG文件中的EXIF APP1段，返回其中的TIFF数据，没有时返回None"""
+    if f.read(2) != JPEG_SOI:
+        raise ValueError("不是JPEG文件")
+
+    while f.tell() < MAX_HEADER_BYTES:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            raise ValueError("JPEG段标记错误")
+        marker = f.read(1)
+        while marker == b'\xff':  # 填充字节
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in (MARKER_SOS, MARKER_EOI):
+            return None  # 图像数据开始，后面没有EXIF
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            continue  # 没有长度字段的标记
+
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker == MARKER_APP1:
+            data = f.read(length - 2)
+            if data.startswith(b'Exif\x00\x00'):
+                return data[6:]
+        else:
+            f.seek(length - 2, 1)
+    return None
+
+
+def _read_ifd(tiff, offset, endian):
+    """读取一个IFD，返回 {标签: (类型, 数量, 值或偏移所在位置)}"""
+    count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+    entries = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        tag, type_, n = struct.unpack_from(endian + 'HHI', tiff, entry)
+        entries[tag] = (type_, n, entry + 8)
+    return entries
+
+
+def _ascii_value(tiff, entry, endian):
+    type_, n, pos = entry
+    if type_ != TYPE_ASCII:
+        return None
+    if n > 4:
+        pos = struct.unpack_from(endian + 'I', tiff, pos)[0]
+    value = tiff[pos:pos + n]
+    if len(value) < n:
+        raise ValueError("EXIF数据不完整")
+    return value.split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+
+
+def parse_capture_time(tiff):
+    """从EXIF的TIFF数据中读取 (拍摄时间, 亚秒)，没有拍摄时间时返回 (None, '')"""
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        raise ValueError("EXIF字节序错误")
+    if struct.unpack_from(endian + 'H', tiff, 2)[0] != 42:
+        raise ValueError("EXIF头错误")
+
+    ifd0 = _read_ifd(tiff, struct.unpack_from(endian + 'I', tiff, 4)[0], endian)
+    pointer = ifd0.get(TAG_EXIF_IFD)
+    if pointer is None or pointer[0] != TYPE_LONG:
+        return None, ''
+    exif_ifd = _read_ifd(tiff, struct.unpack_from(endian + 'I', tiff, pointer[2])[0], endian)
+
+    entry = exif_ifd.get(TAG_DATETIME_ORIGINAL)
+    value = _ascii_value(tiff, entry, endian) if entry else None
+    # 相机未设置时间时会写入空格或全0
+    if not value or not _DATETIME_PATTERN.match(value) or value.startswith('0000'):
+        return None, ''
+
+    entry = exif_ifd.get(TAG_SUBSEC_TIME_ORIGINAL)
+    subsec = _ascii_value(tiff, entry, endian) if entry else ''
+    if not (subsec or '').isdigit():
+        subsec = ''
+    return value, subsec
+
+
+def read_capture_time(path):
+    """
+    读取一张图片的拍摄时间
+    返回字典 time（'YYYY:MM:DD HH:MM:SS'，没有时为None） / subsec / error
+    """
+    info = {'time': None, 'subsec': '', 'error': None}
+    try:
+        with open(path, 'rb') as f:
+            tiff = _read_exif_segment(f)
+        if tiff is not None:
+            info['time'], info['subsec'] = parse_capture_time(tiff)
+    except (OSError, ValueError, struct.error) as e:
+        info['error'] = str(e)
+    return info
+
+
+def capture_sort_key(info):
+    """按拍摄时间排序的键，没有拍摄时间的图片排在最后"""
+    if info['time'] is None:
+        return (1, '', 0.0)
+    subsec = float('0.' + info['subsec']) if info['subsec'] else 0.0
+    return (0, info['time'], subsec)
+
+
+def _capture_time_error(error):
+    return {'time': None, 'subsec': '', 'error': error}
+
+
+def read_capture_times(images, cache=None, executor=None):
+    """
+    并行读取一组图片（ImageEntry 列表）的拍摄时间，返回与 images 顺序一致的结果
+    cache 为 ScanCache 时按 路径 + 大小 + 修改时间 缓存结果
+    """
+    return cached_file_map(images, CAPTURE_TIME_CACHE_KIND, read_capture_time, cache, executor,
+                           _capture_time_error)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 处理日志
+开始处理前把整个批次的计划（每个文件的原路径、新路径和处理选项）写入日志，
+处理过程中追加每个文件的状态；程序崩溃或被取消后可以根据日志继续处理，
+已完成的文件不会重新处理
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import time
+
+# 默认日志目录
+JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.image_renamer', 'journals')
+
+# 日志格式版本
+JOURNAL_VERSION = 1
+
+# 文件状态：staged 输出已完整写入临时文件（尚未替换），done 已完成，failed 失败
+STATE_STAGED = 'staged'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+
+def folder_key(folder):
+    """第二层文件夹的标识（绝对路径的哈希），用于处理日志、撤销记录和监视记录的文件名"""
+    return hashlib.sha1(os.path.abspath(folder).encode('utf-8')).hexdigest()[:16]
+
+
+def read_jsonl(path):
+    """逐条读取JSONL记录；程序崩溃时最后一行可能不完整，忽略无法解析的行"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def journal_path_for(folder, journal_dir=JOURNAL_DIR):
+    """每个第二层文件夹对应一个日志文件"""
+    return os.path.join(journal_dir, f"{folder_key(folder)}.jsonl")
+
+
+def new_batch_id():
+    """批次编号（开始处理的时间），同时用于撤销记录的文件名"""
+    return datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+
+def _fsync_dir(path):
+    """确保目录项（新建的文件）已写入磁盘，不支持时忽略"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class BatchJournal:
+    """
+    一个批次的处理日志（每行一个JSON记录，只追加不修改）
+    第一行为批次信息和处理选项，之后每个文件一行计划，处理过程中追加状态记录
+    """
+
+    def __init__(self, path, header, items, states, resumed=False, temp_paths=None):
+        self.path = path
+        self.header = header
+        self.items = items
+        self.states = states
+        # 只重命名时环中文件使用的临时名称（见 image_renamer_planner）
+        self.temp_paths = temp_paths or {}
+        # 从已有日志继续时为True
+        self.resumed = resumed
+        self._file = open(path, 'a', encoding='utf-8')
+
+    @classmethod
+    def create(cls, folder, preview_data, options, path=None):
+        """
+        为一个批次新建日志并写入处理计划（写入磁盘后才返回）
+        options 为 apply_preview 的处理选项（rename_enabled、compress_enabled、quality 等）
+        """
+        path = path or journal_path_for(folder)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = {'type': 'batch', 'version': JOURNAL_VERSION,
+                  'folder': os.path.abspath(folder), 'batch_id': new_batch_id(),
+                  'created': time.time(), 'options': options}
+
+        # 先写临时文件再替换，不会留下只有一半计划的日志
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + '\n')
+            for index, item in enumerate(preview_data):
+                f.write(json.dumps({'type': 'plan', 'index': index, 'item': item},
+                                   ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(os.path.dirname(os.path.abspath(path)))
+        return cls(path, header, list(preview_data), {})
+
+    @classmethod
+    def load(cls, path):
+        """读取已有日志"""
+        header = None
+        items = []
+        states = {}
+        temp_paths = {}
+        for record in read_jsonl(path):
+            if record['type'] == 'batch':
+                header = record
+            elif record['type'] == 'plan':
+                items.append(record['item'])
+            elif record['type'] == 'state':
+                states[record['index']] = record['state']
+            elif record['type'] == 'temp':
+                temp_paths[record['index']] = record['path']
+        if header is None or header.get('version') != JOURNAL_VERSION:
+            raise ValueError(f"无法识别的处理日志: {path}")
+        return cls(path, header, items, states, resumed=True, temp_paths=temp_paths)
+
+    @property
+    def folder(self):
+        return self.header['folder']
+
+    @property
+    def batch_id(self):
+        return self.header['batch_id']
+
+    @property
+    def options(self):
+        """处理选项，可直接作为 apply_preview 的参数"""
+        options = dict(self.header['options'])
+        if options.get('target_size') is not None:
+            options['target_size'] = tuple(options['target_size'])
+        return options
+
+    def state(self, index):
+        return self.states.get(index)
+
+    def record(self, index, state, sync=False):
+        """
+        追加一个文件的状态
+        sync=True 时等待写入磁盘后才返回（进行不可撤销的操作之前使用）
+        """
+        self.states[index] = state
+        self._file.write(json.dumps({'type': 'state', 'index': index, 'state': state}) + '\n')
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def temp_path(self, index):
+        """文件计划使用的临时名称，没有记录时返回None"""
+        return self.temp_paths.get(index)
+
+    def record_temp_paths(self, temp_paths):
+        """
+        在移动文件之前记录环中文件将使用的临时名称 {序号: 临时路径}（写入磁盘后才返回），
+        临时名称被占用时计划会改用带序号的名称，继续处理时按记录找回文件
+        """
+        for index, path in temp_paths.items():
+            self.temp_paths[index] = path
+            self._file.write(json.dumps({'type': 'temp', 'index': index, 'path': path},
+                                        ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def counts(self):
+        """各状态的文件数量"""
+        counts = {STATE_DONE: 0, STATE_FAILED: 0, STATE_STAGED: 0}
+        for state in self.states.values():
+            counts[state] += 1
+        counts['pending'] = len(self.items) - counts[STATE_DONE]
+        return counts
+
+    def close(self):
+        """关闭日志，保留文件以便之后继续处理"""
+        if not self._file.closed:
+            self._file.close()
+
+    def complete(self):
+        """批次已处理完，删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+def find_unfinished_journal(folder, journal_dir=JOURNAL_DIR):
+    """返回该文件夹未完成批次的日志路径，没有时返回None"""
+    path = journal_path_for(folder, journal_dir)
+    return path if os.path.exists(path) else None
+
+
+def discard_journal(path):
+    """放弃未完成的批次（删除日志）"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 重命名计划
+一次计算整个文件夹的重命名（原文件名 → 新文件名），新文件名与原文件名重叠时
+（如对已部分重命名的文件夹再次处理、调整顺序）按依赖关系排序，
+互相占用的环先移到临时名称再改为新文件名，整批一次完成
+"""
+
+import os
+from collections import deque
+
+# 环中文件的临时名称后缀
+RENAME_TEMP_SUFFIX = '.renaming'
+
+
+def temp_path_for(path):
+    """文件在环中时使用的临时名称（继续中断的批次时据此找回文件）"""
+    return path + RENAME_TEMP_SUFFIX
+
+
+def plan_renames(moves, existing):
+    """
+    计算重命名步骤
+    moves: [(key, 当前路径, 新路径)]，key 用于对应结果；existing: 目录中现有文件路径的集合
+    （由调用方一次列目录得到，计划过程中不再逐个检查文件是否存在）
+    返回 (steps, conflicts)：
+        steps 为按顺序执行的 [(key, 源路径, 目标路径, 是否移到临时名称)]
+        conflicts 为 {key: 错误信息}，这些文件不处理
+    当前路径与新路径相同的文件既不在 steps 也不在 conflicts 中（已经是新文件名）
+    """
+    conflicts = {}
+    pending = {}
+    targets = {}
+    for key, src, dst in moves:
+        if src not in existing:
+            conflicts[key] = f"文件不存在: {src}"
+        elif src == dst:
+            continue
+        elif dst in targets:
+            conflicts[key] = f"新文件名重复: {dst}"
+        else:
+            targets[dst] = key
+            pending[src] = (key, dst)
+
+    # 新文件名被不参与重命名的文件占用时冲突；冲突的文件保持不动，可能导致其他文件也冲突
+    changed = True
+    while changed:
+        changed = False
+        for src, (key, dst) in list(pending.items()):
+            if dst in existing and dst not in pending:
+                conflicts[key] = f"目标文件已存在: {dst}"
+                del pending[src]
+                changed = True
+
+    # waiting[路径] = 要移到该路径、需要等它先移走的源路径
+    waiting = {dst: src for src, (key, dst) in pending.items() if dst in pending}
+    ready = deque(src for src, (key, dst) in pending.items() if dst not in pending)
+    used = set(existing)
+    steps = []
+
+    while pending:
+        if ready:
+            src = ready.popleft()
+            key, dst = pending.pop(src)
+            steps.append((key, src, dst, False))
+        else:
+            # 剩下的文件都在环中：先把其中一个移到临时名称，打开这个环
+            src = next(iter(pending))
+            key, dst = pending.pop(src)
+            tmp = temp_path_for(src)
+            n = 1
+            while tmp in used:
+                tmp = f"{temp_path_for(src)}{n}"
+                n += 1
+            used.add(tmp)
+            steps.append((key, src, tmp, True))
+            pending[tmp] = (key, dst)
+            waiting[dst] = tmp
+
+        # src 已经空出来，等待它的文件可以移动了
+        waiter = waiting.pop(src, None)
+        if waiter is not None:
+            ready.append(waiter)
+
+    return steps, conflicts
+
+
+def execute_renames(steps, on_step=None, cancel_event=None):
+    """
+    按顺序执行 plan_renames 的步骤
+    某一步失败时停止（后面的步骤可能要移到这个文件原来的位置）；
+    取消时只在没有文件停留在临时名称时停止
+    on_step(key, src, dst, is_temp) 在每一步完成后调用
+    返回 (completed, failure)：completed 为已改为新文件名的 key 集合，
+    failure 为 (key, 异常)，没有失败时为None
+    """
+    completed = set()
+    in_temp = set()
+    for key, src, dst, is_temp in steps:
+        if not in_temp and cancel_event is not None and cancel_event.is_set():
+            break
+        try:
+            os.rename(src, dst)
+        except OSError as e:
+            return completed, (key, e)
+        if is_temp:
+            in_temp.add(key)
+        else:
+            in_temp.discard(key)
+            completed.add(key)
+        if on_step is not None:
+            on_step(key, src, dst, is_temp)
+    return completed, None
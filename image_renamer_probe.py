@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 图片检查
+只读取文件头和文件末尾，不解码像素，用于在预览阶段提前发现损坏或不完整的图片
+"""
+
+import os
+
+from PIL import Image
+
+from image_renamer_cache import cached_file_map
+
+# JPEG 起始标记（SOI）和结束标记（EOI）
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+
+# 在文件末尾多少字节内查找结束标记（部分相机会在EOI之后追加数据）
+EOI_SEARCH_BYTES = 64 * 1024
+
+# EXIF 方向标签
+EXIF_ORIENTATION = 0x0112
+
+# 缓存中图片检查结果的类型名
+PROBE_CACHE_KIND = 'probe'
+
+
+def probe_image(path):
+    """
+    检查一张图片：尺寸、颜色模式、EXIF方向，以及是否缺少JPEG结束标记（文件不完整）
+    返回字典 width / height / mode / orientation / truncated / error
+    """
+    info = {'width': None, 'height': None, 'mode': None, 'orientation': 1,
+            'truncated': False, 'error': None}
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(2)
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - EOI_SEARCH_BYTES))
+            tail = f.read()
+
+        if head != JPEG_SOI:
+            info['error'] = "不是JPEG文件"
+            return info
+        # 压缩数据中的0xFF都会被填充为0xFF00，末尾出现FFD9说明文件完整结束过
+        info['truncated'] = JPEG_EOI not in tail
+
+        with Image.open(path) as img:
+            info['width'], info['height'] = img.size
+            info['mode'] = img.mode
+            info['orientation'] = img.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception as e:
+        info['error'] = str(e)
+    return info
+
+
+def describe_problem(info):
+    """返回图片问题的描述，没有问题时返回None"""
+    if info['error']:
+        return f"无法读取: {info['error']}"
+    if info['truncated']:
+        return "文件不完整（缺少结束标记）"
+    return None
+
+
+def describe_probe(info):
+    """格式化为预览表中的 (尺寸, 状态) 两列"""
+    if info['width']:
+        size_text = f"{info['width']}×{info['height']}"
+    else:
+        size_text = ''
+
+    problem = describe_problem(info)
+    if problem:
+        status_text = problem
+    elif info['orientation'] != 1:
+        status_text = f"EXIF方向{info['orientation']}"
+    else:
+        status_text = "正常"
+    return size_text, status_text
+
+
+def _probe_error(error):
+    return {'width': None, 'height': None, 'mode': None, 'orientation': 1,
+            'truncated': False, 'error': error}
+
+
+def probe_images(images, cache=None, executor=None):
+    """
+    并行检查一组图片（ImageEntry 列表），返回与 images 顺序一致的检查结果
+    cache 为 ScanCache 时按 路径 + 大小 + 修改时间 缓存结果
+    """
+    return cached_file_map(images, PROBE_CACHE_KIND, probe_image, cache, executor, _probe_error)
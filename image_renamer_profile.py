@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 压缩耗时统计
+汇总处理时 compress_image_data（profiled=True）记录的每张图片各步骤耗时，生成直方图、摘要和JSON报告
+"""
+
+import json
+import os
+import threading
+import time
+
+# 压缩各步骤（按执行顺序）
+STAGES = ('read', 'open', 'decode', 'resize', 'convert', 'paste', 'encode', 'write')
+
+STAGE_NAMES = {
+    'read': '读取',
+    'open': '打开',
+    'decode': '解码',
+    'convert': '转RGB',
+    'resize': '缩放',
+    'paste': '补白边',
+    'encode': '编码保存',
+    'write': '写入',
+}
+
+# 直方图分桶上限（毫秒），最后一个桶为超过最大上限的部分
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# 默认报告目录
+DEFAULT_REPORT_DIR = os.path.join(os.path.expanduser('~'), '.image_renamer', 'reports')
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _histogram(values_ms):
+    """按 HISTOGRAM_BUCKETS_MS 分桶计数，键为 '<=5ms' 形式"""
+    counts = {f"<={limit}ms": 0 for limit in HISTOGRAM_BUCKETS_MS}
+    counts[f">{HISTOGRAM_BUCKETS_MS[-1]}ms"] = 0
+    for value in values_ms:
+        for limit in HISTOGRAM_BUCKETS_MS:
+            if value <= limit:
+                counts[f"<={limit}ms"] += 1
+                break
+        else:
+            counts[f">{HISTOGRAM_BUCKETS_MS[-1]}ms"] += 1
+    return counts
+
+
+class CompressionProfile:
+    """一次处理中所有图片的压缩耗时记录"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+        self.started_at = time.time()
+
+    def add(self, path, ok, stats):
+        """记录一张图片的结果（stats 来自 compress_image_data，profiled=True）"""
+        with self._lock:
+            self.records.append({'path': path, 'ok': ok, **stats})
+
+    def summary(self):
+        """按步骤汇总：次数、总耗时、平均、p50、p95、最大值（毫秒）和直方图"""
+        with self._lock:
+            records = list(self.records)
+
+        stages = {}
+        for stage in STAGES:
+            values = sorted(r['stages'][stage] * 1000 for r in records if stage in r['stages'])
+            if not values:
+                continue
+            stages[stage] = {
+                'count': len(values),
+                'total_ms': round(sum(values), 1),
+                'mean_ms': round(sum(values) / len(values), 2),
+                'p50_ms': round(_percentile(values, 0.5), 2),
+                'p95_ms': round(_percentile(values, 0.95), 2),
+                'max_ms': round(values[-1], 2),
+                'histogram': _histogram(values),
+            }
+
+        return {
+            'files': len(records),
+            'failed': sum(1 for r in records if not r['ok']),
+            'passthrough': sum(1 for r in records if r.get('passthrough')),
+            'bytes_in': sum(r['bytes_in'] for r in records),
+            'bytes_out': sum(r['bytes_out'] for r in records),
+            'stages': stages,
+        }
+
+    def format_summary(self):
+        """格式化为中文摘要，按总耗时从高到低列出各步骤"""
+        summary = self.summary()
+        if not summary['files']:
+            return "没有压缩任何图片"
+
+        total_ms = sum(stats['total_ms'] for stats in summary['stages'].values()) or 1
+        lines = [f"压缩 {summary['files']} 张，其中直接复制 {summary['passthrough']} 张，"
+                 f"{summary['bytes_in'] / 1024 / 1024:.1f} MB → "
+                 f"{summary['bytes_out'] / 1024 / 1024:.1f} MB"]
+        ordered = sorted(summary['stages'].items(), key=lambda item: -item[1]['total_ms'])
+        for stage, stats in ordered:
+            lines.append(f"{STAGE_NAMES[stage]}: 占 {stats['total_ms'] / total_ms * 100:.0f}%，"
+                         f"平均 {stats['mean_ms']:.1f} ms，p95 {stats['p95_ms']:.1f} ms")
+        return "\n".join(lines)
+
+    def write_report(self, path=None):
+        """写入JSON报告（摘要 + 每张图片的记录），返回报告路径"""
+        if path is None:
+            stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started_at))
+            path = os.path.join(DEFAULT_REPORT_DIR, f"compress_profile_{stamp}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        with self._lock:
+            records = list(self.records)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(), 'files': records}, f,
+                      ensure_ascii=False, indent=2)
+        return path
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 批量队列
+一次处理多个第二层文件夹（或存放多个日期文件夹的上一层文件夹）：
+所有文件夹共用同一个执行器，处理当前文件夹时后台线程已经在扫描下一个文件夹
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import image_renamer_core as core
+from image_renamer_journal import (JOURNAL_DIR, BatchJournal, find_unfinished_journal,
+                                   journal_path_for, new_batch_id)
+from image_renamer_undo import UNDO_DIR, UndoLog
+
+
+def discover_roots(folder, cache=None, force_rescan=False):
+    """
+    找出要处理的第二层文件夹
+    folder 中有日期文件夹（年_月_日_城市_名称）时返回这些文件夹（按名称自然排序），
+    否则 folder 本身就是第二层文件夹
+    """
+    names = core.list_subfolders(folder, cache, force_rescan)
+    dated = sorted((name for name in names if core.extract_folder_info(name)),
+                   key=core.natural_sort_key)
+    if dated:
+        return [os.path.join(folder, name) for name in dated]
+    return [folder]
+
+
+class QueueProgress(namedtuple('QueueProgress', ['index', 'count', 'folder', 'files_done',
+                                                 'files_total', 'snapshot'])):
+    """
+    批量队列的整体进度：正在处理第 index 个（从0开始）文件夹，共 count 个；
+    files_done / files_total 为已扫描的文件夹累计的文件数，snapshot 为当前文件夹的进度
+    """
+
+    __slots__ = ()
+
+    @property
+    def percent(self):
+        """整体进度：每个文件夹占相同的份额"""
+        if not self.count:
+            return 100.0
+        return (self.index + self.snapshot.percent / 100) / self.count * 100
+
+    def format(self):
+        return (f"第 {self.index + 1}/{self.count} 个文件夹 {os.path.basename(self.folder)} | "
+                f"共 {self.files_done}/{self.files_total} 张 | {self.snapshot.format()}")
+
+
+def _scan_root(root, cache, force_rescan, preview_options, journal_dir, use_journal,
+               cancel_event):
+    """扫描一个文件夹（在后台线程中执行）；有未完成的批次时读取其日志，不重新扫描"""
+    path = find_unfinished_journal(root, journal_dir) if use_journal else None
+    if path is not None:
+        journal = BatchJournal.load(path)
+        return journal.items, [], journal
+    preview_data, warnings = core.build_preview(root, cache=cache, force_rescan=force_rescan,
+                                                cancel_event=cancel_event, **preview_options)
+    return preview_data, warnings, None
+
+
+def process_roots(roots, options, cache=None, force_rescan=False, preview_options=None,
+                  executor_mode='process', workers=None, progress_callback=None,
+                  root_callback=None, cancel_event=None, progress_interval=0.05,
+                  queue_size=None, profile=None, journal_dir=JOURNAL_DIR, undo_dir=UNDO_DIR,
+                  use_journal=True, memory_budget=None):
+    """
+    依次处理多个第二层文件夹
+    options 为 apply_preview 的处理选项（rename_enabled / compress_enabled / quality / encoder ...），
+    preview_options 为 build_preview 的参数（order / schemas / schema_name ...），
+    queue_size / memory_budget 与 apply_preview 相同，对每个文件夹分别生效
+    每个文件夹各有自己的批次日志和撤销记录；有未完成批次的文件夹按其日志继续处理
+    progress_callback(QueueProgress) 汇报整体进度，root_callback(index, result) 在每个文件夹处理完后调用
+    cancel_event 被设置后当前文件夹按 apply_preview 的方式停止，之后的文件夹不再处理
+    返回每个已处理文件夹的结果字典：folder / total / success / failed / errors / warnings / resumed，
+    扫描失败的文件夹只有 folder / error
+    """
+    preview_options = preview_options or {}
+    workers = max(1, int(workers or core.default_worker_count()))
+    results = []
+    files_done = 0
+    files_total = 0
+
+    executor = core.create_executor(executor_mode, workers)
+    scanner = ThreadPoolExecutor(max_workers=1)
+    pending = None
+
+    def scan(root):
+        return scanner.submit(_scan_root, root, cache, force_rescan, preview_options,
+                              journal_dir, use_journal, cancel_event)
+
+    try:
+        pending = scan(roots[0]) if roots else None
+        for index, root in enumerate(roots):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            try:
+                preview_data, warnings, journal = pending.result()
+            except core.OperationCancelled:
+                break
+            except Exception as e:
+                pending = scan(roots[index + 1]) if index + 1 < len(roots) else None
+                result = {'folder': root, 'error': f"扫描失败: {e}"}
+                results.append(result)
+                if root_callback:
+                    root_callback(index, result)
+                continue
+
+            # 处理当前文件夹时在后台扫描下一个
+            pending = scan(roots[index + 1]) if index + 1 < len(roots) else None
+
+            resumed = journal is not None
+            root_options = journal.options if resumed else dict(options)
+            if journal is None and use_journal and preview_data:
+                journal = BatchJournal.create(root, preview_data, root_options,
+                                              path=journal_path_for(root, journal_dir))
+            undo_log = None
+            if root_options['rename_enabled'] and preview_data:
+                batch_id = journal.batch_id if journal is not None else new_batch_id()
+                undo_log = UndoLog.open(root, batch_id, undo_dir)
+
+            files_total += len(preview_data)
+            done_before = files_done
+
+            def on_progress(snapshot, index=index, root=root, done_before=done_before,
+                            files_total=files_total):
+                if progress_callback:
+                    progress_callback(QueueProgress(index, len(roots), root,
+                                                    done_before + snapshot.done, files_total,
+                                                    snapshot))
+
+            try:
+                success_count, error_count, errors = core.apply_preview(
+                    preview_data, workers=workers, progress_callback=on_progress,
+                    cancel_event=cancel_event, progress_interval=progress_interval,
+                    profile=profile, queue_size=queue_size, memory_budget=memory_budget,
+                    journal=journal, undo_log=undo_log, executor=executor, **root_options)
+            finally:
+                if undo_log is not None:
+                    undo_log.close()
+
+            files_done += success_count + error_count
+            result = {'folder': root, 'total': len(preview_data), 'success': success_count,
+                      'failed': error_count, 'errors': errors, 'warnings': warnings,
+                      'resumed': resumed}
+            results.append(result)
+            if root_callback:
+                root_callback(index, result)
+    finally:
+        if cancel_event is not None and cancel_event.is_set() and pending is not None:
+            pending.cancel()
+        scanner.shutdown(wait=True)
+        executor.shutdown(wait=True)
+        if cache is not None:
+            cache.flush()
+
+    return results
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 重命名规则方案
+不同的检测模板（标准30张、45张、车队12张等）对应不同的重命名规则。
+规则方案从配置文件（JSON或YAML）读取，检查后编译为不可修改的结构，
+每批可以指定方案，也可以按车源文件夹名自动选择；每个文件夹应有的图片数量等于规则条数
+
+配置文件格式（JSON，YAML结构相同）:
+    {
+        "version": 1,
+        "default": "standard30",
+        "schemas": [
+            {"name": "fleet12", "description": "车队12张",
+             "folder_pattern": "车队", "rules": ["_1_左前45度.jpg", ...]}
+        ]
+    }
+"""
+
+import json
+import os
+import re
+from collections import namedtuple
+from types import MappingProxyType
+
+# 默认规则配置文件（不存在时只使用内置方案），依次查找
+RULES_PATHS = tuple(os.path.join(os.path.expanduser('~'), '.image_renamer', name)
+                    for name in ('rules.json', 'rules.yaml', 'rules.yml'))
+
+# 规则配置文件格式版本
+RULES_VERSION = 1
+
+
+class RuleSchema(namedtuple('RuleSchema', ['name', 'description', 'rules', 'folder_pattern'])):
+    """
+    一个规则方案：rules 为按图片顺序排列的新文件名后缀（车源号 + 后缀 = 新文件名），
+    folder_pattern 为自动选择时匹配车源文件夹名的正则表达式（编译后），没有时为None
+    """
+
+    __slots__ = ()
+
+    @property
+    def expected_count(self):
+        return len(self.rules)
+
+    def matches(self, folder_name):
+        return self.folder_pattern is not None and self.folder_pattern.search(folder_name) is not None
+
+
+class RuleSchemas:
+    """编译后的一组规则方案（不可修改），按名称查找或按文件夹名自动选择"""
+
+    __slots__ = ('_schemas', '_by_name', '_default')
+
+    def __init__(self, schemas, default):
+        self._schemas = tuple(schemas)
+        self._by_name = MappingProxyType({schema.name: schema for schema in self._schemas})
+        self._default = self._by_name[default]
+
+    @property
+    def default(self):
+        return self._default
+
+    @property
+    def names(self):
+        return tuple(self._by_name)
+
+    def get(self, name):
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError(f"未知的规则方案: {name}（可选: {', '.join(self._by_name)}）")
+
+    def select(self, folder_name):
+        """按车源文件夹名选择方案：第一个 folder_pattern 匹配的方案，都不匹配时使用默认方案"""
+        for schema in self._schemas:
+            if schema.matches(folder_name):
+                return schema
+        return self._default
+
+    def __iter__(self):
+        return iter(self._schemas)
+
+    def __len__(self):
+        return len(self._schemas)
+
+
+def _compile_schema(entry):
+    """检查并编译配置中的一个方案，格式错误时抛出 ValueError"""
+    if not isinstance(entry, dict):
+        raise ValueError("规则方案必须是对象")
+    name = entry.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("规则方案缺少名称（name）")
+
+    rules = entry.get('rules')
+    if not isinstance(rules, (list, tuple)) or not rules:
+        raise ValueError(f"规则方案 '{name}' 没有重命名规则（rules）")
+    seen = set()
+    for i, rule in enumerate(rules, 1):
+        if not isinstance(rule, str) or not rule.lower().endswith(('.jpg', '.jpeg')):
+            raise ValueError(f"规则方案 '{name}' 第{i}条规则应为以 .jpg 结尾的文件名后缀: {rule!r}")
+        if '/' in rule or '\\' in rule:
+            raise ValueError(f"规则方案 '{name}' 第{i}条规则不能包含路径分隔符: {rule}")
+        if rule in seen:
+            raise ValueError(f"规则方案 '{name}' 第{i}条规则重复: {rule}")
+        seen.add(rule)
+
+    pattern = entry.get('folder_pattern')
+    if pattern is not None:
+        try:
+            pattern = re.compile(pattern)
+        except (re.error, TypeError) as e:
+            raise ValueError(f"规则方案 '{name}' 的文件夹匹配规则无效: {e}")
+
+    return RuleSchema(name, str(entry.get('description') or name), tuple(rules), pattern)
+
+
+def compile_schemas(config, base=None):
+    """
+    检查配置并编译为 RuleSchemas，格式错误时抛出 ValueError
+    base 为内置方案（RuleSchemas），与配置中同名的方案被配置覆盖；
+    自动选择时先匹配配置中的方案，再匹配内置方案
+    """
+    if not isinstance(config, dict):
+        raise ValueError("规则配置必须是对象")
+    if config.get('version', RULES_VERSION) != RULES_VERSION:
+        raise ValueError(f"不支持的规则配置版本: {config.get('version')}")
+
+    schemas = [_compile_schema(entry) for entry in config.get('schemas') or []]
+    names = [schema.name for schema in schemas]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"规则方案名称重复: {', '.join(duplicated)}")
+    if base is not None:
+        schemas.extend(schema for schema in base if schema.name not in names)
+    if not schemas:
+        raise ValueError("规则配置中没有规则方案")
+
+    default = config.get('default')
+    if default is None:
+        default = base.default.name if base is not None else schemas[0].name
+    if default not in {schema.name for schema in schemas}:
+        raise ValueError(f"默认规则方案不存在: {default}")
+    return RuleSchemas(schemas, default)
+
+
+def _read_config(path):
+    """读取JSON或YAML规则配置（按扩展名区分）"""
+    with open(path, encoding='utf-8') as f:
+        if not path.lower().endswith(('.yaml', '.yml')):
+            try:
+                return json.load(f)
+            except ValueError as e:
+                raise ValueError(f"规则配置文件格式错误 {path}: {e}")
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("读取YAML规则配置需要安装 PyYAML（pip install pyyaml），或改用JSON格式")
+        try:
+            return yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise ValueError(f"规则配置文件格式错误 {path}: {e}")
+
+
+def load_rule_schemas(path, base=None):
+    """读取规则配置文件并编译，见 compile_schemas"""
+    return compile_schemas(_read_config(path), base)
+
+
+def load_default_rule_schemas(base, paths=RULES_PATHS):
+    """读取默认位置的规则配置文件，都不存在时只使用内置方案 base"""
+    for path in paths:
+        if os.path.exists(path):
+            print(f"读取规则配置: {path}")
+            return load_rule_schemas(path, base)
+    return base
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 撤销记录
+每个批次记录 原文件名 → 新文件名（压缩过的文件附带内容哈希），
+排序出错时可以一次把整个批次恢复为原文件名；
+压缩会改变图片内容，撤销只能恢复文件名，不能恢复原始画质
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from image_renamer_journal import folder_key, read_jsonl
+from image_renamer_planner import plan_renames, execute_renames
+
+# 默认撤销记录目录
+UNDO_DIR = os.path.join(os.path.expanduser('~'), '.image_renamer', 'undo')
+
+# 撤销记录格式版本
+UNDO_VERSION = 1
+
+
+def undo_log_path(folder, batch_id, undo_dir=UNDO_DIR):
+    """撤销记录文件路径：文件夹 + 批次编号，文件名按时间排序"""
+    return os.path.join(undo_dir, f"{folder_key(folder)}_{batch_id}.jsonl")
+
+
+def content_hash(content):
+    """文件内容的哈希，撤销前用来确认文件没有被修改过"""
+    return hashlib.sha1(content).hexdigest()
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class UndoLog:
+    """
+    一个批次的撤销记录（每行一个JSON记录，只追加）
+    第一行为批次信息，之后每个已重命名的文件一行，路径相对于第二层文件夹以减小体积
+    """
+
+    def __init__(self, path, header, entries, exists=True):
+        self.path = path
+        self.header = header
+        self.entries = entries
+        # 已记录的新文件名，继续中断的批次时逐个检查
+        self._names = {entry['n'] for entry in entries}
+        self._exists = exists
+        self._file = None
+
+    @classmethod
+    def open(cls, folder, batch_id, undo_dir=UNDO_DIR):
+        """
+        打开批次的撤销记录用于追加（继续中断的批次时沿用同一个记录）
+        新批次的记录文件在记录第一个文件时才创建，没有重命名任何文件（全部失败、立即取消）时
+        不留下空记录，不会挡住上一个批次的撤销
+        """
+        path = undo_log_path(folder, batch_id, undo_dir)
+        if os.path.exists(path):
+            return cls.load(path)
+        # 目录无法创建时在开始处理前报错（调用方放弃撤销记录），而不是处理到一半时
+        os.makedirs(undo_dir, exist_ok=True)
+        header = {'type': 'batch', 'version': UNDO_VERSION,
+                  'folder': os.path.abspath(folder), 'batch_id': batch_id,
+                  'created': time.time()}
+        return cls(path, header, [], exists=False)
+
+    @classmethod
+    def load(cls, path):
+        """读取撤销记录"""
+        header = None
+        entries = []
+        for record in read_jsonl(path):
+            if record.get('type') == 'batch':
+                header = record
+            else:
+                entries.append(record)
+        if header is None or header.get('version') != UNDO_VERSION:
+            raise ValueError(f"无法识别的撤销记录: {path}")
+        return cls(path, header, entries)
+
+    @property
+    def folder(self):
+        return self.header['folder']
+
+    def has(self, new_path):
+        """是否已经记录过该文件"""
+        return os.path.relpath(new_path, self.folder) in self._names
+
+    def _open_file(self):
+        if not self._exists:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(self.header, ensure_ascii=False) + '\n')
+            self._exists = True
+        return open(self.path, 'a', encoding='utf-8')
+
+    def add(self, original_path, new_path, sha1=None):
+        """记录一个已重命名的文件，sha1 为压缩后文件内容的哈希（只重命名时为None）"""
+        entry = {'o': os.path.relpath(original_path, self.folder),
+                 'n': os.path.relpath(new_path, self.folder)}
+        if sha1 is not None:
+            entry['h'] = sha1
+        self.entries.append(entry)
+        self._names.add(entry['n'])
+        if self._file is None:
+            self._file = self._open_file()
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+def list_undo_logs(folder, undo_dir=UNDO_DIR):
+    """该文件夹的所有撤销记录，最近的在前"""
+    prefix = folder_key(folder) + '_'
+    try:
+        names = [entry.name for entry in os.scandir(undo_dir)
+                 if entry.name.startswith(prefix) and entry.name.endswith('.jsonl')]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(undo_dir, name) for name in sorted(names, reverse=True)]
+
+
+def latest_undo_log(folder, undo_dir=UNDO_DIR):
+    """该文件夹最近一个批次的撤销记录，没有时返回None"""
+    logs = list_undo_logs(folder, undo_dir)
+    return logs[0] if logs else None
+
+
+def undo_batch(path, cancel_event=None, progress_callback=None):
+    """
+    撤销一个批次：把新文件名改回原文件名
+    按文件夹计算重命名计划后一次执行（见 image_renamer_planner），批次中互相占用的文件名也能恢复；
+    新文件不存在、原文件名已被占用或压缩后的文件内容被修改过的条目跳过并报告错误
+    全部撤销后删除记录；有失败的条目时记录中只保留这些条目，之后可以再次尝试
+    progress_callback(done, total) 在每个文件恢复后调用
+    返回 (success_count, error_count, errors)
+    """
+    log = UndoLog.load(path)
+    total = len(log.entries)
+    errors = []
+    folders = {}
+
+    for i, entry in enumerate(log.entries):
+        original_path = os.path.join(log.folder, entry['o'])
+        new_path = os.path.join(log.folder, entry['n'])
+        if 'h' in entry:
+            try:
+                modified = file_hash(new_path) != entry['h']
+            except OSError:
+                modified = False  # 文件不存在，由重命名计划报告
+            if modified:
+                errors.append(f"文件已被修改: {entry['n']}")
+                continue
+        folders.setdefault(os.path.dirname(new_path), []).append((i, new_path, original_path))
+
+    restored = set()
+
+    def on_step(i, src, dst, is_temp):
+        if not is_temp:
+            restored.add(i)
+            if progress_callback:
+                progress_callback(len(restored), total)
+
+    for folder, moves in folders.items():
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        try:
+            existing = {os.path.join(folder, name) for name in os.listdir(folder)}
+        except OSError as e:
+            errors.append(f"无法读取文件夹 {folder}: {e}")
+            continue
+        steps, conflicts = plan_renames(moves, existing)
+        errors.extend(conflicts.values())
+        _, failure = execute_renames(steps, on_step, cancel_event)
+        if failure is not None:
+            errors.append(f"恢复失败 {log.entries[failure[0]]['n']}: {failure[1]}")
+
+    remaining = [entry for i, entry in enumerate(log.entries) if i not in restored]
+    if remaining:
+        # 只保留未撤销的条目（先写临时文件再替换）
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(log.header, ensure_ascii=False) + '\n')
+            for entry in remaining:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, path)
+    else:
+        os.remove(path)
+
+    return len(restored), len(errors), errors
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片批量重命名工具 - 监视上传文件夹
+摄影师持续把车源文件夹（车源号_车辆名）上传到共享的第二层文件夹中。
+监视该文件夹，新的车源文件夹图片数量达到规则方案要求、并且在一段时间内不再变化后立即处理；
+Linux上用 inotify 及时发现变化，其他系统定时轮询
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import sys
+import time
+
+import image_renamer_core as core
+from image_renamer_journal import (JOURNAL_DIR, BatchJournal, find_unfinished_journal,
+                                   folder_key, journal_path_for, new_batch_id)
+from image_renamer_undo import UNDO_DIR, UndoLog
+
+# 已处理文件夹的记录目录（重启后不重复处理）
+WATCH_DIR = os.path.join(os.path.expanduser('~'), '.image_renamer', 'watch')
+
+# 文件夹内容（文件名、大小、修改时间）保持不变多少秒后才处理，避免处理还在上传中的文件夹
+SETTLE_SECONDS = 5.0
+
+# 轮询间隔秒数（没有 inotify 时）
+POLL_INTERVAL = 2.0
+
+# 使用 inotify 且没有等待中的文件夹时，最长等待多少秒后重新检查一次
+IDLE_INTERVAL = 60.0
+
+# inotify 事件：新建、写入完成、移入/移出、删除
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class PollingWaker:
+    """定时轮询：等待固定的间隔"""
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+
+    def add(self, path):
+        pass
+
+    def remove(self, path):
+        pass
+
+    def wait(self, timeout, stop_event=None):
+        timeout = min(timeout, self.poll_interval)
+        if stop_event is not None:
+            stop_event.wait(timeout)
+        else:
+            time.sleep(timeout)
+
+    def close(self):
+        pass
+
+
+class InotifyWaker:
+    """
+    Linux inotify（通过 ctypes 调用 libc，不需要额外安装）
+    不解析具体事件，只在被监视的文件夹有变化时提前结束等待，之后重新检查文件夹
+    """
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._watches = {}
+
+    def add(self, path):
+        if path in self._watches:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监视文件夹: {path}")
+        self._watches[path] = wd
+
+    def remove(self, path):
+        wd = self._watches.pop(path, None)
+        if wd is not None:
+            self._libc.inotify_rm_watch(self._fd, wd)  # 文件夹已删除时失败，忽略
+
+    def wait(self, timeout, stop_event=None):
+        # 每秒检查一次 stop_event，停止时不必等到超时
+        deadline = time.monotonic() + timeout
+        while stop_event is None or not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([self._fd], [], [], min(remaining, 1.0))
+            if readable:
+                try:
+                    while os.read(self._fd, 64 * 1024):
+                        pass
+                except BlockingIOError:
+                    pass
+                return
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_waker(poll_interval=POLL_INTERVAL, use_inotify=True):
+    """Linux上使用 inotify，不可用时（其他系统、inotify 数量已满）退回轮询"""
+    if use_inotify and sys.platform.startswith('linux'):
+        try:
+            return InotifyWaker()
+        except (OSError, AttributeError) as e:
+            print(f"inotify 不可用，改为每 {poll_interval} 秒轮询: {e}")
+    return PollingWaker(poll_interval)
+
+
+def watch_state_path(folder, watch_dir=WATCH_DIR):
+    return os.path.join(watch_dir, f"{folder_key(folder)}.json")
+
+
+def _list_car_folders(root):
+    """第二层文件夹中的子文件夹名（忽略隐藏文件夹）；每次检查都会调用，不输出调试信息"""
+    with os.scandir(root) as it:
+        return [entry.name for entry in it if not entry.name.startswith('.') and entry.is_dir()]
+
+
+def _folder_signature(path):
+    """文件夹中jpg图片的 (文件名, 大小, 修改时间) 列表，用于判断文件夹是否还在变化"""
+    signature = []
+    with os.scandir(path) as it:
+        for entry in it:
+            name = entry.name
+            if name.startswith('.') or not name.lower().endswith(('.jpg', '.jpeg')):
+                continue
+            try:
+                stat_result = entry.stat()
+            except OSError:
+                continue  # 上传中的文件可能刚被改名
+            signature.append((name, stat_result.st_size, stat_result.st_mtime_ns))
+    signature.sort()
+    return signature
+
+
+def _signature_key(signature):
+    """内容签名的摘要，保存在监视记录中"""
+    return hashlib.sha1(json.dumps(signature).encode('utf-8')).hexdigest()
+
+
+class DropFolderWatcher:
+    """
+    监视一个第二层文件夹中新上传的车源文件夹
+    poll() 检查文件夹，返回已经可以处理的车源文件夹名；process(name) 处理一个车源文件夹；
+    run() 循环执行两者直到 stop_event 被设置
+    已处理的文件夹记录在 watch_dir 中，重启后不会重复处理（压缩过的图片不能再压缩一次）；
+    没有可处理的图片或有图片处理失败的文件夹记为失败，等文件夹内容再次变化（人工处理后）才重新处理
+    """
+
+    def __init__(self, root, options, schemas=None, schema_name=None, order='name',
+                 settle_seconds=SETTLE_SECONDS, executor_mode='process', workers=None,
+                 journal_dir=JOURNAL_DIR, undo_dir=UNDO_DIR, watch_dir=WATCH_DIR,
+                 use_journal=True, queue_size=None, memory_budget=None, clock=time.monotonic):
+        self.root = root
+        self.options = options
+        self.schemas = schemas or core.BUILTIN_RULE_SCHEMAS
+        self.forced_schema = self.schemas.get(schema_name) if schema_name else None
+        self.order = order
+        self.settle_seconds = settle_seconds
+        self.workers = max(1, int(workers or core.default_worker_count()))
+        self.executor_mode = executor_mode
+        self.journal_dir = journal_dir
+        self.use_journal = use_journal
+        self.queue_size = queue_size
+        self.memory_budget = memory_budget
+        self.undo_dir = undo_dir
+        self.clock = clock
+        self.state_path = watch_state_path(root, watch_dir)
+        self.processed, self.failed = self._load_state()
+        # 等待中的文件夹：名称 -> (内容签名, 签名开始不变的时间)
+        self.pending = {}
+        self._reported = set()
+        self._executor = None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            return state['processed'], state.get('failed', {})
+        except FileNotFoundError:
+            return {}, {}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"读取监视记录失败，将重新开始记录: {e}")
+            return {}, {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'folder': os.path.abspath(self.root), 'processed': self.processed,
+                       'failed': self.failed}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def expected_count(self, name):
+        return (self.forced_schema or self.schemas.select(name)).expected_count
+
+    def poll(self):
+        """检查第二层文件夹，返回图片数量正确且内容已经稳定的车源文件夹名"""
+        now = self.clock()
+        ready = []
+        names = set()
+        for name in _list_car_folders(self.root):
+            if name in self.processed or not core.extract_number_from_folder_name(name):
+                continue
+            names.add(name)
+            try:
+                signature = _folder_signature(os.path.join(self.root, name))
+            except OSError:
+                continue  # 文件夹刚被移走或改名
+
+            # 处理失败的文件夹内容变化后才重新处理
+            failed = self.failed.get(name)
+            if failed is not None:
+                if failed['signature'] == _signature_key(signature):
+                    continue
+                print(f"文件夹 '{name}' 内容已变化，重新处理")
+                del self.failed[name]
+
+            previous = self.pending.get(name)
+            if previous is None or previous[0] != signature:
+                self.pending[name] = (signature, now)
+                continue
+
+            count, expected = len(signature), self.expected_count(name)
+            if count != expected:
+                if count > expected and name not in self._reported:
+                    print(f"文件夹 '{name}' 中有 {count} 张图片，超过{expected}张，等待人工处理")
+                    self._reported.add(name)
+                continue
+            if now - previous[1] >= self.settle_seconds:
+                ready.append(name)
+
+        # 消失的文件夹不再等待
+        for name in list(self.pending):
+            if name not in names:
+                del self.pending[name]
+        return ready
+
+    def next_timeout(self, idle=IDLE_INTERVAL):
+        """距离最早一个还在变化的文件夹稳定还有多少秒，没有时为 idle"""
+        now = self.clock()
+        # 已经稳定但图片数量不对的文件夹要等内容再变化，不计入
+        deadlines = [started + self.settle_seconds for _, started in self.pending.values()
+                     if started + self.settle_seconds > now]
+        if not deadlines:
+            return idle
+        return max(0.1, min(idle, min(deadlines) - now))
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = core.create_executor(self.executor_mode, self.workers)
+        return self._executor
+
+    def _apply(self, preview_data, options, journal, cancel_event):
+        undo_log = None
+        if options['rename_enabled']:
+            batch_id = journal.batch_id if journal is not None else new_batch_id()
+            undo_log = UndoLog.open(self.root, batch_id, self.undo_dir)
+        try:
+            return core.apply_preview(preview_data, workers=self.workers, cancel_event=cancel_event,
+                                      queue_size=self.queue_size,
+                                      memory_budget=self.memory_budget, journal=journal,
+                                      undo_log=undo_log, executor=self._get_executor(), **options)
+        finally:
+            if undo_log is not None:
+                undo_log.close()
+
+    def resume_unfinished(self, cancel_event=None):
+        """上次退出时有未完成的文件夹时先继续处理，返回结果（没有时为None）"""
+        path = find_unfinished_journal(self.root, self.journal_dir) if self.use_journal else None
+        if path is None:
+            return None
+        journal = BatchJournal.load(path)
+        success_count, error_count, errors = self._apply(journal.items, journal.options, journal,
+                                                         cancel_event)
+        names = sorted({data['folder'] for data in journal.items})
+        return self._record(names, len(journal.items), success_count, error_count, errors, [],
+                            cancel_event)
+
+    def process(self, name, cancel_event=None):
+        """
+        处理一个车源文件夹，返回结果字典 folder / total / success / failed / errors / warnings / status，
+        status 为 processed（全部成功）、failed（没有可处理的图片或有图片失败）或 cancelled
+        """
+        preview_data, warnings = core.build_preview(
+            self.root, subfolders=[name], schemas=self.schemas,
+            schema_name=self.forced_schema.name if self.forced_schema else None,
+            order=self.order, probe=True)
+        journal = None
+        if preview_data and self.use_journal:
+            journal = BatchJournal.create(self.root, preview_data, self.options,
+                                          path=journal_path_for(self.root, self.journal_dir))
+        success_count, error_count, errors = self._apply(preview_data, self.options, journal,
+                                                         cancel_event)
+        return self._record([name], len(preview_data), success_count, error_count, errors,
+                            warnings, cancel_event)
+
+    def _record(self, names, total, success_count, error_count, errors, warnings, cancel_event):
+        """
+        记录处理结果；全部成功时记为已处理，没有可处理的图片或有图片失败时记为失败（附带处理后的内容签名）
+        被取消时不记录，下次启动时按日志继续
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            status = 'cancelled'
+        else:
+            status = 'processed' if total and not error_count else 'failed'
+            for name in names:
+                record = {'time': time.time(), 'success': success_count, 'failed': error_count}
+                if status == 'processed':
+                    self.processed[name] = record
+                    self.failed.pop(name, None)
+                else:
+                    try:
+                        signature = _folder_signature(os.path.join(self.root, name))
+                    except OSError:
+                        signature = []
+                    record['signature'] = _signature_key(signature)
+                    self.failed[name] = record
+                    print(f"文件夹 '{name}' 处理失败（共 {total} 张，失败 {error_count} 张），"
+                          f"文件夹内容变化后重新处理")
+                self.pending.pop(name, None)
+            self._save_state()
+        return {'folder': names[0] if len(names) == 1 else names, 'total': total,
+                'success': success_count, 'failed': error_count, 'errors': errors,
+                'warnings': warnings, 'status': status}
+
+    def process_ready(self, cancel_event=None, on_result=None):
+        """检查一次并处理所有已经可以处理的车源文件夹，返回处理过的文件夹名"""
+        done = []
+        for name in self.poll():
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            print(f"开始处理文件夹: {name}")
+            result = self.process(name, cancel_event)
+            done.append(name)
+            if on_result:
+                on_result(result)
+        return done
+
+    def run(self, stop_event, on_result=None, waker=None):
+        """
+        监视并处理，直到 stop_event 被设置
+        on_result(result) 在每个车源文件夹处理完后调用
+        """
+        own_waker = waker is None
+        if own_waker:
+            waker = create_waker()
+        try:
+            waker.add(self.root)
+            result = self.resume_unfinished(stop_event)
+            if result is not None and on_result:
+                on_result(result)
+            while not stop_event.is_set():
+                for name in self.process_ready(stop_event, on_result):
+                    waker.remove(os.path.join(self.root, name))
+                # 新出现的车源文件夹也要监视其中的文件变化
+                for name in self.pending:
+                    try:
+                        waker.add(os.path.join(self.root, name))
+                    except OSError as e:
+                        print(f"监视文件夹失败 {name}: {e}")
+                waker.wait(self.next_timeout(), stop_event)
+        finally:
+            if own_waker:
+                waker.close()
+            self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
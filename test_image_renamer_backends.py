@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩放和编码引擎测试
+"""
+
+import io
+import json
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+import image_renamer_backends as backends
+import image_renamer_bench as bench
+import image_renamer_core as core
+
+
+def make_jpg_data(size=(640, 480)):
+    """生成带纹理的测试图片数据"""
+    texture = Image.effect_mandelbrot(size, (-2, -1.5, 1, 1.5), 64)
+    img = Image.merge('RGB', (texture, Image.linear_gradient('L').resize(size),
+                              texture.transpose(Image.ROTATE_180)))
+    output = io.BytesIO()
+    img.save(output, 'JPEG', quality=95)
+    return output.getvalue()
+
+
+def test_get_backend_checks_name_and_availability(monkeypatch):
+    """测试未知或未安装的引擎在开始处理前报错"""
+    assert backends.DEFAULT_BACKEND in backends.available_backends()
+    assert backends.get_backend().name == backends.DEFAULT_BACKEND
+    with pytest.raises(ValueError):
+        backends.get_backend('gpu')
+    with pytest.raises(ValueError):
+        core.apply_preview([], compress_enabled=True, backend='gpu')
+
+    monkeypatch.setattr(backends, 'pyvips', None)
+    assert 'vips' not in backends.available_backends()
+    with pytest.raises(ValueError):
+        backends.get_backend('vips')
+
+
+@pytest.mark.parametrize('name', list(backends.BACKENDS))
+def test_backends_match_pillow_output(name):
+    """测试各引擎输出的尺寸和模式相同，内容与默认引擎的差异在容差范围内"""
+    if name not in backends.available_backends():
+        pytest.skip(f"未安装处理引擎 {name}")
+    data = make_jpg_data()
+
+    ok, expected, _ = core.compress_image_data(data, target_size=(200, 200), passthrough=False)
+    assert ok
+    ok, output, stats = core.compress_image_data(data, target_size=(200, 200), passthrough=False,
+                                                 backend=name, profiled=True)
+    assert ok
+    assert stats['stages']['encode'] >= 0
+    with Image.open(io.BytesIO(output)) as new, Image.open(io.BytesIO(expected)) as old:
+        assert new.mode == old.mode == 'RGB'
+        assert new.size == old.size == (200, 200)
+        diff = ImageStat.Stat(ImageChops.difference(new, old)).mean
+        assert max(diff) < 4
+
+
+def test_bench_compares_backends_on_same_batch(tmp_path, monkeypatch, capsys):
+    """测试性能测试对每个引擎分别计时，结果以 阶段:引擎 区分"""
+    calls = []
+
+    class CountingBackend(backends.PillowBackend):
+        name = 'counting'
+
+        def encode(self, source, *args, **kwargs):
+            calls.append(source)
+            return super().encode(source, *args, **kwargs)
+
+    monkeypatch.setitem(backends.BACKENDS, 'counting', CountingBackend())
+    output = tmp_path / "bench.json"
+    assert bench.main(['--folders', '1', '--width', '96', '--height', '64',
+                       '--unique-images', '1', '--stages', 'compress',
+                       '--backends', 'pillow', 'counting', '--executor', 'serial',
+                       '--no-isolate',
+                       '--output', str(output)]) == 0
+
+    result = json.loads(output.read_text(encoding='utf-8'))
+    assert set(result['stages']) == {'compress:pillow', 'compress:counting'}
+    assert result['config']['backends'] == ['pillow', 'counting']
+    assert 'counting' in result['environment']['backends']
+    assert len(calls) == core.EXPECTED_IMAGE_COUNT
+    assert result['stages']['compress:counting']['files'] == core.EXPECTED_IMAGE_COUNT
+    assert 'compress:counting' in capsys.readouterr().out
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能测试脚本测试
+"""
+
+import json
+
+import pytest
+
+import image_renamer_bench as bench
+import image_renamer_core as core
+
+
+def test_benchmark_smoke(tmp_path, capsys):
+    """测试性能测试脚本能跑完所有阶段并保存JSON结果"""
+    output = tmp_path / "bench.json"
+    assert bench.main(['--folders', '1', '--width', '64', '--height', '48',
+                       '--executor', 'serial', '--output', str(output)]) == 0
+
+    result = json.loads(output.read_text(encoding='utf-8'))
+    assert list(result['stages']) == list(bench.STAGES)
+    assert result['stages']['compress_rename']['files'] == core.EXPECTED_IMAGE_COUNT
+    assert 'compress_rename' in capsys.readouterr().out
+
+
+def test_benchmark_compares_encoders(tmp_path, capsys):
+    """测试多个编码方案时压缩阶段分别计时并记录输出体积"""
+    output = tmp_path / "bench.json"
+    assert bench.main(['--folders', '1', '--width', '64', '--height', '48',
+                       '--executor', 'serial', '--stages', 'compress',
+                       '--encoders', 'fast', 'smallest',
+                       '--output', str(output)]) == 0
+
+    result = json.loads(output.read_text(encoding='utf-8'))
+    assert list(result['stages']) == ['compress:fast', 'compress:smallest']
+    assert all(stats['output_mb'] > 0 for stats in result['stages'].values())
+
+
+@pytest.mark.skipif(bench.resource is None, reason="没有 resource 模块，不统计内存峰值")
+def test_bench_runs_each_stage_in_own_process(tmp_path):
+    """测试每个阶段在单独的子进程中运行，分别记录内存峰值；不隔离时不记录"""
+    output = tmp_path / "bench.json"
+    assert bench.main(['--folders', '1', '--width', '96', '--height', '64',
+                       '--unique-images', '1', '--stages', 'scan', 'compress',
+                       '--executor', 'serial', '--output', str(output)]) == 0
+    result = json.loads(output.read_text(encoding='utf-8'))
+    assert result['config']['isolated']
+    assert all(stats['peak_rss_mb'] > 0 for stats in result['stages'].values())
+
+    assert bench.main(['--folders', '1', '--width', '96', '--height', '64',
+                       '--unique-images', '1', '--stages', 'scan', '--no-isolate',
+                       '--output', str(output)]) == 0
+    result = json.loads(output.read_text(encoding='utf-8'))
+    assert result['stages']['scan']['peak_rss_mb'] is None
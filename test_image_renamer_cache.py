@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描缓存测试
+"""
+
+import os
+import time
+
+import image_renamer_core as core
+from image_renamer_cache import ScanCache
+
+
+def age_folder(path, seconds=60):
+    """把文件夹修改时间调到过去，使其可以写入缓存"""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def make_car_folder(root, count=3):
+    batch = root / "2025_11_06_芜湖_张三01"
+    car = batch / "1234567_宝马X5"
+    car.mkdir(parents=True)
+    for i in range(1, count + 1):
+        (car / f"{i}.jpg").write_bytes(b"")
+    age_folder(car)
+    age_folder(batch)
+    return batch, car
+
+
+def test_unchanged_folders_are_served_from_cache(tmp_path, monkeypatch):
+    """测试文件夹未变化时不再列目录"""
+    batch, car = make_car_folder(tmp_path)
+    cache = ScanCache(str(tmp_path / "cache.sqlite"))
+    assert core.get_jpg_files_in_folder(str(car), cache) == ['1.jpg', '2.jpg', '3.jpg']
+    assert core.list_subfolders(str(batch), cache) == ['1234567_宝马X5']
+    cache.close()
+
+    listed = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda p: listed.append(p) or real_scandir(p))
+
+    cache = ScanCache(str(tmp_path / "cache.sqlite"))
+    assert core.get_jpg_files_in_folder(str(car), cache) == ['1.jpg', '2.jpg', '3.jpg']
+    assert core.list_subfolders(str(batch), cache) == ['1234567_宝马X5']
+    assert listed == []
+    assert cache.hits == 2
+
+    # 强制重新扫描
+    core.get_jpg_files_in_folder(str(car), cache, force_rescan=True)
+    assert listed == [str(car)]
+
+
+def test_changed_folder_is_rescanned(tmp_path):
+    """测试文件夹修改时间变化后缓存失效"""
+    _, car = make_car_folder(tmp_path)
+    cache = ScanCache(':memory:')
+    assert len(core.get_jpg_files_in_folder(str(car), cache)) == 3
+
+    (car / "4.jpg").write_bytes(b"")
+    age_folder(car, seconds=30)
+    assert len(core.get_jpg_files_in_folder(str(car), cache)) == 4
+    assert cache.misses == 2
+
+
+def test_recently_modified_folder_is_not_cached(tmp_path):
+    """测试刚修改过的文件夹不写入缓存"""
+    car = tmp_path / "1234567_宝马X5"
+    car.mkdir()
+    cache = ScanCache(':memory:')
+    core.get_jpg_files_in_folder(str(car), cache)
+    core.get_jpg_files_in_folder(str(car), cache)
+    assert cache.hits == 0
+
+
+def test_file_passes_stat_each_image_once(tmp_path, monkeypatch, make_car):
+    """测试检查图片、指纹和拍摄时间共用每张图片的文件信息，且都使用缓存"""
+    from image_renamer_dedupe import fingerprint_images
+    from image_renamer_exif import read_capture_times
+    from image_renamer_probe import probe_images
+
+    car = make_car(tmp_path / "1234567_宝马X5", 3)
+    past = time.time() - 60
+    for path in car.iterdir():
+        os.utime(path, (past, past))
+    images = [core.ImageEntry(path.name, str(path)) for path in sorted(car.iterdir())]
+    cache = ScanCache(':memory:')
+
+    stats = []
+    real_stat = os.stat
+    monkeypatch.setattr(os, 'stat', lambda p, *args, **kwargs: stats.append(p) or
+                        real_stat(p, *args, **kwargs))
+    passes = (probe_images, read_capture_times, fingerprint_images)
+    first = [compute(images, cache) for compute in passes]
+    assert sorted(stats) == sorted(image.path for image in images)
+
+    misses = cache.misses
+    assert [compute(images, cache) for compute in passes] == first
+    assert cache.misses == misses
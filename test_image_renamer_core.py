@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+核心处理模块测试
+"""
+
+import io
+import json
+import os
+import threading
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+import image_renamer_core as core
+
+
+def test_create_executor_modes():
+    """测试执行器创建"""
+    assert isinstance(core.create_executor('serial', 4), core.SerialExecutor)
+    # 只有一个工作者时退化为串行
+    assert isinstance(core.create_executor('process', 1), core.SerialExecutor)
+    with pytest.raises(ValueError):
+        core.create_executor('gpu', 2)
+
+
+@pytest.mark.parametrize('mode', core.EXECUTOR_MODES)
+def test_compress_image_in_executor(tmp_path, mode, make_jpg):
+    """测试各执行方式下压缩结果一致"""
+    sources = [str(make_jpg(tmp_path / f"{i}.jpg", size=(400 + i * 10, 300))) for i in range(4)]
+    executor = core.create_executor(mode, 2)
+    try:
+        futures = [executor.submit(core.compress_image, src, src + '.out.jpg',
+                                   target_size=(200, 200), quality=80)
+                   for src in sources]
+        assert all(f.result() for f in futures)
+    finally:
+        executor.shutdown()
+
+    for src in sources:
+        with Image.open(src + '.out.jpg') as img:
+            assert img.size == (200, 200)
+            assert img.mode == 'RGB'
+
+
+def test_compress_image_failure(tmp_path):
+    """测试损坏图片压缩失败时返回False"""
+    bad = tmp_path / "bad.jpg"
+    bad.write_bytes(b"not a jpeg")
+    assert not core.compress_image(str(bad), str(tmp_path / "out.jpg"))
+    assert not os.path.exists(tmp_path / "out.jpg")
+
+
+def test_compress_image_draft_matches_full_decode(tmp_path):
+    """测试快速解码与完整解码的输出差异在容差范围内"""
+    src = tmp_path / "big.jpg"
+    gradient = Image.linear_gradient('L').resize((1600, 1200))
+    Image.merge('RGB', (gradient, gradient.transpose(Image.ROTATE_180), gradient)) \
+        .save(src, 'JPEG', quality=95)
+
+    assert core.compress_image(str(src), str(tmp_path / "draft.jpg"), target_size=(300, 300))
+    assert core.compress_image(str(src), str(tmp_path / "full.jpg"), target_size=(300, 300),
+                               draft=False)
+
+    with Image.open(tmp_path / "draft.jpg") as fast, Image.open(tmp_path / "full.jpg") as full:
+        assert fast.size == full.size == (300, 300)
+        diff = ImageStat.Stat(ImageChops.difference(fast, full)).mean
+        assert max(diff) < 2
+
+
+def legacy_encode(data, target_size):
+    """之前的处理方式：先转RGB，再缩放，再粘贴到新建的白色背景上"""
+    with Image.open(io.BytesIO(data)) as img:
+        new_size = core.fit_size(img.size, target_size)
+        if new_size != img.size:
+            img.draft('RGB', new_size)
+        img.load()
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        resized = img.resize(new_size, Image.LANCZOS)
+        background = Image.new('RGB', target_size, (255, 255, 255))
+        background.paste(resized, ((target_size[0] - new_size[0]) // 2,
+                                   (target_size[1] - new_size[1]) // 2))
+        output = io.BytesIO()
+        background.save(output, 'JPEG', **core.encoder_options())
+        return output.getvalue()
+
+
+@pytest.mark.parametrize('mode,size,target_size', [
+    ('RGB', (640, 480), (200, 200)),   # 需要补白边
+    ('RGB', (600, 600), (200, 200)),   # 缩小后正好等于目标尺寸
+    ('RGB', (150, 200), (200, 200)),   # 不放大，只补白边
+    ('RGB', (200, 200), (200, 200)),   # 不缩放也不补白边，直接重新编码
+    ('L', (640, 480), (200, 200)),     # 灰度图缩小后再转RGB
+])
+def test_compress_image_matches_legacy_pixel_path(mode, size, target_size):
+    """测试先缩小再转RGB、按需补白边的输出与之前先转换、新建背景粘贴的输出完全相同"""
+    texture = Image.effect_mandelbrot(size, (-2, -1.5, 1, 1.5), 64)
+    if mode == 'RGB':
+        texture = Image.merge('RGB', (texture, Image.linear_gradient('L').resize(size),
+                                      texture.transpose(Image.ROTATE_180)))
+    source = io.BytesIO()
+    texture.save(source, 'JPEG', quality=95)
+    data = source.getvalue()
+
+    ok, output, _ = core.compress_image_data(data, target_size=target_size, passthrough=False)
+    assert ok
+    assert output == legacy_encode(data, target_size)
+
+
+def test_compress_image_cmyk_within_tolerance():
+    """测试CMYK图片缩小后再转RGB，与先转换再缩小的差异在容差范围内"""
+    gradient = Image.linear_gradient('L').resize((640, 480))
+    texture = Image.effect_mandelbrot((640, 480), (-2, -1.5, 1, 1.5), 64)
+    cmyk = Image.merge('CMYK', (gradient, texture, gradient.transpose(Image.ROTATE_180),
+                                Image.new('L', (640, 480), 20)))
+    source = io.BytesIO()
+    cmyk.save(source, 'JPEG', quality=95)
+    data = source.getvalue()
+
+    ok, output, _ = core.compress_image_data(data, target_size=(200, 200), passthrough=False)
+    assert ok
+    with Image.open(io.BytesIO(output)) as new, \
+            Image.open(io.BytesIO(legacy_encode(data, (200, 200)))) as old:
+        assert new.mode == old.mode == 'RGB'
+        assert new.size == old.size == (200, 200)
+        diff = ImageStat.Stat(ImageChops.difference(new, old)).mean
+        assert max(diff) < 1
+
+
+def test_compress_image_passthrough_keeps_compliant_file(tmp_path, make_jpg):
+    """测试已符合尺寸、质量不高于本次编码质量的图片原样保留，不重新编码"""
+    src = str(make_jpg(tmp_path / "ok.jpg", size=(200, 200), quality=75))
+    assert core.compress_image(src, str(tmp_path / "out.jpg"), target_size=(200, 200))
+    assert (tmp_path / "out.jpg").read_bytes() == (tmp_path / "ok.jpg").read_bytes()
+
+    # 原图质量高于要求的质量时重新编码
+    assert core.compress_image(src, str(tmp_path / "low.jpg"), target_size=(200, 200), quality=60)
+    assert (tmp_path / "low.jpg").read_bytes() != (tmp_path / "ok.jpg").read_bytes()
+
+    # 关闭后重新编码
+    assert core.compress_image(src, str(tmp_path / "re.jpg"), target_size=(200, 200),
+                               passthrough=False)
+    assert (tmp_path / "re.jpg").read_bytes() != (tmp_path / "ok.jpg").read_bytes()
+
+
+def test_estimate_jpeg_quality(tmp_path, make_jpg):
+    """测试按量化表估计JPEG质量"""
+    for quality in (60, 75, 85, 95):
+        with Image.open(make_jpg(tmp_path / f"{quality}.jpg", quality=quality)) as img:
+            assert core.estimate_jpeg_quality(img) == quality
+    Image.new('RGB', (8, 8)).save(tmp_path / "a.png")
+    with Image.open(tmp_path / "a.png") as img:
+        assert core.estimate_jpeg_quality(img) is None
+
+
+@pytest.mark.parametrize('rename_enabled', [True, False])
+def test_apply_preview_passthrough(tmp_path, make_jpg, rename_enabled):
+    """测试处理时沿用已符合要求的原文件（重命名或保持不动），质量更高的原图仍然重新编码"""
+    car = tmp_path / "1234567_宝马X5"
+    car.mkdir()
+    ok = make_jpg(car / "1.jpg", size=(200, 200), quality=60).read_bytes()
+    high = make_jpg(car / "2.jpg", size=(200, 200), quality=95).read_bytes()
+    preview_data = [{'folder': car.name, 'original': f"{i}.jpg", 'new': f"new{i}.jpg",
+                     'original_path': str(car / f"{i}.jpg"), 'new_path': str(car / f"new{i}.jpg")}
+                    for i in (1, 2)]
+
+    result = core.apply_preview(preview_data, rename_enabled=rename_enabled, compress_enabled=True,
+                                target_size=(200, 200), encoder='smallest', quality=60)
+
+    assert result == (2, 0, [])
+    prefix = "new" if rename_enabled else ""
+    assert sorted(os.listdir(car)) == [f"{prefix}1.jpg", f"{prefix}2.jpg"]
+    assert (car / f"{prefix}1.jpg").read_bytes() == ok
+    assert len((car / f"{prefix}2.jpg").read_bytes()) < len(high)
+
+
+def test_can_passthrough_header_checks(tmp_path, make_jpg):
+    """测试只有尺寸、格式、方向和体积都符合时才跳过重新编码"""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    Image.new('RGB', (200, 200)).save(tmp_path / "rotated.jpg", exif=exif)
+    Image.new('RGB', (200, 200)).save(tmp_path / "progressive.jpg", progressive=True)
+    make_jpg(tmp_path / "small.jpg", size=(100, 200))
+    make_jpg(tmp_path / "ok.jpg", size=(200, 200), quality=75)
+
+    def check(name, max_bytes_per_pixel=0.5, quality=None):
+        path = tmp_path / name
+        with Image.open(path) as img:
+            return core.can_passthrough(img, path.stat().st_size, (200, 200), max_bytes_per_pixel,
+                                        quality)
+
+    assert check("ok.jpg")
+    assert check("ok.jpg", quality=75)
+    assert not check("ok.jpg", quality=60)
+    assert not check("ok.jpg", max_bytes_per_pixel=0.001)
+    assert not check("rotated.jpg")
+    assert not check("progressive.jpg")
+    assert not check("small.jpg")
+
+
+def test_compress_image_encoder_profiles(tmp_path):
+    """测试编码方案：渐进式、体积依次减小、质量覆盖和未知方案"""
+    # 带噪点的图片，纯色图片太小，看不出各方案的体积差别
+    src = str(tmp_path / "src.jpg")
+    channels = (Image.effect_noise((400, 300), 40), Image.linear_gradient('L').resize((400, 300)),
+                Image.new('L', (400, 300), 80))
+    Image.merge('RGB', channels).save(src, 'JPEG', quality=95)
+    for encoder in core.ENCODER_PROFILES:
+        assert core.compress_image(src, str(tmp_path / f"{encoder}.jpg"), target_size=(200, 200),
+                                   encoder=encoder)
+
+    with Image.open(tmp_path / "smallest.jpg") as img:
+        assert img.info.get('progressive') or img.info.get('progression')
+    with Image.open(tmp_path / "fast.jpg") as img:
+        assert not (img.info.get('progressive') or img.info.get('progression'))
+    sizes = [os.path.getsize(tmp_path / f"{encoder}.jpg")
+             for encoder in ('fast', 'balanced', 'smallest')]
+    assert sizes == sorted(sizes, reverse=True)
+
+    assert core.encoder_options('fast', quality=70)['quality'] == 70
+    assert core.encoder_options('smallest')['quality'] == core.ENCODER_PROFILES['smallest']['quality']
+    with pytest.raises(ValueError):
+        core.apply_preview([], compress_enabled=True, encoder='unknown')
+
+
+def test_build_preview(tmp_path, make_batch):
+    """测试预览生成：自然排序、车源号提取和数量检查"""
+    batch = make_batch(tmp_path, folders=('1234567_宝马X5',))
+    (batch / "无车源号").mkdir()
+    (batch / "7654321_奔驰C200").mkdir()
+
+    preview_data, warnings = core.build_preview(str(batch))
+
+    assert len(preview_data) == core.EXPECTED_IMAGE_COUNT
+    assert preview_data[1]['original'] == '2.jpg'
+    assert preview_data[9]['original'] == '10.jpg'
+    assert preview_data[0]['new'] == '1234567' + core.RENAME_RULES[0]
+    assert len(warnings) == 2
+
+
+def test_walk_car_folders_single_scandir_pass(tmp_path, monkeypatch, make_batch):
+    """测试遍历时每个文件夹只扫描一次，且不对每一项调用isdir"""
+    batch = make_batch(tmp_path, folders=('1234567_宝马X5', '7654321_奔驰C200'), count=3)
+    (batch / "说明.txt").write_text("x")
+    (batch / "1234567_宝马X5" / "子目录.jpg").mkdir()
+
+    scanned = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda p: scanned.append(p) or real_scandir(p))
+    monkeypatch.setattr(os.path, 'isdir', lambda p: pytest.fail("不应调用isdir"))
+
+    car_folders = sorted(core.walk_car_folders(str(batch)), key=lambda c: c.name)
+
+    assert len(scanned) == 3
+    assert [c.name for c in car_folders] == ['1234567_宝马X5', '7654321_奔驰C200']
+    assert [image.name for image in car_folders[0].images] == ['1.jpg', '2.jpg', '3.jpg']
+    assert car_folders[0].images[0].stat().st_size > 0
+
+
+def test_apply_preview_rename_and_compress(tmp_path, make_batch):
+    """测试压缩并重命名"""
+    batch = make_batch(tmp_path)
+    preview_data, _ = core.build_preview(str(batch))
+    progress = []
+
+    result = core.apply_preview(preview_data, rename_enabled=True, compress_enabled=True,
+                                target_size=(32, 32), executor_mode='thread', workers=2,
+                                progress_callback=lambda snap: progress.append(snap.done),
+                                progress_interval=0)
+
+    assert result == (core.EXPECTED_IMAGE_COUNT, 0, [])
+    assert progress == list(range(1, core.EXPECTED_IMAGE_COUNT + 1))
+    for data in preview_data:
+        assert not os.path.exists(data['original_path'])
+        with Image.open(data['new_path']) as img:
+            assert img.size == (32, 32)
+
+
+def test_apply_preview_pipeline_bounds_prefetch(tmp_path, monkeypatch, make_batch):
+    """测试流水线预读的图片数量不超过队列长度，只压缩时覆盖原文件"""
+    batch = make_batch(tmp_path)
+    preview_data, _ = core.build_preview(str(batch))
+    read = []
+    ahead = []
+    new_job = core._new_job
+    compress_image_data = core.compress_image_data
+
+    def counting_new_job(index, data):
+        read.append(data['original'])
+        return new_job(index, data)
+
+    def checking_compress(*args, **kwargs):
+        ahead.append(len(read) - len(ahead))
+        return compress_image_data(*args, **kwargs)
+
+    monkeypatch.setattr(core, '_new_job', counting_new_job)
+    monkeypatch.setattr(core, 'compress_image_data', checking_compress)
+
+    result = core.apply_preview(preview_data, rename_enabled=False, compress_enabled=True,
+                                target_size=(32, 32), executor_mode='serial', queue_size=2)
+
+    assert result == (core.EXPECTED_IMAGE_COUNT, 0, [])
+    # 队列中2张 + 读取线程等待放入的1张 + 正在压缩的1张
+    assert max(ahead) <= 4
+    for data in preview_data:
+        assert not os.path.exists(data['original_path'] + '.tmp')
+        with Image.open(data['original_path']) as img:
+            assert img.size == (32, 32)
+
+
+def test_estimate_compress_memory_from_header(tmp_path, make_jpg):
+    """测试只根据文件头估计内存峰值：JPEG按draft缩小后的尺寸计算，可沿用的图片只计算文件本身"""
+    path = str(make_jpg(tmp_path / "big.jpg", size=(2400, 1600)))
+    size = os.path.getsize(path)
+    assert core.draft_size((2400, 1600), (600, 400)) == (600, 400)
+    assert core.draft_size((2400, 1600), (700, 466)) == (1200, 800)
+
+    with Image.open(path) as img:
+        drafted = core.estimate_compress_memory(img, size, target_size=(600, 600))
+        full = core.estimate_compress_memory(img, size, target_size=(600, 600), draft=False)
+    # 解码到600×400，峰值为缩放结果600×400 + 白色背景600×600（每像素4字节）
+    assert drafted == size + 600 * 400 * 4 + 600 * 600 * 4
+    # 完整解码时峰值为原图 + 缩放结果
+    assert full == size + 2400 * 1600 * 4 + 600 * 400 * 4
+
+    compliant = str(make_jpg(tmp_path / "ok.jpg", size=(64, 64)))
+    with open(compliant, 'rb') as f:
+        data = f.read()
+    assert core.estimate_data_memory(data, target_size=(64, 64)) == len(data)
+    assert core.estimate_data_memory(b'not an image') == len(b'not an image')
+
+
+def test_apply_preview_memory_budget_limits_in_flight(tmp_path, monkeypatch, make_batch):
+    """测试内存预算限制同时压缩的图片：单张超过预算的图片等其他图片完成后单独处理"""
+    batch = make_batch(tmp_path, count=6)
+    preview_data, _ = core.build_preview(str(batch), expected_count=6)
+    compress_image_data = core.compress_image_data
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def tracking_compress(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        try:
+            return compress_image_data(*args, **kwargs)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    # 每张图片估计2MB，超过1MB的预算
+    monkeypatch.setattr(core, 'estimate_data_memory', lambda data, **kwargs: 2 * 1024 * 1024)
+    monkeypatch.setattr(core, 'compress_image_data', tracking_compress)
+
+    result = core.apply_preview(preview_data, rename_enabled=False, compress_enabled=True,
+                                target_size=(32, 32), executor_mode='thread', workers=4,
+                                memory_budget=1)
+
+    assert result == (6, 0, [])
+    assert peak[0] == 1
+    for data in preview_data:
+        with Image.open(data['original_path']) as img:
+            assert img.size == (32, 32)
+
+
+def test_build_preview_streams_and_cancels(tmp_path, make_batch):
+    """测试预览逐个文件夹回调，并可在扫描中途取消"""
+    batch = make_batch(tmp_path, folders=('1_a', '2_b', '3_c'), count=2)
+    cancel_event = threading.Event()
+    seen = []
+
+    def on_folder(done, total, folder, items):
+        seen.append((done, total))
+        if done == 2:
+            cancel_event.set()
+
+    with pytest.raises(core.OperationCancelled):
+        core.build_preview(str(batch), expected_count=2, folder_callback=on_folder,
+                           cancel_event=cancel_event)
+    assert seen == [(1, 3), (2, 3)]
+
+
+@pytest.mark.parametrize('mode', ['serial', 'thread'])
+def test_apply_preview_cancel_leaves_no_partial_files(tmp_path, mode, make_batch):
+    """测试取消处理后每个文件要么已完成、要么保持原样"""
+    batch = make_batch(tmp_path)
+    preview_data, _ = core.build_preview(str(batch))
+    cancel_event = threading.Event()
+
+    def on_progress(snapshot):
+        if snapshot.done == 5:
+            cancel_event.set()
+
+    success, failed, errors = core.apply_preview(
+        preview_data, compress_enabled=True, target_size=(32, 32), executor_mode=mode,
+        workers=2, progress_callback=on_progress, cancel_event=cancel_event,
+        progress_interval=0)
+
+    assert failed == 0 and errors == []
+    assert success >= 5
+    if mode == 'serial':
+        # 串行模式下未开始的任务一定会被取消
+        assert success == 5
+    for data in preview_data:
+        assert os.path.exists(data['original_path']) != os.path.exists(data['new_path'])
+
+
+def test_progress_reporter_coalesces_updates():
+    """测试进度汇报合并高频更新，并计算吞吐量和剩余时间"""
+    now = [0.0]
+    snapshots = []
+    reporter = core.ProgressReporter(100, snapshots.append, min_interval=0.05,
+                                     clock=lambda: now[0])
+    for _ in range(100):
+        now[0] += 0.001
+        reporter.update(nbytes=1024 * 1024)
+    reporter.finish()
+
+    # 第一次、每50毫秒一次、最后一次
+    assert [snap.done for snap in snapshots] == [1, 51, 100]
+    last = snapshots[-1]
+    assert last.files_per_sec == pytest.approx(1000)
+    assert last.mb_per_sec == pytest.approx(1000)
+    assert snapshots[1].eta == pytest.approx(0.049)
+    assert last.format().startswith("100/100 | 1000.0 张/秒 | 1000.0 MB/秒")
+
+    # 只重命名时不统计字节数，不显示 MB/秒
+    renamed = core.ProgressSnapshot(10, 20, 0, 1.0)
+    assert renamed.format() == "10/20 | 10.0 张/秒 | 剩余 00:01"
+
+
+def test_cli_preview_outputs_json(tmp_path, capsys, make_batch):
+    """测试命令行预览只向stdout输出JSON"""
+    import image_renamer_cli
+
+    batch = make_batch(tmp_path)
+    # 测试图片都相同，不检查重复
+    assert image_renamer_cli.main(['preview', str(batch), '--no-cache', '--no-dedupe']) == 0
+
+    result = json.loads(capsys.readouterr().out)
+    assert result['total'] == core.EXPECTED_IMAGE_COUNT
+    assert result['warnings'] == []
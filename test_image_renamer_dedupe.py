@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复图片检查测试
+"""
+
+import os
+import shutil
+import time
+
+from PIL import Image, ImageDraw, ImageEnhance
+
+import image_renamer_core as core
+import image_renamer_dedupe
+from image_renamer_cache import ScanCache
+from image_renamer_dedupe import fingerprint_images, find_duplicates
+
+
+def make_scene(path, box, quality=90, brightness=1.0):
+    """渐变背景上画一个矩形，模拟同一角度拍摄的照片"""
+    img = Image.linear_gradient('L').resize((480, 320)).convert('RGB')
+    ImageDraw.Draw(img).rectangle(box, fill=(200, 40, 40))
+    if brightness != 1.0:
+        img = ImageEnhance.Brightness(img).enhance(brightness)
+    img.save(path, 'JPEG', quality=quality)
+    return path
+
+
+def test_find_exact_and_near_duplicates(tmp_path):
+    """测试完全相同的文件、重新压缩/轻微变亮的连拍，以及不同角度的照片不算重复"""
+    make_scene(tmp_path / "1.jpg", (60, 60, 200, 200))
+    make_scene(tmp_path / "2.jpg", (280, 100, 440, 300))
+    shutil.copy(tmp_path / "1.jpg", tmp_path / "3.jpg")
+    make_scene(tmp_path / "4.jpg", (60, 60, 200, 200), quality=60, brightness=1.05)
+
+    images = [core.ImageEntry(f"{i}.jpg", str(tmp_path / f"{i}.jpg")) for i in range(1, 5)]
+    duplicates = find_duplicates(fingerprint_images(images))
+
+    assert set(duplicates) == {2, 3}
+    assert duplicates[2] == (0, True, 0)
+    assert duplicates[3][:2] == (0, False)
+
+
+def test_fingerprint_images_uses_cache(tmp_path, monkeypatch):
+    """测试未修改的文件再次预览时直接使用缓存"""
+    path = make_scene(tmp_path / "a.jpg", (60, 60, 200, 200))
+    past = time.time() - 60
+    os.utime(path, (past, past))
+    images = [core.ImageEntry("a.jpg", str(path))]
+    cache = ScanCache(':memory:')
+
+    first = fingerprint_images(images, cache)
+    monkeypatch.setattr('image_renamer_dedupe.fingerprint_image', lambda p: 1 / 0)
+    assert fingerprint_images(images, cache) == first
+
+
+def test_only_same_size_files_are_hashed(tmp_path, monkeypatch):
+    """测试只对大小相同的图片计算文件内容哈希"""
+    make_scene(tmp_path / "1.jpg", (60, 60, 200, 200))
+    make_scene(tmp_path / "2.jpg", (280, 100, 440, 300))
+    shutil.copy(tmp_path / "1.jpg", tmp_path / "3.jpg")
+    images = [core.ImageEntry(f"{i}.jpg", str(tmp_path / f"{i}.jpg")) for i in range(1, 4)]
+
+    hashed = []
+    real_sha1 = image_renamer_dedupe.content_sha1
+    monkeypatch.setattr(image_renamer_dedupe, 'content_sha1',
+                        lambda path: hashed.append(os.path.basename(path)) or real_sha1(path))
+    fingerprints = fingerprint_images(images)
+
+    assert sorted(hashed) == ["1.jpg", "3.jpg"]
+    assert fingerprints[1]['sha1'] is None
+    assert find_duplicates(fingerprints) == {2: (0, True, 0)}
+
+
+def test_build_preview_reports_extra_duplicate_shot(tmp_path):
+    """测试图片数量因连拍多出一张时，警告中指出重复的图片"""
+    car = tmp_path / "1234567_宝马X5"
+    car.mkdir()
+    make_scene(car / "1.jpg", (60, 60, 200, 200))
+    make_scene(car / "2.jpg", (60, 60, 200, 200), quality=70)
+    make_scene(car / "3.jpg", (280, 100, 440, 300))
+
+    preview_data, warnings = core.build_preview(str(tmp_path), expected_count=2, dedupe=True)
+
+    assert preview_data == []
+    assert warnings[-1] == "文件夹 '1234567_宝马X5' 中的 '2.jpg' 与 1.jpg 疑似重复"
+
+    preview_data, warnings = core.build_preview(str(tmp_path), expected_count=3, dedupe=True)
+    assert [d.get('duplicate', {}).get('of') for d in preview_data] == [None, '1.jpg', None]
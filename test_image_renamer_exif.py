@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拍摄时间读取测试
+"""
+
+import os
+import struct
+import time
+
+from PIL import Image
+
+import image_renamer_core as core
+from image_renamer_cache import ScanCache
+from image_renamer_exif import parse_capture_time, read_capture_time, read_capture_times
+
+
+def make_exif(taken=None, subsec=None):
+    """相机型号和（可选的）拍摄时间、亚秒"""
+    exif = Image.Exif()
+    exif[0x010F] = "Canon"
+    if taken is not None:
+        exif_ifd = exif.get_ifd(0x8769)
+        exif_ifd[0x9003] = taken
+        if subsec is not None:
+            exif_ifd[0x9291] = subsec
+    return exif
+
+
+def big_endian_tiff(taken):
+    """手工构造大端字节序（MM）的EXIF数据：IFD0 只有指向Exif IFD的指针"""
+    value = taken.encode('ascii') + b'\x00'
+    ifd0 = struct.pack('>H', 1) + struct.pack('>HHII', 0x8769, 4, 1, 26) + struct.pack('>I', 0)
+    exif_ifd = (struct.pack('>H', 1) + struct.pack('>HHII', 0x9003, 2, len(value), 44)
+                + struct.pack('>I', 0))
+    return b'MM' + struct.pack('>HI', 42, 8) + ifd0 + exif_ifd + value
+
+
+def test_read_capture_time(tmp_path, make_jpg):
+    """测试读取拍摄时间和亚秒，两种字节序、没有EXIF和非JPEG文件"""
+    path = make_jpg(tmp_path / "a.jpg", exif=make_exif("2025:11:06 10:00:01", "25"))
+    info = read_capture_time(path)
+    assert info == {'time': "2025:11:06 10:00:01", 'subsec': "25", 'error': None}
+
+    assert parse_capture_time(big_endian_tiff("2025:11:06 09:59:59")) == \
+        ("2025:11:06 09:59:59", '')
+
+    assert read_capture_time(make_jpg(tmp_path / "b.jpg", exif=make_exif()))['time'] is None
+    path = make_jpg(tmp_path / "c.jpg", exif=make_exif("0000:00:00 00:00:00"))
+    assert read_capture_time(path)['time'] is None
+
+    (tmp_path / "text.jpg").write_text("hello")
+    assert read_capture_time(tmp_path / "text.jpg")['error'] == "不是JPEG文件"
+
+
+def test_read_capture_times_uses_cache(tmp_path, monkeypatch, make_jpg):
+    """测试未修改的文件再次预览时直接使用缓存"""
+    path = make_jpg(tmp_path / "a.jpg", exif=make_exif("2025:11:06 10:00:01"))
+    past = time.time() - 60
+    os.utime(path, (past, past))
+    images = [core.ImageEntry("a.jpg", str(path))]
+    cache = ScanCache(':memory:')
+
+    first = read_capture_times(images, cache)
+    monkeypatch.setattr('image_renamer_exif.read_capture_time', lambda p: 1 / 0)
+    assert read_capture_times(images, cache) == first
+
+
+def test_build_preview_orders_by_capture_time(tmp_path, make_jpg):
+    """测试按拍摄时间排序：同一秒按亚秒排序，没有拍摄时间的排在最后"""
+    car = tmp_path / "1234567_宝马X5"
+    car.mkdir()
+    make_jpg(car / "1.jpg", exif=make_exif("2025:11:06 10:00:05"))
+    make_jpg(car / "2.jpg", exif=make_exif())
+    make_jpg(car / "3.jpg", exif=make_exif("2025:11:06 10:00:01", "5"))
+    make_jpg(car / "10.jpg", exif=make_exif("2025:11:06 10:00:01", "25"))
+
+    preview_data, warnings = core.build_preview(str(tmp_path), expected_count=4, order='exif')
+
+    assert [d['original'] for d in preview_data] == ["10.jpg", "3.jpg", "1.jpg", "2.jpg"]
+    assert warnings == ["文件夹 '1234567_宝马X5' 中有 1 张图片没有拍摄时间，按文件名排在最后"]
+
+    preview_data, _ = core.build_preview(str(tmp_path), expected_count=4)
+    assert [d['original'] for d in preview_data] == ["1.jpg", "2.jpg", "3.jpg", "10.jpg"]
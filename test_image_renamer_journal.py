@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+处理日志测试
+"""
+
+import os
+import threading
+
+from PIL import Image
+
+import image_renamer_core as core
+from image_renamer_journal import (BatchJournal, STATE_DONE, STATE_STAGED,
+                                   find_unfinished_journal, journal_path_for)
+
+
+def compressed_bytes(path):
+    ok, content, _ = core.compress_image_data(open(path, 'rb').read(), target_size=(32, 32))
+    assert ok
+    return content
+
+
+def test_journal_removed_after_complete_batch(tmp_path, make_batch):
+    """测试批次处理完后删除日志"""
+    batch = make_batch(tmp_path)
+    preview_data, _ = core.build_preview(str(batch))
+    options = {'rename_enabled': True, 'compress_enabled': True, 'target_size': (32, 32)}
+    journal = BatchJournal.create(str(batch), preview_data, options,
+                                  path=str(tmp_path / "journal.jsonl"))
+
+    assert core.apply_preview(preview_data, journal=journal, **options) == (
+        core.EXPECTED_IMAGE_COUNT, 0, [])
+    assert not os.path.exists(journal.path)
+
+
+def test_resume_after_crash(tmp_path, make_batch):
+    """测试模拟崩溃后继续处理：已完成的跳过，写完临时文件的补完替换，不完整的临时文件重新处理"""
+    batch = make_batch(tmp_path)
+    preview_data, _ = core.build_preview(str(batch))
+    options = {'rename_enabled': True, 'compress_enabled': True, 'target_size': (32, 32)}
+    path = str(tmp_path / "journal.jsonl")
+    journal = BatchJournal.create(str(batch), preview_data, options, path=path)
+
+    # 第1张已完成
+    done = preview_data[0]
+    with open(done['new_path'], 'wb') as f:
+        f.write(compressed_bytes(done['original_path']))
+    os.remove(done['original_path'])
+    journal.record(0, STATE_DONE)
+    done_mtime = os.stat(done['new_path']).st_mtime_ns
+
+    # 第2张临时文件已写完，替换前崩溃
+    staged = preview_data[1]
+    with open(staged['new_path'] + '.tmp', 'wb') as f:
+        f.write(compressed_bytes(staged['original_path']))
+    journal.record(1, STATE_STAGED, sync=True)
+
+    # 第3张临时文件只写了一半
+    with open(preview_data[2]['new_path'] + '.tmp', 'wb') as f:
+        f.write(b'\xff\xd8partial')
+    journal.close()
+
+    resumed = BatchJournal.load(path)
+    assert resumed.resumed and resumed.items == preview_data
+    assert resumed.options['target_size'] == (32, 32)
+
+    result = core.apply_preview(resumed.items, journal=resumed, **resumed.options)
+
+    assert result == (core.EXPECTED_IMAGE_COUNT, 0, [])
+    assert os.stat(done['new_path']).st_mtime_ns == done_mtime
+    for data in preview_data:
+        assert not os.path.exists(data['original_path'])
+        assert not os.path.exists(data['new_path'] + '.tmp')
+        with Image.open(data['new_path']) as img:
+            assert img.size == (32, 32)
+    assert not os.path.exists(path)
+
+
+def test_resume_in_place_does_not_compress_twice(tmp_path, make_batch):
+    """测试只压缩时替换后、记录完成前崩溃，继续处理不会重复压缩"""
+    batch = make_batch(tmp_path)
+    preview_data, _ = core.build_preview(str(batch))
+    options = {'rename_enabled': False, 'compress_enabled': True, 'target_size': (32, 32)}
+    path = str(tmp_path / "journal.jsonl")
+    journal = BatchJournal.create(str(batch), preview_data, options, path=path)
+
+    first = preview_data[0]['original_path']
+    content = compressed_bytes(first)
+    journal.record(0, STATE_STAGED, sync=True)
+    with open(first, 'wb') as f:
+        f.write(content)
+    journal.close()
+
+    resumed = BatchJournal.load(path)
+    assert core.apply_preview(resumed.items, journal=resumed, **resumed.options) == (
+        core.EXPECTED_IMAGE_COUNT, 0, [])
+    assert open(first, 'rb').read() == content
+
+
+def test_cancel_keeps_journal_for_resume(tmp_path, make_batch):
+    """测试取消后保留日志，可以继续处理剩余文件"""
+    batch = make_batch(tmp_path)
+    preview_data, _ = core.build_preview(str(batch))
+    options = {'rename_enabled': True, 'compress_enabled': False}
+    journal_dir = str(tmp_path / "journals")
+    path = journal_path_for(str(batch), journal_dir)
+    journal = BatchJournal.create(str(batch), preview_data, options, path=path)
+    cancel_event = threading.Event()
+
+    def on_progress(snapshot):
+        if snapshot.done == 5:
+            cancel_event.set()
+
+    success, _, _ = core.apply_preview(preview_data, journal=journal, cancel_event=cancel_event,
+                                       progress_callback=on_progress, progress_interval=0,
+                                       **options)
+    assert success == 5
+    assert find_unfinished_journal(str(batch), journal_dir) == path
+
+    resumed = BatchJournal.load(path)
+    assert resumed.counts()['pending'] == core.EXPECTED_IMAGE_COUNT - 5
+    assert core.apply_preview(resumed.items, journal=resumed, **resumed.options) == (
+        core.EXPECTED_IMAGE_COUNT, 0, [])
+    assert all(os.path.exists(data['new_path']) for data in preview_data)
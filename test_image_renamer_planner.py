@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重命名计划测试
+"""
+
+import os
+
+import pytest
+
+import image_renamer_core as core
+from image_renamer_journal import BatchJournal
+from image_renamer_planner import RENAME_TEMP_SUFFIX, execute_renames, plan_renames
+from image_renamer_undo import UndoLog, latest_undo_log, undo_batch
+
+
+def write_files(folder, names):
+    for name in names:
+        (folder / name).write_text(name, encoding='utf-8')
+    return {str(folder / name) for name in names}
+
+
+def test_plan_swap_uses_temp_name(tmp_path):
+    """测试两个文件互换名称时先移到临时名称"""
+    existing = write_files(tmp_path, ["a.jpg", "b.jpg"])
+    a, b = str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")
+
+    steps, conflicts = plan_renames([(0, a, b), (1, b, a)], existing)
+
+    assert conflicts == {}
+    assert len(steps) == 3 and steps[0][3]
+    completed, failure = execute_renames(steps)
+    assert completed == {0, 1} and failure is None
+    assert (tmp_path / "a.jpg").read_text(encoding='utf-8') == "b.jpg"
+    assert (tmp_path / "b.jpg").read_text(encoding='utf-8') == "a.jpg"
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "b.jpg"]
+
+
+def test_plan_reports_conflicts(tmp_path):
+    """测试目标被不参与重命名的文件占用、目标重复和原文件不存在"""
+    existing = write_files(tmp_path, ["a.jpg", "b.jpg", "keep.jpg", "c.jpg"])
+
+    def path(name):
+        return str(tmp_path / name)
+
+    steps, conflicts = plan_renames([
+        (0, path("a.jpg"), path("keep.jpg")),   # 目标已存在
+        (1, path("b.jpg"), path("a.jpg")),      # a 冲突保持不动，b 也冲突
+        (2, path("c.jpg"), path("d.jpg")),
+        (3, path("x.jpg"), path("e.jpg")),      # 原文件不存在
+        (4, path("keep.jpg"), path("keep.jpg")),
+    ], existing)
+
+    assert set(conflicts) == {0, 1, 3}
+    assert steps == [(2, path("c.jpg"), path("d.jpg"), False)]
+
+
+def test_apply_rename_permutation_and_undo(tmp_path):
+    """测试新旧文件名重叠（调整顺序后再次处理）时一次完成，并能整批撤销"""
+    car = tmp_path / "2025_11_06_芜湖_张三01" / "1234567_英菲尼迪G37"
+    car.mkdir(parents=True)
+    names = [f"1234567{rule}" for rule in core.RENAME_RULES[:6]]
+    write_files(car, names)
+    # 0↔1 互换，2→3→4→2 成环，5 不变
+    order = [1, 0, 3, 4, 2, 5]
+    preview_data = [{'folder': car.name, 'original': names[i], 'new': names[order[i]],
+                     'original_path': str(car / names[i]), 'new_path': str(car / names[order[i]])}
+                    for i in range(len(names))]
+
+    undo_dir = str(tmp_path / "undo")
+    with UndoLog.open(str(car.parent), "20251106_100000_000000", undo_dir) as undo_log:
+        result = core.apply_preview(preview_data, undo_log=undo_log)
+
+    assert result == (len(names), 0, [])
+    for i, name in enumerate(names):
+        assert (car / names[order[i]]).read_text(encoding='utf-8') == name
+    assert sorted(os.listdir(car)) == sorted(names)
+
+    assert undo_batch(latest_undo_log(str(car.parent), undo_dir)) == (len(names) - 1, 0, [])
+    for name in names:
+        assert (car / name).read_text(encoding='utf-8') == name
+
+
+def test_resume_finds_numbered_temp_name(tmp_path, monkeypatch):
+    """测试默认临时名称被占用时改用带序号的名称，中途崩溃后继续处理能按日志找回文件"""
+    car = tmp_path / "2025_11_06_芜湖_张三01" / "1234567_英菲尼迪G37"
+    car.mkdir(parents=True)
+    names = [f"1234567{rule}" for rule in core.RENAME_RULES[:2]]
+    write_files(car, names)
+    # 不属于本批次的文件占用了默认临时名称
+    stray = car / (names[0] + RENAME_TEMP_SUFFIX)
+    stray.write_text("stray", encoding='utf-8')
+    preview_data = [{'folder': car.name, 'original': names[i], 'new': names[1 - i],
+                     'original_path': str(car / names[i]), 'new_path': str(car / names[1 - i])}
+                    for i in range(2)]
+    options = {'rename_enabled': True, 'compress_enabled': False}
+    path = str(tmp_path / "journal.jsonl")
+    journal = BatchJournal.create(str(car.parent), preview_data, options, path=path)
+
+    def crash_after_first_step(steps, on_step=None, cancel_event=None):
+        execute_renames(steps[:1], on_step, cancel_event)
+        raise RuntimeError("模拟崩溃")
+
+    monkeypatch.setattr(core, 'execute_renames', crash_after_first_step)
+    with pytest.raises(RuntimeError):
+        core.apply_preview(preview_data, journal=journal, **options)
+    assert (car / (names[0] + RENAME_TEMP_SUFFIX + "1")).exists()
+    monkeypatch.undo()
+
+    resumed = BatchJournal.load(path)
+    assert core.apply_preview(resumed.items, journal=resumed, **resumed.options) == (2, 0, [])
+    assert (car / names[0]).read_text(encoding='utf-8') == names[1]
+    assert (car / names[1]).read_text(encoding='utf-8') == names[0]
+    assert stray.read_text(encoding='utf-8') == "stray"
+    assert sorted(os.listdir(car)) == sorted(names + [stray.name])
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize('renamed', [core.EXPECTED_IMAGE_COUNT, 10])
+def test_rerun_keeps_renamed_files_in_place(tmp_path, make_batch, renamed):
+    """测试再次处理已全部或部分重命名的文件夹时，已命名的图片保持不变，其余图片使用剩下的规则"""
+    batch = make_batch(tmp_path)
+    car = batch / "1234567_英菲尼迪G37"
+    expected = {f"1234567{rule}": (car / f"{i}.jpg").read_bytes()
+                for i, rule in enumerate(core.RENAME_RULES, 1)}
+
+    preview_data, _ = core.build_preview(str(batch))
+    assert core.apply_preview(preview_data[:renamed]) == (renamed, 0, [])
+
+    # 自然排序会把新文件名排在 "11.jpg" 等原文件名之后，不能按排序结果重新分配
+    preview_data, warnings = core.build_preview(str(batch))
+    assert warnings == []
+    assert [data['new'] for data in preview_data] == list(expected)
+    assert core.apply_preview(preview_data) == (core.EXPECTED_IMAGE_COUNT, 0, [])
+
+    assert sorted(os.listdir(car)) == sorted(expected)
+    for name, content in expected.items():
+        assert (car / name).read_bytes() == content
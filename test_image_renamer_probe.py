@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片检查测试
+"""
+
+import os
+import time
+
+from PIL import Image
+
+import image_renamer_core as core
+from image_renamer_cache import ScanCache
+from image_renamer_probe import probe_image, probe_images, describe_probe
+
+
+def test_probe_image_reads_header(tmp_path, make_jpg):
+    """测试读取尺寸、模式和EXIF方向"""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    info = probe_image(make_jpg(tmp_path / "a.jpg", size=(120, 80), exif=exif))
+    assert (info['width'], info['height'], info['mode']) == (120, 80, 'RGB')
+    assert info['orientation'] == 6
+    assert not info['truncated'] and info['error'] is None
+    assert describe_probe(info) == ("120×80", "EXIF方向6")
+
+
+def test_probe_image_detects_truncated_and_invalid(tmp_path, make_jpg):
+    """测试发现不完整和非JPEG文件"""
+    data = make_jpg(tmp_path / "full.jpg").read_bytes()
+    (tmp_path / "cut.jpg").write_bytes(data[:len(data) // 2])
+    (tmp_path / "text.jpg").write_text("hello")
+
+    assert probe_image(tmp_path / "cut.jpg")['truncated']
+    assert probe_image(tmp_path / "text.jpg")['error'] == "不是JPEG文件"
+
+
+def test_probe_images_uses_cache(tmp_path, monkeypatch, make_jpg):
+    """测试未修改的文件第二次检查直接使用缓存"""
+    path = make_jpg(tmp_path / "a.jpg")
+    past = time.time() - 60
+    os.utime(path, (past, past))
+    images = [core.ImageEntry("a.jpg", str(path))]
+    cache = ScanCache(':memory:')
+
+    first = probe_images(images, cache)
+    monkeypatch.setattr('image_renamer_probe.probe_image', lambda p: 1 / 0)
+    assert probe_images(images, cache) == first
+
+
+def test_build_preview_reports_broken_images(tmp_path):
+    """测试预览时损坏的图片记入警告"""
+    car = tmp_path / "1234567_宝马X5"
+    car.mkdir()
+    for i in range(1, 4):
+        Image.effect_noise((400, 300), 50).convert('RGB').save(car / f"{i}.jpg")
+    data = (car / "2.jpg").read_bytes()
+    (car / "2.jpg").write_bytes(data[:len(data) // 2])
+
+    preview_data, warnings = core.build_preview(str(tmp_path), expected_count=3, probe=True)
+
+    assert [d['probe']['truncated'] for d in preview_data] == [False, True, False]
+    assert warnings == ["文件夹 '1234567_宝马X5' 中的 '2.jpg' 文件不完整（缺少结束标记）"]
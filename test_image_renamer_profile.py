@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压缩耗时统计测试
+"""
+
+import json
+
+import image_renamer_core as core
+from image_renamer_profile import CompressionProfile
+
+
+def test_compress_image_data_profiled_records_stages(tmp_path, make_jpg):
+    """测试记录每个步骤的耗时和文件大小"""
+    data = make_jpg(tmp_path / "a.jpg", size=(400, 300)).read_bytes()
+    ok, content, stats = core.compress_image_data(data, target_size=(64, 64), profiled=True)
+
+    assert ok and content
+    assert set(stats['stages']) == {'open', 'decode', 'convert', 'resize', 'paste', 'encode'}
+    assert all(seconds >= 0 for seconds in stats['stages'].values())
+    assert stats['bytes_in'] > 0 and stats['bytes_out'] > 0
+    assert not stats['passthrough']
+
+
+def test_apply_preview_with_profile_writes_report(tmp_path, make_batch):
+    """测试处理时汇总耗时并写入JSON报告"""
+    preview_data, _ = core.build_preview(str(make_batch(tmp_path)))
+
+    profile = CompressionProfile()
+    result = core.apply_preview(preview_data, compress_enabled=True, target_size=(32, 32),
+                                executor_mode='thread', workers=2, profile=profile)
+    assert result == (core.EXPECTED_IMAGE_COUNT, 0, [])
+
+    summary = profile.summary()
+    assert summary['files'] == core.EXPECTED_IMAGE_COUNT and summary['failed'] == 0
+    encode = summary['stages']['encode']
+    assert encode['count'] == core.EXPECTED_IMAGE_COUNT
+    assert sum(encode['histogram'].values()) == core.EXPECTED_IMAGE_COUNT
+    assert encode['p50_ms'] <= encode['p95_ms'] <= encode['max_ms']
+    assert "编码保存" in profile.format_summary()
+
+    report_path = profile.write_report(str(tmp_path / "reports" / "profile.json"))
+    with open(report_path, encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['summary'] == summary
+    assert len(report['files']) == core.EXPECTED_IMAGE_COUNT
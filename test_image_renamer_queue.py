@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量队列测试
+"""
+
+import json
+import threading
+
+import image_renamer_core as core
+from image_renamer_queue import discover_roots, process_roots
+
+
+def test_discover_roots(tmp_path, make_batch):
+    """测试上一层文件夹返回其中的日期文件夹，第二层文件夹返回自身"""
+    make_batch(tmp_path, "2025_11_10_芜湖_张三01")
+    make_batch(tmp_path, "2025_11_9_芜湖_张三01")
+    (tmp_path / "说明").mkdir()
+
+    roots = discover_roots(str(tmp_path))
+    assert [r.split('/')[-1] for r in roots] == ["2025_11_9_芜湖_张三01", "2025_11_10_芜湖_张三01"]
+    assert discover_roots(roots[0]) == [roots[0]]
+
+
+def test_process_roots_overlaps_scan_and_shares_executor(tmp_path, monkeypatch, make_batch):
+    """测试处理当前文件夹时已在扫描下一个，所有文件夹共用一个执行器"""
+    roots = [str(make_batch(tmp_path, f"2025_11_0{i}_芜湖_张三01")) for i in (1, 2)]
+    scanning = {root: threading.Event() for root in roots}
+    created = []
+
+    real_build_preview = core.build_preview
+    real_apply_preview = core.apply_preview
+    real_create_executor = core.create_executor
+
+    def build_preview(folder, **kwargs):
+        scanning[folder].set()
+        return real_build_preview(folder, **kwargs)
+
+    def apply_preview(preview_data, **kwargs):
+        if preview_data[0]['original_path'].startswith(roots[0]):
+            # 第一个文件夹处理完之前，第二个文件夹已经开始扫描
+            assert scanning[roots[1]].wait(5)
+        return real_apply_preview(preview_data, **kwargs)
+
+    monkeypatch.setattr(core, 'build_preview', build_preview)
+    monkeypatch.setattr(core, 'apply_preview', apply_preview)
+    monkeypatch.setattr(core, 'create_executor',
+                        lambda *args: created.append(args) or real_create_executor(*args))
+
+    progress = []
+    results = process_roots(roots, {'rename_enabled': True, 'compress_enabled': True,
+                                    'target_size': (32, 32)},
+                            executor_mode='thread', workers=2, progress_interval=0,
+                            progress_callback=progress.append,
+                            journal_dir=str(tmp_path / "journals"),
+                            undo_dir=str(tmp_path / "undo"))
+
+    assert [(r['success'], r['failed']) for r in results] == [(core.EXPECTED_IMAGE_COUNT, 0)] * 2
+    assert created == [('thread', 2)]
+    assert progress[-1].files_done == progress[-1].files_total == 2 * core.EXPECTED_IMAGE_COUNT
+    assert progress[-1].percent == 100
+
+
+def test_cli_queue(tmp_path, capsys, make_batch):
+    """测试命令行批量处理上一层文件夹中的所有日期文件夹"""
+    import image_renamer_cli
+
+    make_batch(tmp_path / "incoming", "2025_11_01_芜湖_张三01")
+    make_batch(tmp_path / "incoming", "2025_11_02_芜湖_张三01", count=3)
+    dirs = ['--journal-dir', str(tmp_path / "journals"), '--undo-dir', str(tmp_path / "undo")]
+
+    assert image_renamer_cli.main(['queue', str(tmp_path / "incoming"), '--no-cache',
+                                   '--executor', 'serial'] + dirs) == 0
+
+    result = json.loads(capsys.readouterr().out)
+    assert result['success'] == core.EXPECTED_IMAGE_COUNT
+    assert [len(r['warnings']) for r in result['folders']] == [0, 1]
+    assert result['not_processed'] == []
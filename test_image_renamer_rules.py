@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重命名规则方案测试
+"""
+
+import json
+
+import pytest
+
+import image_renamer_core as core
+from image_renamer_rules import compile_schemas, load_rule_schemas
+
+FLEET = {'name': 'fleet3', 'description': '车队3张', 'folder_pattern': '车队',
+         'rules': ["_1_左前45度.jpg", "_2_正后.jpg", "_3_仪表盘.jpg"]}
+
+
+def test_compile_schemas_validation():
+    """测试规则配置检查：规则重复、不是jpg、正则无效、默认方案不存在、名称重复"""
+    bad_configs = [
+        {'schemas': [{'name': 'a', 'rules': ["_1.jpg", "_1.jpg"]}]},
+        {'schemas': [{'name': 'a', 'rules': ["_1.png"]}]},
+        {'schemas': [{'name': 'a', 'rules': ["sub/_1.jpg"]}]},
+        {'schemas': [{'name': 'a', 'rules': ["_1.jpg"], 'folder_pattern': '('}]},
+        {'schemas': [{'name': 'a', 'rules': ["_1.jpg"]}], 'default': 'b'},
+        {'schemas': [{'name': 'a', 'rules': ["_1.jpg"]}, {'name': 'a', 'rules': ["_2.jpg"]}]},
+        {'version': 2, 'schemas': [{'name': 'a', 'rules': ["_1.jpg"]}]},
+    ]
+    for config in bad_configs:
+        with pytest.raises(ValueError):
+            compile_schemas(config)
+
+
+def test_schemas_select_and_override(tmp_path):
+    """测试按文件夹名自动选择、同名方案覆盖内置方案，以及编译结果不可修改"""
+    path = tmp_path / "rules.yaml"
+    path.write_text("schemas:\n"
+                    "  - name: fleet3\n"
+                    "    folder_pattern: 车队\n"
+                    "    rules: [_1_左前45度.jpg, _2_正后.jpg, _3_仪表盘.jpg]\n",
+                    encoding='utf-8')
+    schemas = load_rule_schemas(str(path), core.BUILTIN_RULE_SCHEMAS)
+
+    assert schemas.names == ('fleet3', core.DEFAULT_RULE_SCHEMA)
+    assert schemas.select("1234567_车队_大众朗逸").name == 'fleet3'
+    assert schemas.select("1234567_宝马X5").expected_count == core.EXPECTED_IMAGE_COUNT
+    with pytest.raises(AttributeError):
+        schemas.default = None
+    with pytest.raises(TypeError):
+        schemas.get('fleet3').rules[0] = "_x.jpg"
+
+    override = compile_schemas({'schemas': [{'name': core.DEFAULT_RULE_SCHEMA,
+                                             'rules': ["_a.jpg", "_b.jpg"]}]},
+                               core.BUILTIN_RULE_SCHEMAS)
+    assert len(override) == 1 and override.default.expected_count == 2
+
+
+def test_build_preview_uses_schema_per_folder(tmp_path, make_car):
+    """测试每个文件夹按名称选择方案，应有的图片数量来自方案"""
+    batch = tmp_path / "2025_11_06_芜湖_张三01"
+    make_car(batch / "1234567_车队_大众朗逸", 3)
+    make_car(batch / "7654321_宝马X5", 3)
+    schemas = compile_schemas({'schemas': [FLEET]}, core.BUILTIN_RULE_SCHEMAS)
+
+    preview_data, warnings = core.build_preview(str(batch), schemas=schemas)
+
+    assert [d['new'] for d in preview_data] == ["1234567" + rule for rule in FLEET['rules']]
+    assert {d['schema'] for d in preview_data} == {'fleet3'}
+    assert warnings == ["文件夹 '7654321_宝马X5' 中有 3 张图片，不是30张"]
+
+    # 指定方案时所有文件夹都使用该方案
+    preview_data, warnings = core.build_preview(str(batch), schemas=schemas, schema_name='fleet3')
+    assert len(preview_data) == 6 and warnings == []
+
+
+def test_cli_preview_with_rules_file(tmp_path, capsys, make_car):
+    """测试命令行 --rules 读取JSON规则配置"""
+    import image_renamer_cli
+
+    batch = tmp_path / "2025_11_06_芜湖_张三01"
+    make_car(batch / "1234567_车队_大众朗逸", 3)
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps({'schemas': [FLEET]}, ensure_ascii=False), encoding='utf-8')
+
+    assert image_renamer_cli.main(['scan', str(batch), '--no-cache', '--rules', str(rules)]) == 0
+    assert json.loads(capsys.readouterr().out)['subfolders'][0]['ok']
+
+    assert image_renamer_cli.main(['preview', str(batch), '--no-cache', '--rules', str(rules),
+                                   '--schema', 'missing']) == 2
+    assert "未知的规则方案" in json.loads(capsys.readouterr().out)['error']
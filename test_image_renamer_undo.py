@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+撤销记录测试
+"""
+
+import json
+import os
+
+import image_renamer_core as core
+from image_renamer_undo import UndoLog, latest_undo_log, undo_batch
+
+
+def test_undo_rename_batch(tmp_path, make_batch):
+    """测试撤销只重命名的批次，全部恢复后删除记录"""
+    batch = make_batch(tmp_path)
+    undo_dir = str(tmp_path / "undo")
+    preview_data, _ = core.build_preview(str(batch))
+    before = {data['original_path']: open(data['original_path'], 'rb').read()
+              for data in preview_data}
+
+    with UndoLog.open(str(batch), "20251106_100000_000000", undo_dir) as undo_log:
+        assert core.apply_preview(preview_data, undo_log=undo_log) == (
+            core.EXPECTED_IMAGE_COUNT, 0, [])
+
+    path = latest_undo_log(str(batch), undo_dir)
+    assert len(UndoLog.load(path).entries) == core.EXPECTED_IMAGE_COUNT
+    assert undo_batch(path) == (core.EXPECTED_IMAGE_COUNT, 0, [])
+
+    for original_path, content in before.items():
+        assert open(original_path, 'rb').read() == content
+    assert latest_undo_log(str(batch), undo_dir) is None
+
+
+def test_undo_skips_modified_compressed_file(tmp_path, make_batch):
+    """测试压缩后被修改过的文件不撤销，记录中保留该条目"""
+    batch = make_batch(tmp_path)
+    undo_dir = str(tmp_path / "undo")
+    preview_data, _ = core.build_preview(str(batch))
+
+    with UndoLog.open(str(batch), "20251106_100000_000000", undo_dir) as undo_log:
+        core.apply_preview(preview_data, compress_enabled=True, target_size=(32, 32),
+                           undo_log=undo_log)
+    with open(preview_data[3]['new_path'], 'ab') as f:
+        f.write(b'edited')
+
+    path = latest_undo_log(str(batch), undo_dir)
+    success, failed, errors = undo_batch(path)
+
+    assert (success, failed) == (core.EXPECTED_IMAGE_COUNT - 1, 1)
+    assert "文件已被修改" in errors[0]
+    assert os.path.exists(preview_data[3]['new_path'])
+    assert all(os.path.exists(data['original_path'])
+               for i, data in enumerate(preview_data) if i != 3)
+    assert len(UndoLog.load(path).entries) == 1
+
+
+def test_cli_apply_then_undo(tmp_path, capsys, make_batch):
+    """测试命令行处理后撤销最近一个批次"""
+    import image_renamer_cli
+
+    batch = make_batch(tmp_path)
+    dirs = ['--journal-dir', str(tmp_path / "journals"), '--undo-dir', str(tmp_path / "undo")]
+    assert image_renamer_cli.main(['apply', str(batch), '--no-cache', '--executor', 'serial']
+                                  + dirs) == 0
+    assert json.loads(capsys.readouterr().out)['success'] == core.EXPECTED_IMAGE_COUNT
+    assert not (batch / "1234567_英菲尼迪G37" / "1.jpg").exists()
+
+    assert image_renamer_cli.main(['undo', str(batch), '--no-cache', '--list',
+                                   '--undo-dir', str(tmp_path / "undo")]) == 0
+    batches = json.loads(capsys.readouterr().out)['batches']
+    assert [b['files'] for b in batches] == [core.EXPECTED_IMAGE_COUNT]
+
+    assert image_renamer_cli.main(['undo', str(batch), '--no-cache',
+                                   '--undo-dir', str(tmp_path / "undo")]) == 0
+    assert json.loads(capsys.readouterr().out)['success'] == core.EXPECTED_IMAGE_COUNT
+    assert (batch / "1234567_英菲尼迪G37" / "1.jpg").exists()
+
+
+def test_no_undo_log_when_nothing_renamed(tmp_path, make_batch):
+    """测试没有重命名任何文件的批次不留下撤销记录，不会挡住上一个批次的撤销"""
+    batch = make_batch(tmp_path)
+    undo_dir = str(tmp_path / "undo")
+    preview_data, _ = core.build_preview(str(batch))
+    with UndoLog.open(str(batch), "20251106_100000_000000", undo_dir) as undo_log:
+        core.apply_preview(preview_data[:1], undo_log=undo_log)
+    previous = latest_undo_log(str(batch), undo_dir)
+
+    # 第二个批次的文件都已不存在，全部失败
+    with UndoLog.open(str(batch), "20251106_110000_000000", undo_dir) as undo_log:
+        success, failed, _ = core.apply_preview(preview_data[:1], undo_log=undo_log)
+        assert (success, failed) == (0, 1)
+        assert not undo_log.has(preview_data[0]['new_path'])
+
+    assert latest_undo_log(str(batch), undo_dir) == previous
+    assert UndoLog.open(str(batch), "20251106_100000_000000", undo_dir).has(
+        preview_data[0]['new_path'])
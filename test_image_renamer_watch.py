@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监视上传文件夹测试
+"""
+
+import json
+import os
+import threading
+
+import image_renamer_core as core
+from image_renamer_watch import DropFolderWatcher, create_waker
+
+
+def make_watcher(tmp_path, root, clock=None, options=None, **kwargs):
+    extra = {'clock': clock} if clock is not None else {}
+    options = options or {'rename_enabled': True, 'compress_enabled': False}
+    return DropFolderWatcher(str(root), options,
+                             executor_mode='serial', journal_dir=str(tmp_path / "journals"),
+                             undo_dir=str(tmp_path / "undo"), watch_dir=str(tmp_path / "watch"),
+                             **extra, **kwargs)
+
+
+def test_poll_waits_for_complete_and_stable_folder(tmp_path, make_car):
+    """测试图片数量达到要求且内容稳定后才处理，处理过的文件夹重启后不再处理"""
+    root = tmp_path / "上传"
+    car = root / "1234567_宝马X5"
+    now = [0.0]
+    watcher = make_watcher(tmp_path, root, clock=lambda: now[0], settle_seconds=5)
+
+    make_car(car, 10)
+    assert watcher.poll() == []
+    now[0] = 10
+    assert watcher.poll() == []          # 还没有上传完
+
+    make_car(car, core.EXPECTED_IMAGE_COUNT, start=11)
+    assert watcher.poll() == []          # 内容刚变化
+    assert watcher.next_timeout() == 5
+    now[0] = 16
+    assert watcher.poll() == ["1234567_宝马X5"]
+
+    result = watcher.process("1234567_宝马X5")
+    assert (result['success'], result['failed']) == (core.EXPECTED_IMAGE_COUNT, 0)
+    assert (car / ("1234567" + core.RENAME_RULES[0])).exists()
+    assert watcher.poll() == []
+
+    # 重启后读取已处理的记录
+    restarted = make_watcher(tmp_path, root, clock=lambda: now[0], settle_seconds=0)
+    restarted.poll()
+    assert restarted.poll() == []
+
+
+def test_run_processes_new_folder(tmp_path, make_car):
+    """测试后台监视时新上传的文件夹被自动处理"""
+    root = tmp_path / "上传"
+    root.mkdir()
+    watcher = make_watcher(tmp_path, root, settle_seconds=0.2)
+    stop_event = threading.Event()
+    results = []
+
+    def on_result(result):
+        results.append(result)
+        stop_event.set()
+
+    thread = threading.Thread(target=watcher.run,
+                              args=(stop_event, on_result, create_waker(poll_interval=0.1)))
+    thread.start()
+    try:
+        make_car(root / "1234567_宝马X5", core.EXPECTED_IMAGE_COUNT)
+        thread.join(20)
+    finally:
+        stop_event.set()
+        thread.join()
+
+    assert [r['folder'] for r in results] == ["1234567_宝马X5"]
+    assert results[0]['success'] == core.EXPECTED_IMAGE_COUNT
+
+
+def test_cli_watch_once(tmp_path, capsys, make_car):
+    """测试命令行 --once 只处理已经稳定的文件夹"""
+    import image_renamer_cli
+
+    root = tmp_path / "上传"
+    make_car(root / "1234567_宝马X5", core.EXPECTED_IMAGE_COUNT)
+    make_car(root / "7654321_奔驰C200", 3)
+    dirs = ['--journal-dir', str(tmp_path / "journals"), '--undo-dir', str(tmp_path / "undo"),
+            '--watch-dir', str(tmp_path / "watch")]
+
+    assert image_renamer_cli.main(['watch', str(root), '--no-cache', '--once', '--settle', '0',
+                                   '--executor', 'serial'] + dirs) == 0
+
+    result = json.loads(capsys.readouterr().out)
+    assert [r['folder'] for r in result['processed']] == ["1234567_宝马X5"]
+    assert sorted(os.listdir(root / "7654321_奔驰C200")) == ["1.jpg", "2.jpg", "3.jpg"]
+
+
+def test_failed_folder_not_recorded_as_processed(tmp_path, make_car, make_jpg):
+    """测试有图片处理失败的文件夹记为失败，不算已处理；内容变化后重新处理"""
+    root = tmp_path / "上传"
+    car = root / "1234567_宝马X5"
+    make_car(car, core.EXPECTED_IMAGE_COUNT)
+    (car / "3.jpg").write_bytes(b"not a jpeg")
+    now = [0.0]
+    options = {'rename_enabled': False, 'compress_enabled': True}
+    watcher = make_watcher(tmp_path, root, clock=lambda: now[0], options=options,
+                           settle_seconds=0)
+
+    watcher.poll()
+    assert watcher.poll() == ["1234567_宝马X5"]
+    result = watcher.process("1234567_宝马X5")
+    assert (result['status'], result['failed']) == ('failed', 1)
+    assert "1234567_宝马X5" not in watcher.processed
+    assert "1234567_宝马X5" in watcher.failed
+    assert watcher.poll() == []
+
+    # 重启后仍记为失败，不重复处理
+    restarted = make_watcher(tmp_path, root, clock=lambda: now[0], options=options,
+                             settle_seconds=0)
+    restarted.poll()
+    assert restarted.poll() == []
+
+    # 人工替换损坏的图片后重新处理
+    make_jpg(car / "3.jpg")
+    restarted.poll()
+    assert restarted.poll() == ["1234567_宝马X5"]
+    result = restarted.process("1234567_宝马X5")
+    assert (result['status'], result['failed']) == ('processed', 0)
+    assert "1234567_宝马X5" in restarted.processed
+    assert "1234567_宝马X5" not in restarted.failed